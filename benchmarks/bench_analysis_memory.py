@@ -0,0 +1,83 @@
+"""
+Benchmark: peak RSS of a full analysis pass, materialized vs streamed.
+
+A database is filled with synthetic rows (see bench_metadata_store.fill), then
+each mode runs in a fresh subprocess so ru_maxrss reflects only that mode. The
+fill also runs in a subprocess: Linux carries ru_maxrss across fork/exec, so a
+large parent would inflate every child's reading.
+
+    materialized   query_files(criteria={}) + get_duplicates(), i.e. every row as a dict
+    streamed       consume AnalysisEngine.iter_candidates() without keeping candidates
+
+Usage:
+    python benchmarks/bench_analysis_memory.py [--rows 1000000 10000000 30000000] [--db-dir DIR]
+"""
+import argparse
+import logging
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from storage_hygiene.analysis_engine import AnalysisEngine # noqa: E402
+from storage_hygiene.metadata_store import MetadataStore # noqa: E402
+
+RULES = {
+    'duplicate_files': {'enabled': True},
+    'large_files': {'enabled': True, 'min_size_mb': 4096},
+    'old_files': {'enabled': True, 'max_days': 3650},
+}
+
+
+class _StaticConfig:
+    def get(self, key, default=None):
+        return RULES if key == 'analysis.rules' else default
+
+
+def run_mode(db_path: str, mode: str, rows: int):
+    logging.getLogger('storage_hygiene.metadata_store').setLevel(logging.WARNING)
+    if mode == 'fill':
+        from bench_metadata_store import fill
+        with MetadataStore(db_path=pathlib.Path(db_path)) as store:
+            fill(store, rows)
+        return
+    start = time.perf_counter()
+    with MetadataStore(db_path=pathlib.Path(db_path)) as store:
+        if mode == 'materialized':
+            count = len(store.query_files(criteria={})) + len(store.get_duplicates())
+        else:
+            count = sum(1 for _ in AnalysisEngine(_StaticConfig(), store).iter_candidates())
+    elapsed = time.perf_counter() - start
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:>13}: {count:>10} items  {elapsed:7.2f}s  peak RSS {peak_mib:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 30_000_000])
+    parser.add_argument('--db-dir', help="Directory for the benchmark databases (default: a temp dir).")
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.db, args.mode, args.rows[0])
+        return
+
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as tmp:
+        for rows in args.rows:
+            db_path = pathlib.Path(tmp) / f"analysis_{rows}.duckdb"
+            print(f"--- {rows:,} rows ---")
+            for mode in ('fill', 'streamed', 'materialized'):
+                subprocess.run([sys.executable, __file__, '--mode', mode, '--db', str(db_path),
+                                '--rows', str(rows)], check=False)
+            db_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
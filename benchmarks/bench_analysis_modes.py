@@ -0,0 +1,94 @@
+"""
+Benchmark: analysis as main.py runs it, row-by-row vs vectorized (Arrow) mode.
+
+A database is filled with synthetic rows (see bench_metadata_store.fill) and
+the duplicate, large-file and old-file rules are evaluated in both modes. Each
+mode runs in a fresh subprocess so ru_maxrss reflects only that mode (see
+bench_analysis_memory for why the fill runs in one too):
+
+    rows     analyze() returns lists of ActionCandidate objects
+    arrow    analyze() returns one columnar CandidateBatch per action
+
+Two timings are reported per mode: analyze() plus the per-action counts main
+logs, then one pass over every candidate, as ActionExecutor makes. Peak RSS is
+read after both.
+
+Usage:
+    python benchmarks/bench_analysis_modes.py [--rows 1000000 10000000] [--db-dir DIR]
+"""
+import argparse
+import logging
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from storage_hygiene.analysis_engine import AnalysisEngine # noqa: E402
+from storage_hygiene.metadata_store import MetadataStore # noqa: E402
+
+RULES = {
+    'duplicate_files': {'enabled': True},
+    'large_files': {'enabled': True, 'min_size_mb': 4096},
+    'old_files': {'enabled': True, 'max_days': 3650},
+}
+
+
+class _StaticConfig:
+    def __init__(self, mode):
+        self.values = {'analysis.rules': RULES, 'analysis.mode': mode}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+def run_mode(db_path: str, mode: str, rows: int):
+    logging.getLogger('storage_hygiene.metadata_store').setLevel(logging.WARNING)
+    if mode == 'fill':
+        from bench_metadata_store import fill
+        with MetadataStore(db_path=pathlib.Path(db_path)) as store:
+            fill(store, rows)
+        return
+    with MetadataStore(db_path=pathlib.Path(db_path)) as store:
+        start = time.perf_counter()
+        results = AnalysisEngine(_StaticConfig(mode), store).analyze()
+        count = sum(len(candidates) for candidates in results.values())
+        analyze_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        paths = sum(1 for candidates in results.values() for candidate in candidates if candidate['path'])
+        iterate_time = time.perf_counter() - start
+    assert paths == count
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"  {mode:<5}: {count:>10} candidates  analyze {analyze_time:7.2f}s  "
+          f"iterate {iterate_time:7.2f}s  peak RSS {peak_mib:8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--db-dir', help="Directory for the benchmark databases (default: a temp dir).")
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.db, args.mode, args.rows[0])
+        return
+
+    with tempfile.TemporaryDirectory(dir=args.db_dir) as tmp:
+        for rows in args.rows:
+            db_path = pathlib.Path(tmp) / f"modes_{rows}.duckdb"
+            print(f"--- {rows:,} rows ---")
+            for mode in ('fill', 'rows', 'arrow'):
+                subprocess.run([sys.executable, __file__, '--mode', mode, '--db', str(db_path),
+                                '--rows', str(rows)], check=False)
+            db_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: content-defined chunking throughput against plain hashing.
+
+Feeds the same in-memory data through each strategy in blocks of the
+scanner's read buffer size (see 'scanner.hash_buffer_kib'):
+
+    hash        the content hash alone (what every scan pays)
+    chunk       ContentChunker with the numpy cut point search
+    chunk (py)  ContentChunker rolling every byte in Python (numpy missing)
+
+Chunking runs in the same read as the hash, so a scan with chunking enabled
+costs roughly the hash plus the chunk time.
+
+Usage:
+    python benchmarks/bench_chunking.py [--size-mb 64] [--avg-kib 64] [--algorithm sha256]
+"""
+import argparse
+import os
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from storage_hygiene import chunking # noqa: E402
+from storage_hygiene.chunking import ContentChunker # noqa: E402
+from storage_hygiene.hashing import new_hasher # noqa: E402
+
+
+def feed(consumer, data: bytes, block_size: int):
+    view = memoryview(data)
+    for offset in range(0, len(data), block_size):
+        consumer.update(view[offset:offset + block_size])
+
+
+def best_rate(func, data: bytes, repeat: int = 3) -> float:
+    """Returns the best MB/s over repeated runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return len(data) / best / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=64, help="Bytes processed per measurement.")
+    parser.add_argument('--avg-kib', type=int, default=64, help="Target average chunk size.")
+    parser.add_argument('--buffer-kib', type=int, default=256, help="Block size fed per update() call.")
+    parser.add_argument('--algorithm', default='sha256')
+    args = parser.parse_args()
+
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    block_size = args.buffer_kib * 1024
+    avg_size = args.avg_kib * 1024
+
+    results = [('hash', best_rate(lambda: feed(new_hasher(args.algorithm), data, block_size), data))]
+    if chunking.np is not None:
+        results.append(('chunk', best_rate(lambda: feed(ContentChunker(avg_size), data, block_size), data)))
+    # The byte-by-byte loop is slow; one pass over a slice is enough to measure it
+    sample = data[:min(len(data), 8 * 1024 * 1024)]
+    numpy_module, chunking.np = chunking.np, None
+    try:
+        results.append(('chunk (py)', best_rate(lambda: feed(ContentChunker(avg_size), sample, block_size),
+                                                sample, repeat=1)))
+    finally:
+        chunking.np = numpy_module
+
+    print(f"{'strategy':<12} {'MB/s':>9}")
+    for strategy, rate in results:
+        print(f"{strategy:<12} {rate:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Microbenchmark: file hashing strategies across file sizes.
+
+Compares the previous read()-per-chunk loop with readinto() into a reused
+buffer at several buffer sizes, and with hashing an mmap of the file. The
+results were used to pick the Scanner default for 'scanner.hash_buffer_kib'
+and to size 'scanner.mmap_threshold_mb' where mmap is enabled (it is off by
+default, see docs/configuration.md). Files are read from the page cache after the
+first pass, so this measures CPU and copy overhead rather than disk speed.
+
+Usage:
+    python benchmarks/bench_hashing.py [--sizes-kib 4 256 4096 65536] [--algorithm sha256]
+"""
+import argparse
+import mmap
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from storage_hygiene.hashing import new_hasher # noqa: E402
+
+BUFFER_SIZES_KIB = [64, 256, 1024, 4096]
+
+
+def hash_read(path: str, algorithm: str, buffer_size: int) -> str:
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as file:
+        while chunk := file.read(buffer_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_readinto(path: str, algorithm: str, buffer_size: int) -> str:
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as file:
+        while read := file.readinto(buffer):
+            hasher.update(view[:read])
+    return hasher.hexdigest()
+
+
+def hash_mmap(path: str, algorithm: str, buffer_size: int) -> str:
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            for offset in range(0, len(mapped), buffer_size):
+                hasher.update(view[offset:offset + buffer_size])
+            view.release()
+    return hasher.hexdigest()
+
+
+def best_time(func, path, algorithm, buffer_size, total_bytes):
+    """Times repeated hashing until at least total_bytes were processed; returns best MB/s."""
+    size = max(os.path.getsize(path), 1)
+    repeats = max(3, total_bytes // size)
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func(path, algorithm, buffer_size)
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return size / best / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes-kib', type=int, nargs='+', default=[4, 256, 4096, 65536])
+    parser.add_argument('--algorithm', default='sha256')
+    parser.add_argument('--total-mb', type=int, default=256, help="Bytes hashed per measurement.")
+    args = parser.parse_args()
+
+    total_bytes = args.total_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory(prefix='bench_hashing_') as tmp_dir:
+        print(f"{'file size':>10} {'strategy':<18} {'MB/s':>9}")
+        for size_kib in args.sizes_kib:
+            path = os.path.join(tmp_dir, f"{size_kib}.bin")
+            with open(path, 'wb') as fh:
+                fh.write(os.urandom(size_kib * 1024))
+            hash_read(path, args.algorithm, 65536) # Warm the page cache
+
+            results = [('read 64K (old)', best_time(hash_read, path, args.algorithm, 65536, total_bytes))]
+            for buffer_kib in BUFFER_SIZES_KIB:
+                rate = best_time(hash_readinto, path, args.algorithm, buffer_kib * 1024, total_bytes)
+                results.append((f"readinto {buffer_kib}K", rate))
+            results.append(('mmap', best_time(hash_mmap, path, args.algorithm, 1024 * 1024, total_bytes)))
+
+            for strategy, rate in results:
+                print(f"{size_kib:>8}K  {strategy:<18} {rate:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
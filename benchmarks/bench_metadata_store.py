@@ -0,0 +1,95 @@
+"""
+Benchmark: duplicate, size and age queries on a synthetic files table.
+
+For each row count, a database is filled with synthetic rows (about 10% of
+them in duplicate groups) and three layouts are timed:
+
+    plain      secondary indexes dropped, rows in insertion order
+    indexed    schema-managed indexes on hash and inode
+    ordered    indexed, plus MetadataStore.optimize_layout() (hash-ordered rewrite)
+
+Usage:
+    python benchmarks/bench_metadata_store.py [--rows 1000000 10000000 50000000] [--db-dir DIR]
+"""
+import argparse
+import logging
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from storage_hygiene.metadata_store import ( # noqa: E402
+    MetadataStore, _DUPLICATE_GROUP_SQL, _FILE_INDEXES, _HASHED_ROWS)
+
+QUERIES = {
+    'duplicates (SQL)': """
+        SELECT count(*) FROM (
+            SELECT path FROM files WHERE hash IS NOT NULL
+            QUALIFY COUNT(*) OVER (PARTITION BY hash_algorithm, hash) > 1)
+    """,
+    'size > 1 GiB': "SELECT count(*) FROM files WHERE size_bytes > 1073741824",
+    'modified < 5y': "SELECT count(*) FROM files WHERE last_modified < now() - INTERVAL 1825 DAY",
+    'hash lookup': "SELECT count(*) FROM files WHERE hash = md5('12345')",
+}
+
+
+def fill(store: MetadataStore, rows: int):
+    duplicate_modulus = int(rows * 0.95) # ~10% of rows share a hash with another row
+    store.conn.execute(f"""
+        INSERT INTO files (path, filename, size_bytes, last_modified, hash, last_scanned, hash_algorithm)
+        SELECT '/bench/dir' || (i % 1000) || '/file' || i,
+               'file' || i,
+               (hash(i) % 4294967296) + CASE WHEN i % 1000 = 0 THEN 2147483648 ELSE 0 END,
+               TIMESTAMPTZ '2015-01-01' + to_seconds((hash(i * 7) % 315360000)::BIGINT),
+               md5((i % {duplicate_modulus})::VARCHAR),
+               now(),
+               'sha256'
+        FROM range({rows}) t(i);
+    """)
+    # Rows written by bulk SQL bypass the store's group maintenance
+    store.conn.execute(f"INSERT INTO duplicate_groups {_DUPLICATE_GROUP_SQL.format(filter=_HASHED_ROWS)};")
+
+
+def timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument('--db-dir', help="Directory for the benchmark databases (default: a temp dir).")
+    args = parser.parse_args()
+    logging.getLogger('storage_hygiene.metadata_store').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix='bench_store_', dir=args.db_dir) as tmp_dir:
+        print(f"{'rows':>11} {'layout':<8} {'query':<18} {'best (s)':>9}")
+        for rows in args.rows:
+            with MetadataStore(db_path=pathlib.Path(tmp_dir) / f"bench_{rows}.db") as store:
+                for index_name in _FILE_INDEXES:
+                    store.conn.execute(f"DROP INDEX IF EXISTS {index_name};")
+                fill(store, rows)
+
+                for layout in ('plain', 'indexed', 'ordered'):
+                    if layout == 'indexed':
+                        for index_name, column in _FILE_INDEXES.items():
+                            store.conn.execute(f"CREATE INDEX {index_name} ON files ({column});")
+                    elif layout == 'ordered':
+                        store.optimize_layout()
+                    store.conn.execute("CHECKPOINT;")
+
+                    for name, sql in QUERIES.items():
+                        seconds = timed(lambda: store.conn.execute(sql).fetchall())
+                        print(f"{rows:>11,} {layout:<8} {name:<18} {seconds:>9.3f}")
+                    seconds = timed(store.get_duplicates, repeat=1)
+                    print(f"{rows:>11,} {layout:<8} {'get_duplicates()':<18} {seconds:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
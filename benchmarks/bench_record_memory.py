@@ -0,0 +1,67 @@
+"""
+Benchmark: memory per file record and per action candidate.
+
+Builds N objects of each representation and reports tracemalloc bytes per item:
+
+    record dict        dict(zip(columns, row)), as query_files() returns
+    FileRecord         the NamedTuple yielded by MetadataStore.iter_files()
+    candidate dict     the per-candidate dict, with 'reason' formatted up front
+    ActionCandidate    the __slots__ mapping yielded by AnalysisEngine, reason built on access
+
+Paths, hashes and timestamps are shared between representations and excluded
+from the totals, since both forms reference the same row values.
+
+Usage:
+    python benchmarks/bench_record_memory.py [--count 1000000]
+"""
+import argparse
+import pathlib
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from storage_hygiene.analysis_engine import ActionCandidate # noqa: E402
+from storage_hygiene.metadata_store import FileRecord, _FILE_COLUMNS # noqa: E402
+
+
+def measure(label, build, count):
+    tracemalloc.start()
+    items = [build(i) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>16}: {size / count:7.1f} bytes/item")
+    del items
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=1_000_000)
+    args = parser.parse_args()
+    count = args.count
+
+    now = datetime.now(timezone.utc)
+    rows = [(f'/data/dir{i % 100}/file{i}', f'file{i}', i * 4096, now, f'{i:064x}', now, 'sha256')
+            for i in range(count)]
+
+    record_dict = measure('record dict', lambda i: dict(zip(_FILE_COLUMNS, rows[i])), count)
+    record_tuple = measure('FileRecord', lambda i: FileRecord._make(rows[i]), count)
+
+    def candidate_dict(i):
+        size = rows[i][2]
+        return {'action': 'review_large', 'path': rows[i][0], 'size': size,
+                'reason': f'File size ({size / (1024 * 1024):.1f} MB) exceeds threshold (50 MB)'}
+
+    candidate_as_dict = measure('candidate dict', candidate_dict, count)
+    candidate_slots = measure('ActionCandidate',
+                              lambda i: ActionCandidate('review_large', rows[i][0], size=rows[i][2], threshold=50),
+                              count)
+
+    print(f"records: {record_dict / record_tuple:.1f}x smaller, "
+          f"candidates: {candidate_as_dict / candidate_slots:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
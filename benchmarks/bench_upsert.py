@@ -0,0 +1,81 @@
+"""
+Benchmark: MetadataStore.upsert_file_records() batches on a filled files table.
+
+For each row count, a database is filled with synthetic rows (see
+bench_metadata_store.fill) and batches of records are written through the
+batch path, one transaction per batch as the scanner does:
+
+    new        paths not yet stored
+    existing   paths already stored, with a new hash half of the time
+    recount    the first duplicate-group read after the writes, which
+               recounts every group the batches marked stale
+
+Usage:
+    python benchmarks/bench_upsert.py [--rows 1000000 10000000] [--batch 1000] [--batches 5] [--db-dir DIR]
+"""
+import argparse
+import datetime
+import logging
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from bench_metadata_store import fill # noqa: E402
+from storage_hygiene.metadata_store import MetadataStore # noqa: E402
+
+
+def records(start: int, count: int, rows: int, tag: str) -> list[dict]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [{
+        'path': f"/bench/dir{i % 1000}/file{i}",
+        'filename': f"file{i}",
+        'size_bytes': 4096 + i % 997,
+        'last_modified': now,
+        # Every other record joins another record's group, the rest get a fresh hash
+        'hash': f"{tag}{i % (rows // 2)}" if i % 2 else f"{tag}-{i}",
+        'last_scanned': now,
+        'hash_algorithm': 'sha256',
+    } for i in range(start, start + count)]
+
+
+def timed_batches(store: MetadataStore, batches: list[list[dict]]) -> float:
+    start = time.perf_counter()
+    for batch in batches:
+        store.upsert_file_records(batch)
+    return (time.perf_counter() - start) / len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--batch', type=int, default=1000, help="Records per upsert_file_records() call.")
+    parser.add_argument('--batches', type=int, default=5, help="Calls timed per case.")
+    parser.add_argument('--db-dir', help="Directory for the benchmark databases (default: a temp dir).")
+    args = parser.parse_args()
+    logging.getLogger('storage_hygiene.metadata_store').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix='bench_upsert_', dir=args.db_dir) as tmp_dir:
+        print(f"{'rows':>11} {'case':<9} {'per batch (s)':>14}")
+        for rows in args.rows:
+            with MetadataStore(db_path=pathlib.Path(tmp_dir) / f"bench_{rows}.db") as store:
+                fill(store, rows)
+                store.conn.execute("CHECKPOINT;")
+
+                new = [records(rows + n * args.batch, args.batch, rows, 'new') for n in range(args.batches)]
+                seconds = timed_batches(store, new)
+                print(f"{rows:>11,} {'new':<9} {seconds:>14.3f}")
+
+                existing = [records(n * args.batch * 7, args.batch, rows, 'existing') for n in range(args.batches)]
+                seconds = timed_batches(store, existing)
+                print(f"{rows:>11,} {'existing':<9} {seconds:>14.3f}")
+
+                start = time.perf_counter()
+                next(store.iter_duplicate_group_summaries(), None)
+                print(f"{rows:>11,} {'recount':<9} {time.perf_counter() - start:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
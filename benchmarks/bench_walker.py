@@ -0,0 +1,109 @@
+"""
+Benchmark: pathlib.rglob walker vs. the os.scandir-based Scanner walker.
+
+Builds a synthetic tree (or walks an existing directory) and reports wall time
+for both walkers. When `strace` is available, each walker is also run in a
+child process under `strace -c` to report file-related syscall counts.
+
+Usage:
+    python benchmarks/bench_walker.py [--root DIR] [--dirs 200] [--files-per-dir 50]
+"""
+import argparse
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import Mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "src"))
+
+from storage_hygiene.scanner import Scanner # noqa: E402
+
+
+def legacy_walk(root: str) -> int:
+    """The previous walker: rglob, then is_file(), resolve() and stat() per entry."""
+    count = 0
+    for item_path in pathlib.Path(root).rglob('*'):
+        if item_path.is_file():
+            item_path.resolve()
+            item_path.stat()
+            count += 1
+    return count
+
+
+def scandir_walk(root: str) -> int:
+    """The Scanner walker, which reuses d_type and makes one stat call per file."""
+    scanner = Scanner(Mock(), Mock())
+    return sum(1 for _ in scanner._walk_files(str(pathlib.Path(root).resolve())))
+
+
+WALKERS = {'legacy': legacy_walk, 'scandir': scandir_walk}
+
+
+def build_tree(base: str, dirs: int, files_per_dir: int):
+    for d in range(dirs):
+        dir_path = os.path.join(base, f"d{d % 10}", f"sub{d}")
+        os.makedirs(dir_path, exist_ok=True)
+        for f in range(files_per_dir):
+            with open(os.path.join(dir_path, f"f{f}.dat"), 'wb') as fh:
+                fh.write(b"x")
+
+
+def count_syscalls(walker: str, root: str) -> int | None:
+    """Runs one walker under `strace -c` and returns the number of file-related syscalls."""
+    if not shutil.which('strace'):
+        return None
+    with tempfile.NamedTemporaryFile(suffix='.strace') as out:
+        subprocess.run(
+            ['strace', '-f', '-c', '-e', 'trace=%file,getdents64', '-o', out.name,
+             sys.executable, __file__, '--child', walker, '--root', root],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        for line in reversed(pathlib.Path(out.name).read_text().splitlines()):
+            if line.strip().endswith('total'):
+                return int(line.split()[2])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', help="Existing directory to walk instead of a synthetic tree.")
+    parser.add_argument('--dirs', type=int, default=200)
+    parser.add_argument('--files-per-dir', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', choices=WALKERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        WALKERS[args.child](args.root)
+        return
+
+    tmp_dir = None
+    root = args.root
+    if root is None:
+        tmp_dir = tempfile.mkdtemp(prefix='bench_walker_')
+        build_tree(tmp_dir, args.dirs, args.files_per_dir)
+        root = tmp_dir
+
+    try:
+        print(f"{'walker':<10} {'files':>9} {'best wall (s)':>14} {'syscalls':>10}")
+        for name, walker in WALKERS.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                files = walker(root)
+                timings.append(time.perf_counter() - start)
+            syscalls = count_syscalls(name, root)
+            print(f"{name:<10} {files:>9} {min(timings):>14.3f} {syscalls if syscalls is not None else 'n/a':>10}")
+        if not shutil.which('strace'):
+            print("strace not found; syscall counts unavailable.")
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
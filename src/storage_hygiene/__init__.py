@@ -6,16 +6,21 @@ Provides tools for scanning, analyzing, and managing digital storage.
 """
 
 from .config_manager import ConfigManager, ConfigLoadError
-from .metadata_store import MetadataStore
+from .metadata_store import MetadataStore, FileRecord, DuplicateGroup, SharedChunks, SimilarImages
 from .scanner import Scanner
-from .analysis_engine import AnalysisEngine
+from .analysis_engine import AnalysisEngine, ActionCandidate
 from .action_executor import ActionExecutor
 
 __all__ = [
     "ConfigManager",
     "ConfigLoadError",
     "MetadataStore",
+    "FileRecord",
+    "DuplicateGroup",
+    "SharedChunks",
+    "SimilarImages",
     "Scanner",
     "AnalysisEngine",
+    "ActionCandidate",
     "ActionExecutor",
 ]
\ No newline at end of file
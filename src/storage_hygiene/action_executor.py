@@ -1,14 +1,20 @@
 import os
-import shutil
 import logging
+import threading
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from .action_journal import DONE, FAILED, ROLLED_BACK, SYNCED, ActionJournal
+from .file_transfer import (DEFAULT_LINK_METHOD, DEFAULT_STAGING_STRATEGY, LINK_METHODS, STAGING_STRATEGIES,
+                            DuplicateChangedError, link_duplicate, move_file, remove_link_temps)
 # from .config_manager import ConfigManager # Assuming ConfigManager is in the same package
 
 class ActionExecutor:
     """
     Executes actions based on analysis results and configuration.
     """
-    def __init__(self, config_manager, metadata_store):
+    def __init__(self, config_manager, metadata_store, journal_path=None):
         """
         Initializes the ActionExecutor.
 
@@ -16,28 +22,54 @@ class ActionExecutor:
             config_manager: An instance of ConfigManager.
             metadata_store: An instance of MetadataStore.
                             TDD Anchor: [AX_Init]
+            journal_path: Optional path of the action journal (see ActionJournal).
+                          When set, every move and link is journaled and
+                          resume() can settle those interrupted by a crash.
         """
         self.config_manager = config_manager
         self.metadata_store = metadata_store # Store metadata_store instance
         # Map action types to handler methods
         self._action_handlers = {
             'stage_duplicate': self._stage_duplicate,
+            'dedupe_link': self._dedupe_link,
             'review_large': self._review_large,
             'review_old': self._review_old,
         }
         # Placeholder for logger setup
         # self.logger = logging.getLogger(__name__)
+        # Pool threads collect their path updates here instead of writing to the store, see _execute_parallel
+        self._deferred = threading.local()
+        # Staging destinations claimed by a move in progress, so concurrent moves never overwrite each other
+        self._claimed_destinations = set()
+        self._claim_lock = threading.Lock()
+        self._staging_strategy = DEFAULT_STAGING_STRATEGY # See file_transfer.move_file
+        self._pending_path_updates = [] # (old_path, new_path, journal entry id) of completed moves
+        self._link_method = DEFAULT_LINK_METHOD # See file_transfer.link_duplicate
+        self._pending_identity_updates = [] # (path, device, inode, mtime_ns, ctime_ns) of files replaced by links
+        self._pending_links = [] # (path, original_path, journal entry id) of duplicates replaced by links
+        self._db_batch_size = 1000
+        self.journal_path = journal_path
+        self._journal = None # Open ActionJournal during a journaled run
 
-    def execute_actions(self, actions: dict, dry_run_override: bool | None = None):
+    def execute_actions(self, actions, dry_run_override: bool | None = None):
         """
-        Executes actions based on the analysis results dictionary.
+        Executes actions based on the analysis results.
         TDD Anchor: [AX_Execute], [AX_LoadConfig]
 
         Args:
-            actions: A dictionary where keys are action types and values are lists
-                     of file info dictionaries.
+            actions: Either a dictionary where keys are action types and values are
+                     iterables of file info dictionaries, or a flat iterable of file
+                     info dictionaries carrying an 'action' key (e.g.
+                     AnalysisEngine.iter_candidates()) or of CandidateBatch objects
+                     (AnalysisEngine.iter_candidate_batches()). Both are consumed lazily.
             dry_run_override: If True or False, overrides the dry_run setting from config.
                               If None, uses the config setting.
+
+        With 'action_executor.workers' above 1, moves run concurrently in a
+        thread pool (see _execute_parallel); dry runs are always serial. Path
+        updates are written to the store every 'action_executor.db_batch_size'
+        moves and when the run ends, including when it ends with an error.
+        With a journal_path, each move and link is journaled before it happens.
         """
         # Correctly indent the method body
         staging_dir = self.config_manager.get('action_executor.staging_dir', './.storage_hygiene_staging') # Match config key used in test
@@ -52,46 +84,295 @@ class ActionExecutor:
         staging_dir_path = Path(staging_dir) # Convert to Path object
         moved_files_this_run = set() # Track files moved in this execution
 
+        self._staging_strategy = self.config_manager.get('action_executor.staging_strategy', DEFAULT_STAGING_STRATEGY)
+        if self._staging_strategy not in STAGING_STRATEGIES:
+            print(f"Warning: Unknown action_executor.staging_strategy '{self._staging_strategy}'. "
+                  f"Using '{DEFAULT_STAGING_STRATEGY}'.")
+            self._staging_strategy = DEFAULT_STAGING_STRATEGY
+
+        self._link_method = self.config_manager.get('action_executor.link_method', DEFAULT_LINK_METHOD)
+        if self._link_method not in LINK_METHODS:
+            print(f"Warning: Unknown action_executor.link_method '{self._link_method}'. "
+                  f"Using '{DEFAULT_LINK_METHOD}'.")
+            self._link_method = DEFAULT_LINK_METHOD
+
+        self._db_batch_size = max(self._get_int_setting('db_batch_size', 1000), 1)
+        workers = self._get_int_setting('workers', 1)
+        if self.journal_path and not dry_run:
+            self._journal = ActionJournal(self.journal_path)
+        try:
+            if workers > 1 and not dry_run:
+                self._execute_parallel(self._iter_actions(actions), staging_dir_path, workers, moved_files_this_run)
+                return
+
+            for action_type, handler, action_details in self._iter_actions(actions):
+                self._run_action(action_type, handler, action_details, staging_dir_path, dry_run, moved_files_this_run)
+        finally:
+            # Moves that happened must reach the store even if the run was halted
+            self._flush_path_updates()
+            self._close_journal()
+
+    def resume(self) -> dict[str, int]:
+        """
+        Settles the moves and links an interrupted run left open in the action
+        journal, so the metadata store matches the files on disk without a rescan.
+
+        A move that completed (its destination exists and it was journaled as
+        done or its source is gone) is rolled forward: its new path is written to
+        the store, unless the store already has it at its new path and not at its
+        old one. A move that did not complete is rolled back: a destination
+        left next to an intact source (a partial copy or an extra hardlink) is
+        removed. Entries whose source and destination are both missing are
+        marked failed.
+
+        For a link, temporary links left next to the duplicate are removed. A
+        link journaled as done, or a duplicate that is already a hardlink of
+        its original, is rolled forward: both identities and the link are
+        written to the store. Otherwise the duplicate was not replaced and the
+        entry is rolled back.
+
+        Returns:
+            Counts of entries per outcome: 'rolled_forward', 'rolled_back', 'failed'.
+        """
+        counts = {'rolled_forward': 0, 'rolled_back': 0, 'failed': 0}
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return counts
+
+        self._journal = ActionJournal(self.journal_path)
+        try:
+            for entry in self._journal.open_entries():
+                if entry.action == 'dedupe_link':
+                    counts[self._resume_link(entry)] += 1
+                    continue
+                source_exists = os.path.lexists(entry.source)
+                destination_exists = os.path.lexists(entry.destination)
+                if destination_exists and (entry.state == DONE or not source_exists):
+                    old_path, new_path = os.path.normcase(entry.source), os.path.normcase(entry.destination)
+                    if self._path_update_committed(old_path, new_path):
+                        # The crash came after the store commit but before 'synced' was written
+                        self._journal.record_states([entry.entry_id], SYNCED)
+                    else:
+                        self._journal.record_states([entry.entry_id], DONE)
+                        self._queue_path_update(old_path, new_path, entry.entry_id)
+                    counts['rolled_forward'] += 1
+                elif source_exists:
+                    if destination_exists:
+                        os.unlink(entry.destination)
+                    self._journal.record_states([entry.entry_id], ROLLED_BACK)
+                    counts['rolled_back'] += 1
+                else:
+                    print(f"Warning: Neither {entry.source} nor {entry.destination} exists. "
+                          f"Marking journaled {entry.action} as failed.")
+                    self._journal.record_states([entry.entry_id], FAILED)
+                    counts['failed'] += 1
+        finally:
+            self._flush_path_updates()
+            self._close_journal()
+        print(f"Resumed action journal: {counts['rolled_forward']} actions rolled forward, "
+              f"{counts['rolled_back']} rolled back, {counts['failed']} failed.")
+        return counts
+
+    def _resume_link(self, entry) -> str:
+        """Settles a journaled dedupe_link for resume(); returns the outcome it is counted as."""
+        duplicate, original = entry.source, entry.destination
+        remove_link_temps(duplicate)
+        if not (os.path.lexists(duplicate) and os.path.lexists(original)):
+            print(f"Warning: {duplicate} or {original} no longer exists. Marking journaled dedupe_link as failed.")
+            self._journal.record_states([entry.entry_id], FAILED)
+            return 'failed'
+        if entry.state == DONE or os.path.samefile(duplicate, original):
+            self._journal.record_states([entry.entry_id], DONE)
+            self._queue_identity_updates(self._link_identities(duplicate, original),
+                                         [(os.path.normcase(duplicate), os.path.normcase(original), entry.entry_id)])
+            return 'rolled_forward'
+        self._journal.record_states([entry.entry_id], ROLLED_BACK)
+        return 'rolled_back'
+
+    def _path_update_committed(self, old_path: str, new_path: str) -> bool:
+        """Returns True if the store has a record at new_path and none at old_path."""
+        return bool(self.metadata_store.query_files({'path': new_path})) and \
+            not self.metadata_store.query_files({'path': old_path})
+
+    def _close_journal(self):
+        """Closes the journal of the current run, emptying it if no entry is left open."""
+        if self._journal is None:
+            return
+        journal, self._journal = self._journal, None
+        if not journal.compact():
+            print(f"Warning: Action journal {journal.path} has unfinished actions. Run with --resume to settle them.")
+        journal.close()
+
+    def _iter_actions(self, actions):
+        """Yields (action_type, handler, action_details) in execution order, reporting unknown action types."""
+        if not isinstance(actions, Mapping):
+            # Flat stream of candidates: dispatch each on its own 'action' key.
+            # Columnar CandidateBatch items are iterated row by row.
+            for item in actions:
+                for action_details in ((item,) if isinstance(item, Mapping) else item):
+                    action_type = action_details.get('action')
+                    handler = self._action_handlers.get(action_type)
+                    if handler:
+                        yield action_type, handler, action_details
+                    else:
+                        print(f"Unknown action type '{action_type}' encountered.")
+            return
+
         # Action loop and dispatch using handler map
         # Iterate through the dictionary provided by AnalysisEngine
         for action_type, file_list in actions.items():
             handler = self._action_handlers.get(action_type)
             if handler:
                 for action_details in file_list: # Process each file for this action type
-                    file_path_str = action_details.get('path')
-                    if not file_path_str:
-                        print(f"Warning: Skipping action {action_type} due to missing path: {action_details}")
-                        # self.logger.warning(f"Skipping action {action_type} due to missing path: {action_details}")
-                        continue
-
-                    # Check if file was already moved by a previous action in this run
-                    if file_path_str in moved_files_this_run:
-                        print(f"Warning: File '{file_path_str}' already processed by a previous action in this run. Skipping {action_type}.")
-                        # self.logger.warning(f"File '{file_path_str}' already processed by a previous action in this run. Skipping {action_type}.")
-                        continue
-
-                    try:
-                        # Pass the final dry_run value to the handler
-                        handler(action_details, staging_dir_path, dry_run)
-                        # If handler involves a move and succeeds, add path to set
-                        # Currently, all handlers call _stage_file which handles the move
-                        # We rely on _stage_file raising OSError on failure, preventing this line from being reached
-                        if not dry_run and action_type in ['stage_duplicate', 'review_large', 'review_old']:
-                             moved_files_this_run.add(file_path_str)
-                    except OSError as e: # Catch OSError specifically
-                        # Log the critical file system error
-                        print(f"Critical error during action {action_type} for {action_details.get('path')}: {e}")
-                        # self.logger.critical(f"Critical error during action {action_type} for {action_details.get('path')}: {e}", exc_info=True)
-                        raise # Re-raise OSError to halt execution
-                    except Exception as e:
-                        # Log other non-critical errors but continue processing other files/actions
-                        print(f"Non-critical error executing action {action_type} for {action_details.get('path')}: {e}")
-                        # self.logger.error(f"Non-critical error executing action {action_type} for {action_details.get('path')}: {e}", exc_info=True)
+                    yield action_type, handler, action_details
             else:
                 # Log unknown action type
                 print(f"Unknown action type '{action_type}' encountered.")
                 # self.logger.warning(f"Unknown action type '{action_type}' encountered.") # Path is not directly available here
 
+    def _get_int_setting(self, name: str, default: int) -> int:
+        """Reads an integer 'action_executor' setting, falling back to the default if invalid."""
+        value = self.config_manager.get(f'action_executor.{name}', default)
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            print(f"Warning: Invalid action_executor.{name} value '{value}'. Using {default}.")
+            return default
+
+    @staticmethod
+    def _device_of(path: Path) -> int | None:
+        """Returns st_dev of a path, or of its nearest existing ancestor; None if nothing can be stat'ed."""
+        for candidate in (path, *path.parents):
+            try:
+                return os.stat(candidate).st_dev
+            except OSError:
+                continue
+        return None
+
+    def _execute_parallel(self, action_stream, staging_dir_path, workers, moved_files_this_run):
+        """
+        Runs actions in a thread pool, limiting concurrent moves per source device.
+
+        A source on the staging directory's device is a rename, so up to
+        'action_executor.same_device_in_flight' (default: workers) run at once.
+        Other sources are copied, so at most 'action_executor.cross_device_in_flight'
+        (default 2) per device run at once. Pool threads only touch the file
+        system; results are consumed in submission order and their path
+        updates are written to the store from this thread only, so the DuckDB
+        connection keeps a single writer and the store sees moves in action
+        order. An action for a path that is still in flight waits for it, so
+        moved_files_this_run skips it exactly as in a serial run.
+        """
+        same_device_limit = max(self._get_int_setting('same_device_in_flight', workers), 1)
+        cross_device_limit = max(self._get_int_setting('cross_device_in_flight', 2), 1)
+        staging_device = self._device_of(staging_dir_path.resolve())
+        max_pending = workers * 4 # Bounds memory on very large action streams
+        pending = deque()
+        in_flight_by_device = defaultdict(int)
+        in_flight_paths = defaultdict(int)
+        failure = None
+
+        def run_deferred(handler, action_details):
+            self._deferred.moves = []
+            self._deferred.identities = []
+            self._deferred.links = []
+            try:
+                handler(action_details, staging_dir_path, False)
+                return self._deferred.moves, self._deferred.identities, self._deferred.links
+            finally:
+                self._deferred.moves = None
+                self._deferred.identities = None
+                self._deferred.links = None
+
+        def write_next():
+            nonlocal failure
+            action_type, action_details, device, future = pending.popleft()
+            in_flight_by_device[device] -= 1
+            file_path_str = action_details.get('path')
+            in_flight_paths[file_path_str] -= 1
+            if not in_flight_paths[file_path_str]:
+                del in_flight_paths[file_path_str]
+            try:
+                moves, identities, links = future.result()
+            except OSError as e:
+                print(f"Critical error during action {action_type} for {file_path_str}: {e}")
+                failure = failure or e
+                return
+            except Exception as e:
+                print(f"Non-critical error executing action {action_type} for {file_path_str}: {e}")
+                return
+            self._queue_identity_updates(identities, links)
+            for old_path, new_path, entry_id in moves:
+                self._queue_path_update(old_path, new_path, entry_id)
+            if action_type in ['stage_duplicate', 'review_large', 'review_old']:
+                moved_files_this_run.add(file_path_str)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for action_type, handler, action_details in action_stream:
+                file_path_str = action_details.get('path')
+                if not file_path_str:
+                    print(f"Warning: Skipping action {action_type} due to missing path: {action_details}")
+                    continue
+                # Let an earlier action on the same file finish, so the moved-files check sees its outcome
+                while file_path_str in in_flight_paths:
+                    write_next()
+                if failure:
+                    break
+                if file_path_str in moved_files_this_run:
+                    print(f"Warning: File '{file_path_str}' already processed by a previous action in this run. Skipping {action_type}.")
+                    continue
+
+                device = self._device_of(Path(file_path_str))
+                limit = same_device_limit if device is not None and device == staging_device else cross_device_limit
+                # Results are consumed in order, so draining from the head frees this device's slots
+                while pending and (in_flight_by_device[device] >= limit or len(pending) >= max_pending):
+                    write_next()
+                if failure:
+                    break
+
+                future = pool.submit(run_deferred, handler, action_details)
+                pending.append((action_type, action_details, device, future))
+                in_flight_by_device[device] += 1
+                in_flight_paths[file_path_str] += 1
+
+            # Moves already under way complete and are recorded even after a failure
+            while pending:
+                write_next()
+
+        if failure:
+            raise failure # Halt like the serial path on critical file system errors
+
+    def _run_action(self, action_type, handler, action_details, staging_dir_path, dry_run, moved_files_this_run):
+        """Runs one action through its handler, skipping files already moved this run."""
+        file_path_str = action_details.get('path')
+        if not file_path_str:
+            print(f"Warning: Skipping action {action_type} due to missing path: {action_details}")
+            # self.logger.warning(f"Skipping action {action_type} due to missing path: {action_details}")
+            return
+
+        # Check if file was already moved by a previous action in this run
+        if file_path_str in moved_files_this_run:
+            print(f"Warning: File '{file_path_str}' already processed by a previous action in this run. Skipping {action_type}.")
+            # self.logger.warning(f"File '{file_path_str}' already processed by a previous action in this run. Skipping {action_type}.")
+            return
+
+        try:
+            # Pass the final dry_run value to the handler
+            handler(action_details, staging_dir_path, dry_run)
+            # If handler involves a move and succeeds, add path to set
+            # Currently, all handlers call _stage_file which handles the move
+            # We rely on _stage_file raising OSError on failure, preventing this line from being reached
+            if not dry_run and action_type in ['stage_duplicate', 'review_large', 'review_old']:
+                 moved_files_this_run.add(file_path_str)
+        except OSError as e: # Catch OSError specifically
+            # Log the critical file system error
+            print(f"Critical error during action {action_type} for {action_details.get('path')}: {e}")
+            # self.logger.critical(f"Critical error during action {action_type} for {action_details.get('path')}: {e}", exc_info=True)
+            raise # Re-raise OSError to halt execution
+        except Exception as e:
+            # Log other non-critical errors but continue processing other files/actions
+            print(f"Non-critical error executing action {action_type} for {action_details.get('path')}: {e}")
+            # self.logger.error(f"Non-critical error executing action {action_type} for {action_details.get('path')}: {e}", exc_info=True)
+
     # Placeholder implementations for action methods
     def _get_staging_path(self, sub_dir_type, staging_dir, file_path_obj, file_hash=None):
         """Helper to determine the destination path within the staging directory."""
@@ -143,21 +424,33 @@ class ActionExecutor:
         if not dry_run:
             try:
                 os.makedirs(dest_dir, exist_ok=True)
-                # Prevent moving if destination already exists
-                if not dest_path.exists():
-                    shutil.move(str(file_path_obj), dest_path)
-                    # self.logger.info(f"Successfully moved {file_path_obj} to {dest_path}")
-                    print(f"Successfully moved {file_path_obj} to {dest_path}") # Placeholder log
-                    # Update the path in the metadata store
+                # Prevent moving if destination already exists or another move is writing it
+                if self._claim_destination(dest_path):
+                    entry_id = None
                     try:
-                        # Use normalized old path for lookup
-                        normalized_old_path = os.path.normcase(str(file_path_obj))
-                        # Store normalized new path
-                        normalized_new_path = os.path.normcase(str(dest_path))
-                        self.metadata_store.update_file_path(old_path=normalized_old_path, new_path=normalized_new_path)
-                    except Exception as db_e:
-                        # self.logger.error(f"Failed to update database path for {normalized_old_path} after move: {db_e}", exc_info=True)
-                        print(f"Error updating database path for {file_path_obj} after move: {db_e}") # Placeholder log
+                        if self._journal is not None:
+                            entry_id = self._journal.record_intent(action_details.get('action') or sub_dir_type,
+                                                                   str(file_path_obj), str(dest_path))
+                        method = move_file(str(file_path_obj), dest_path, self._staging_strategy)
+                    except BaseException:
+                        # Close the entry only if nothing happened; anything else is settled by resume()
+                        if entry_id is not None and file_path_obj.exists() and not dest_path.exists():
+                            self._journal.record_states([entry_id], FAILED)
+                        raise
+                    finally:
+                        self._release_destination(dest_path)
+                    if entry_id is not None:
+                        self._journal.record_states([entry_id], DONE)
+                    # self.logger.info(f"Successfully moved {file_path_obj} to {dest_path}")
+                    print(f"Successfully moved {file_path_obj} to {dest_path} ({method})") # Placeholder log
+                    # Update the path in the metadata store (use normalized paths for lookup and storage)
+                    normalized_old_path = os.path.normcase(str(file_path_obj))
+                    normalized_new_path = os.path.normcase(str(dest_path))
+                    deferred_moves = getattr(self._deferred, 'moves', None)
+                    if deferred_moves is not None:
+                        deferred_moves.append((normalized_old_path, normalized_new_path, entry_id))
+                    else:
+                        self._queue_path_update(normalized_old_path, normalized_new_path, entry_id)
                 else:
                     # self.logger.warning(f"Destination {dest_path} already exists. Skipping move for {file_path_obj}.")
                     print(f"Warning: Destination {dest_path} already exists. Skipping move for {file_path_obj}.") # Placeholder log
@@ -173,12 +466,140 @@ class ActionExecutor:
             print(f"[DRY RUN] Would move {file_path_obj} to {dest_path}") # Placeholder log
 
 
+    def _claim_destination(self, dest_path) -> bool:
+        """Reserves a staging destination for one move; False if it exists or another move holds it."""
+        with self._claim_lock:
+            if dest_path in self._claimed_destinations or dest_path.exists():
+                return False
+            self._claimed_destinations.add(dest_path)
+            return True
+
+    def _release_destination(self, dest_path):
+        """Releases a destination claimed by _claim_destination once the move has finished."""
+        with self._claim_lock:
+            self._claimed_destinations.discard(dest_path)
+
+    def _queue_path_update(self, old_path, new_path, entry_id=None):
+        """Queues a completed move for the metadata store, flushing once the batch is full."""
+        self._pending_path_updates.append((old_path, new_path, entry_id))
+        if len(self._pending_path_updates) >= self._db_batch_size:
+            self._flush_path_updates()
+
+    def _queue_identity_updates(self, identities, links=()):
+        """Queues the new identities of files replaced by links, flushing once the batch is full."""
+        self._pending_identity_updates.extend(identities)
+        self._pending_links.extend(links)
+        if len(self._pending_identity_updates) >= self._db_batch_size:
+            self._flush_path_updates()
+
+    def _flush_path_updates(self):
+        """
+        Writes the queued link identities, then the queued moves, to the metadata
+        store, each in one transaction; failures are logged, not raised.
+        """
+        if self._pending_identity_updates:
+            identities, self._pending_identity_updates = self._pending_identity_updates, []
+            links, self._pending_links = self._pending_links, []
+            try:
+                self.metadata_store.update_file_identities(identities, [(path, original) for path, original, _ in links])
+            except Exception as db_e:
+                # The next scan rehashes these files instead of trusting their records; resume() writes them again
+                print(f"Error updating database identities for {len(identities)} linked files: {db_e}") # Placeholder log
+            else:
+                if self._journal is not None:
+                    self._journal.record_states([entry_id for _, _, entry_id in links if entry_id is not None], SYNCED)
+        if not self._pending_path_updates:
+            return
+        updates, self._pending_path_updates = self._pending_path_updates, []
+        try:
+            self.metadata_store.update_file_paths([(old_path, new_path) for old_path, new_path, _ in updates])
+        except Exception as db_e:
+            # self.logger.error(f"Failed to update database paths for {len(updates)} moved files: {db_e}", exc_info=True)
+            print(f"Error updating database paths for {len(updates)} moved files: {db_e}") # Placeholder log
+            return # The entries stay 'done', so resume() writes them again
+        if self._journal is not None:
+            self._journal.record_states([entry_id for _, _, entry_id in updates if entry_id is not None], SYNCED)
+
     def _stage_duplicate(self, action_details, staging_dir, dry_run):
         """Moves a duplicate file to the staging area using the generic method."""
         # TDD Anchor: [AX_StageDup]
         self._stage_file(action_details, staging_dir, dry_run, 'duplicates', 'Staging duplicate')
 
 
+    def _dedupe_link(self, action_details, staging_dir, dry_run):
+        """
+        Replaces a duplicate with a reflink or hardlink to its original (see
+        file_transfer.link_duplicate), freeing its space without staging it.
+        The duplicate keeps its path, so only its inode and timestamps are
+        written to the store, with a record of the link so later analyses skip
+        the duplicate until it changes. Files that changed since the scan, or
+        that cannot be linked, are left in place with a warning. Links are
+        journaled like moves, see resume().
+        """
+        # TDD Anchor: [AX_DedupeLink]
+        file_path_str = action_details.get('path')
+        original_path_str = action_details.get('original_path')
+        if not file_path_str or not original_path_str:
+            print(f"Error: Missing path or original_path in dedupe_link action: {action_details}")
+            return
+
+        print(f"Linking duplicate: {file_path_str} -> {original_path_str}") # Placeholder log
+        if dry_run:
+            print(f"[DRY RUN] Would replace {file_path_str} with a link to {original_path_str}") # Placeholder log
+            return
+
+        entry_id = None
+        try:
+            already_linked = os.path.samefile(file_path_str, original_path_str)
+            if not already_linked and self._journal is not None:
+                entry_id = self._journal.record_intent('dedupe_link', file_path_str, original_path_str)
+            method = None if already_linked else link_duplicate(original_path_str, file_path_str, self._link_method)
+        except (FileNotFoundError, DuplicateChangedError) as e:
+            if entry_id is not None:
+                self._journal.record_states([entry_id], FAILED)
+            print(f"Warning: Not linking {file_path_str} to {original_path_str}: {e}") # Placeholder log
+            return
+        except OSError as e:
+            # The entry stays open, so resume() removes a temporary link left behind
+            print(f"Error linking {file_path_str} to {original_path_str}: {e}") # Placeholder log
+            raise # Re-raise OSError to signal failure up the chain
+        if already_linked:
+            # E.g. linked by a run whose store update failed, so the link is still recorded
+            print(f"Skipping {file_path_str}: already a hardlink of {original_path_str}.") # Placeholder log
+        elif method is None:
+            if entry_id is not None:
+                self._journal.record_states([entry_id], FAILED)
+            print(f"Warning: Cannot link {file_path_str} to {original_path_str} with link method "
+                  f"'{self._link_method}' on this filesystem. Leaving it in place.") # Placeholder log
+            return
+        else:
+            if entry_id is not None:
+                self._journal.record_states([entry_id], DONE)
+            print(f"Successfully linked {file_path_str} to {original_path_str} ({method})") # Placeholder log
+
+        identities = self._link_identities(file_path_str, original_path_str)
+        links = [(os.path.normcase(file_path_str), os.path.normcase(original_path_str), entry_id)]
+        deferred_identities = getattr(self._deferred, 'identities', None)
+        if deferred_identities is not None:
+            deferred_identities.extend(identities)
+            self._deferred.links.extend(links)
+        else:
+            self._queue_identity_updates(identities, links)
+
+    @staticmethod
+    def _link_identities(file_path_str, original_path_str):
+        """
+        Returns the (path, device, inode, mtime_ns, ctime_ns) identities of a
+        linked duplicate and its original; a hardlink also changes the
+        original's ctime, so both records are refreshed.
+        """
+        identities = []
+        for path_str in (file_path_str, original_path_str):
+            stat = os.stat(path_str)
+            identities.append((os.path.normcase(path_str), stat.st_dev, stat.st_ino,
+                               stat.st_mtime_ns, stat.st_ctime_ns))
+        return identities
+
     def _review_large(self, action_details, staging_dir, dry_run):
         """Moves a large file to the staging area for review using the generic method."""
         # TDD Anchor: [AX_StageLarge]
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Entry states, in the order an entry moves through them. An entry is open
+# until it reaches 'synced' (its new path is committed to the metadata store),
+# 'failed' (the move raised and the source is untouched) or 'rolled_back'.
+INTENT, DONE, SYNCED, FAILED, ROLLED_BACK = 'intent', 'done', 'synced', 'failed', 'rolled_back'
+_CLOSED_STATES = {SYNCED, FAILED, ROLLED_BACK}
+
+
+class JournalEntry(NamedTuple):
+    """The latest state of one journaled move or link (for a link, destination is the original)."""
+    entry_id: int
+    action: str
+    source: str
+    destination: str
+    state: str
+
+
+class ActionJournal:
+    """
+    Append-only write-ahead log of file moves and links, one JSON object per line.
+
+    An intent is written and fsync'd before a file is moved; completion and
+    the metadata store commit are appended afterwards. After a crash,
+    open_entries() lists the moves whose outcome is not known to the store,
+    and ActionExecutor.resume() settles them by looking at the file system.
+    Safe to use from several threads.
+    """
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._next_id = max((entry.entry_id for entry in self._read_entries().values()), default=0) + 1
+        self._drop_torn_line()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _drop_torn_line(self):
+        """
+        Cuts the file back to its last newline, so a line left incomplete by a
+        crash is not continued by the next record.
+        """
+        try:
+            with open(self.path, 'r+b') as journal_file:
+                size = journal_file.seek(0, os.SEEK_END)
+                end = size
+                while end > 0:
+                    start = max(end - 4096, 0)
+                    journal_file.seek(start)
+                    newline = journal_file.read(end - start).rfind(b'\n')
+                    if newline != -1:
+                        end = start + newline + 1
+                        break
+                    end = start
+                if end != size:
+                    logger.warning(f"Dropping an incomplete last line from action journal {self.path}.")
+                    journal_file.truncate(end)
+                    os.fsync(journal_file.fileno())
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Closes the journal file."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _append(self, records: list[dict], durable: bool):
+        """Writes records as lines; with durable, fsyncs before returning. Caller holds the lock."""
+        self._file.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+        self._file.flush()
+        if durable:
+            os.fsync(self._file.fileno())
+
+    def record_intent(self, action: str, source: str, destination: str) -> int:
+        """Durably records a move about to happen and returns its entry id."""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._append([{'id': entry_id, 'state': INTENT, 'action': action,
+                           'source': source, 'destination': destination}], durable=True)
+        return entry_id
+
+    def record_states(self, entry_ids: list[int], state: str):
+        """
+        Records a new state for entries. Only 'synced' is fsync'd: a lost
+        'done' or 'failed' line is recovered from the file system on resume.
+        """
+        if not entry_ids:
+            return
+        with self._lock:
+            self._append([{'id': entry_id, 'state': state} for entry_id in entry_ids], durable=state == SYNCED)
+
+    def _read_entries(self) -> dict[int, JournalEntry]:
+        """Replays the journal file into the latest state per entry; a torn last line is ignored."""
+        entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Ignoring unreadable line in action journal {self.path}.")
+                        continue
+                    entry_id = record['id']
+                    if record['state'] == INTENT:
+                        entries[entry_id] = JournalEntry(entry_id, record['action'], record['source'],
+                                                         record['destination'], INTENT)
+                    elif entry_id in entries:
+                        entries[entry_id] = entries[entry_id]._replace(state=record['state'])
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def open_entries(self) -> list[JournalEntry]:
+        """Returns the entries not yet synced, failed or rolled back, in the order they were started."""
+        with self._lock:
+            self._file.flush()
+            return [entry for entry in self._read_entries().values() if entry.state not in _CLOSED_STATES]
+
+    def compact(self) -> bool:
+        """
+        Empties the journal if every entry is closed, so it does not grow
+        across runs. Returns False, leaving it unchanged, if any entry is open.
+        """
+        with self._lock:
+            self._file.flush()
+            if any(entry.state not in _CLOSED_STATES for entry in self._read_entries().values()):
+                return False
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            return True
@@ -1,5 +1,127 @@
 from datetime import datetime, timezone, timedelta
 from collections import defaultdict # Import defaultdict
+from collections.abc import Mapping
+from .perceptual_hash import DEFAULT_PERCEPTUAL_ALGORITHM
+
+try:
+    import pyarrow as pa # Optional: vectorized ('arrow') analysis mode
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+# Keys exposed by each action type, in the order the dict form used to list them
+_CANDIDATE_KEYS = {
+    'stage_duplicate': ('action', 'path', 'hash', 'original_path', 'reason'),
+    'dedupe_link': ('action', 'path', 'hash', 'original_path', 'reason'),
+    'review_large': ('action', 'path', 'size', 'reason'),
+    'review_old': ('action', 'path', 'last_modified', 'reason'),
+}
+# Actions the duplicate_files rule can take: move duplicates to staging, or replace them with links
+DUPLICATE_ACTIONS = ('stage_duplicate', 'dedupe_link')
+
+
+class ActionCandidate(Mapping):
+    """
+    A compact, read-only action candidate. It behaves like the dict it replaces
+    (candidate['path'], .get(), .items()), but stores only slot fields and
+    formats 'reason' when it is read rather than once per flagged file.
+    """
+    # Per-action fields are mutually exclusive, so they share two slots:
+    # _value holds hash, size or last_modified; _context holds original_path or the rule threshold.
+    __slots__ = ('action', 'path', '_value', '_context')
+
+    def __init__(self, action, path, hash=None, original_path=None, size=None,
+                 last_modified=None, threshold=None):
+        self.action = action
+        self.path = path
+        if action in DUPLICATE_ACTIONS:
+            self._value, self._context = hash, original_path
+        elif action == 'review_large':
+            self._value, self._context = size, threshold
+        else:
+            self._value, self._context = last_modified, threshold
+
+    @property
+    def hash(self):
+        return self._value if self.action in DUPLICATE_ACTIONS else None
+
+    @property
+    def original_path(self):
+        return self._context if self.action in DUPLICATE_ACTIONS else None
+
+    @property
+    def size(self):
+        return self._value if self.action == 'review_large' else None
+
+    @property
+    def last_modified(self):
+        return self._value if self.action not in (*DUPLICATE_ACTIONS, 'review_large') else None
+
+    @property
+    def threshold(self):
+        """min_size_mb or max_days; only used to build 'reason'."""
+        return self._context if self.action not in DUPLICATE_ACTIONS else None
+
+    @property
+    def reason(self) -> str:
+        if self.action in DUPLICATE_ACTIONS:
+            return f"Duplicate of {self.original_path}"
+        if self.action == 'review_large':
+            size_mb = self.size / (1024 * 1024)
+            return f'File size ({size_mb:.1f} MB) exceeds threshold ({self.threshold} MB)'
+        if self.action == 'review_old':
+            return f'File older than {self.threshold} days'
+        return ''
+
+    def __getitem__(self, key):
+        if key not in _CANDIDATE_KEYS.get(self.action, ('action', 'path')):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(_CANDIDATE_KEYS.get(self.action, ('action', 'path')))
+
+    def __len__(self):
+        return len(_CANDIDATE_KEYS.get(self.action, ('action', 'path')))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class CandidateBatch:
+    """
+    A columnar batch of candidates for one action, produced by the Arrow analysis
+    mode. 'columns' is a pyarrow Table holding 'path' plus the action's fields
+    ('hash' and 'original_path', 'size', or 'last_modified'). Iterating yields
+    ActionCandidate rows, so ActionExecutor can consume batches directly; rows
+    are converted one record batch at a time, never the whole table at once.
+    """
+    __slots__ = ('action', 'columns', 'threshold')
+
+    def __init__(self, action, columns, threshold=None):
+        self.action = action
+        self.columns = columns
+        self.threshold = threshold
+
+    def __len__(self):
+        return self.columns.num_rows
+
+    def __iter__(self):
+        for batch in self.columns.to_batches():
+            paths = batch.column('path').to_pylist()
+            if self.action in DUPLICATE_ACTIONS:
+                hashes = batch.column('hash').to_pylist()
+                originals = batch.column('original_path').to_pylist()
+                for path, hash_value, original_path in zip(paths, hashes, originals):
+                    yield ActionCandidate(self.action, path, hash=hash_value, original_path=original_path)
+            elif self.action == 'review_large':
+                for path, size in zip(paths, batch.column('size').to_pylist()):
+                    yield ActionCandidate(self.action, path, size=size, threshold=self.threshold)
+            else:
+                for path, last_modified in zip(paths, batch.column('last_modified').to_pylist()):
+                    yield ActionCandidate(self.action, path, last_modified=last_modified, threshold=self.threshold)
+
 
 class AnalysisEngine:
     """
@@ -22,113 +144,258 @@ class AnalysisEngine:
         """Loads analysis rules from the configuration manager."""
         self.rules = self.config_manager.get('analysis.rules', {})
 
+    def _use_vectorized_mode(self) -> bool:
+        """
+        True when analysis.mode is 'arrow' and pyarrow is available. 'rows' (the
+        default) evaluates rules record by record; 'arrow' over column batches.
+        """
+        if self.config_manager.get('analysis.mode', 'rows') != 'arrow':
+            return False
+        if pa is None:
+            print("Warning: analysis.mode 'arrow' requires pyarrow. Falling back to row-by-row analysis.")
+            return False
+        return True
+
+    def _use_incremental_mode(self) -> bool:
+        """
+        True when analysis.incremental is enabled: rules are re-evaluated only for
+        files changed since the previous run, and candidates are read from the
+        results the metadata store persists between runs.
+        """
+        return self.config_manager.get('analysis.incremental', False) is True
+
     def analyze(self):
         """
         Performs the analysis based on loaded rules and metadata.
 
         Returns:
             dict: A dictionary where keys are action types (str) and values
-                  are lists of file info dictionaries relevant to that action.
+                  are lists of ActionCandidate mappings relevant to that action.
+                  In 'arrow' mode each value is one CandidateBatch instead: it
+                  has the same length and yields the same candidates, but
+                  builds each one only when it is iterated.
         """
+        if self._use_vectorized_mode():
+            tables, thresholds = defaultdict(list), {}
+            for batch in self.iter_candidate_batches():
+                tables[batch.action].append(batch.columns)
+                thresholds[batch.action] = batch.threshold
+            return {action: CandidateBatch(action, pa.concat_tables(tables[action]), thresholds[action])
+                    for action in _CANDIDATE_KEYS if action in tables}
+
         # Use defaultdict to group actions by type
         action_candidates = defaultdict(list)
 
-        self._apply_duplicate_rule(action_candidates)
-        self._apply_large_file_rule(action_candidates)
-        self._apply_old_file_rule(action_candidates)
-
-        return dict(action_candidates) # Convert back to regular dict if needed
-
-    def _apply_duplicate_rule(self, action_candidates: defaultdict):
-        """Applies the duplicate file detection rule."""
-        duplicate_rule = self.rules.get('duplicate_files', {})
-        if not duplicate_rule.get('enabled', False):
-            return # Rule disabled
-
-        duplicate_sets = self.metadata_store.get_duplicates()
-        for hash_value, files in duplicate_sets.items():
-            if len(files) > 1:
-                # Sort files to keep the oldest one (or by path as tie-breaker)
-                files.sort(key=lambda x: (x['last_modified'], x['path']))
-                original_file = files[0]
-                for duplicate_file in files[1:]:
-                    # Append file info dict to the list for 'stage_duplicate'
-                    action_candidates['stage_duplicate'].append({
-                        'action': 'stage_duplicate', # Add action key
-                        'path': duplicate_file['path'],
-                        'hash': hash_value,
-                        'original_path': original_file['path'],
-                        'reason': f"Duplicate of {original_file['path']}"
-                    })
-
-    def _apply_large_file_rule(self, action_candidates: defaultdict):
-        """Applies the large file detection rule."""
+        for candidate in self.iter_candidates():
+            action_candidates[candidate['action']].append(candidate)
+
+        # Buckets keep rule order (duplicates, large, old) whatever order rows arrived in
+        return {action: action_candidates[action] for action in _CANDIDATE_KEYS if action in action_candidates}
+
+    def iter_candidates(self):
+        """
+        Yields action candidates one at a time. All enabled rules are evaluated
+        in a single streaming pass over the metadata store, and each matched
+        file is fanned out into one candidate per rule it matches.
+
+        Yields:
+            ActionCandidate: A read-only mapping with an 'action' key.
+        """
+        if self._use_vectorized_mode():
+            for batch in self.iter_candidate_batches():
+                yield from batch
+            return
+
+        query, min_size_mb, max_days = self._rule_query()
+        if query is None:
+            return
+
+        if self._use_incremental_mode():
+            self.metadata_store.refresh_analysis_results(**query)
+            matches = self.metadata_store.iter_analysis_results()
+        else:
+            matches = self.metadata_store.iter_rule_matches(**query)
+
+        duplicate_action = self._duplicate_action()
+        for match in matches:
+            if match.is_duplicate:
+                yield ActionCandidate(duplicate_action, match.path,
+                                      hash=match.hash, original_path=match.original_path)
+            if match.is_large:
+                yield ActionCandidate('review_large', match.path,
+                                      size=match.size_bytes, threshold=min_size_mb)
+            if match.is_old:
+                # Ensure last_modified is timezone-aware (assuming UTC from MetadataStore)
+                last_modified = match.last_modified
+                if last_modified and last_modified.tzinfo is None:
+                     print(f"Warning: Naive datetime encountered for {match.path}. Assuming UTC.")
+                     last_modified = last_modified.replace(tzinfo=timezone.utc)
+                yield ActionCandidate('review_old', match.path,
+                                      last_modified=last_modified, threshold=max_days)
+
+    def iter_candidate_batches(self):
+        """
+        Evaluates the rules over Arrow column batches from the same single-pass
+        query and yields the results as CandidateBatch objects, without creating
+        a Python object per row.
+
+        Yields:
+            CandidateBatch: A columnar batch of candidates for one action.
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for vectorized analysis")
+        query, min_size_mb, max_days = self._rule_query()
+        if query is None:
+            return
+
+        if self._use_incremental_mode():
+            self.metadata_store.refresh_analysis_results(**query)
+            batches = self.metadata_store.iter_analysis_result_batches()
+        else:
+            batches = self.metadata_store.iter_rule_match_batches(**query)
+
+        duplicate_action = self._duplicate_action()
+        for batch in batches:
+            paths = batch.column('path')
+            duplicates = pa.table({'path': paths, 'hash': batch.column('hash'),
+                                   'original_path': batch.column('original_path')}).filter(batch.column('is_duplicate'))
+            if duplicates.num_rows:
+                yield CandidateBatch(duplicate_action, duplicates)
+
+            large = pa.table({'path': paths, 'size': batch.column('size_bytes')}).filter(batch.column('is_large'))
+            if large.num_rows:
+                yield CandidateBatch('review_large', large, threshold=min_size_mb)
+
+            last_modified = batch.column('last_modified')
+            if last_modified.type.tz is None:
+                # Naive timestamps are stored as UTC
+                last_modified = pc.assume_timezone(last_modified, 'UTC')
+            old = pa.table({'path': paths, 'last_modified': last_modified}).filter(batch.column('is_old'))
+            if old.num_rows:
+                yield CandidateBatch('review_old', old, threshold=max_days)
+
+    def iter_duplicate_groups(self):
+        """
+        Summarizes the whole-file duplicates behind the 'duplicate_files' rule,
+        when it is enabled: one entry per hash group with its copy count,
+        original and reclaimable bytes. Reads only the store's precomputed
+        groups, so the cost follows the number of groups, not files.
+
+        Yields:
+            DuplicateGroup tuples, most wasted bytes first.
+        """
+        if not self._duplicate_rule_enabled():
+            return
+        yield from self.metadata_store.iter_duplicate_group_summaries()
+
+    def iter_near_duplicates(self):
+        """
+        Reports files that share content-defined chunks without being whole-file
+        duplicates, when the 'near_duplicate_files' rule is enabled. These are
+        not action candidates: sharing most bytes does not make either file
+        redundant, so the pairs are reported for review only.
+
+        Yields:
+            SharedChunks tuples with at least 'min_shared_ratio' (default 0.5)
+            of the smaller file's bytes shared, most shared bytes first.
+        """
+        near_duplicate_rule = self.rules.get('near_duplicate_files', {})
+        if not near_duplicate_rule.get('enabled', False):
+            return
+        min_shared_ratio = near_duplicate_rule.get('min_shared_ratio', 0.5)
+        try:
+            min_shared_ratio = float(min_shared_ratio)
+        except (ValueError, TypeError):
+            print("Warning: Near-duplicate rule min_shared_ratio must be a number. Using 0.5.")
+            min_shared_ratio = 0.5
+        yield from self.metadata_store.iter_shared_chunk_pairs(min_shared_ratio=min_shared_ratio)
+
+    def iter_similar_images(self):
+        """
+        Reports visually similar images, when the 'similar_images' rule is
+        enabled: pairs whose perceptual hashes (computed by the scanner with
+        'scanner.perceptual_hash') differ in at most 'max_distance' bits
+        (default 4). Like near duplicates, these are reported for review only.
+
+        Yields:
+            SimilarImages tuples, closest first.
+        """
+        similar_rule = self.rules.get('similar_images', {})
+        if not similar_rule.get('enabled', False):
+            return
+        max_distance = similar_rule.get('max_distance', 4)
+        try:
+            max_distance = int(max_distance)
+            if not 0 <= max_distance <= 16:
+                raise ValueError(max_distance)
+        except (ValueError, TypeError):
+            print("Warning: Similar images rule max_distance must be an integer from 0 to 16. Using 4.")
+            max_distance = 4
+        algorithm = similar_rule.get('algorithm', DEFAULT_PERCEPTUAL_ALGORITHM)
+        yield from self.metadata_store.iter_similar_images(algorithm, max_distance=max_distance)
+
+    def _rule_query(self):
+        """
+        Collects the enabled rules into keyword arguments for the store's
+        single-pass rule query.
+
+        Returns:
+            (query, min_size_mb, max_days), where query is None if no rule is enabled.
+        """
+        min_size_mb = self._large_file_min_size_mb()
+        max_days = self._old_file_max_days()
+        query = {
+            'duplicates': bool(self._duplicate_rule_enabled()),
+            'size_above': min_size_mb * 1024 * 1024 if min_size_mb is not None else None,
+            'modified_before': datetime.now(timezone.utc) - timedelta(days=max_days) if max_days is not None else None,
+        }
+        if not query['duplicates'] and query['size_above'] is None and query['modified_before'] is None:
+            return None, min_size_mb, max_days
+        return query, min_size_mb, max_days
+
+    def _duplicate_rule_enabled(self) -> bool:
+        return self.rules.get('duplicate_files', {}).get('enabled', False)
+
+    def _duplicate_action(self) -> str:
+        """Returns the duplicate_files rule's action, one of DUPLICATE_ACTIONS (default 'stage_duplicate')."""
+        action = self.rules.get('duplicate_files', {}).get('action', 'stage_duplicate')
+        if action not in DUPLICATE_ACTIONS:
+            print(f"Warning: Unknown duplicate_files action '{action}'. Using 'stage_duplicate'.")
+            return 'stage_duplicate'
+        return action
+
+    def _large_file_min_size_mb(self):
+        """Returns the large file threshold in MB, or None if the rule is disabled or misconfigured."""
         large_file_rule = self.rules.get('large_files', {})
         if not large_file_rule.get('enabled', False):
-            return # Rule disabled
+            return None # Rule disabled
 
         min_size_mb = large_file_rule.get('min_size_mb')
         if min_size_mb is None:
             # Log a warning or handle missing config appropriately
             print("Warning: Large file rule enabled but min_size_mb not set.")
-            return
+        return min_size_mb
 
-        min_size_bytes = min_size_mb * 1024 * 1024
-
-        # Query all files for simplicity now. Could optimize later if needed.
-        all_files = self.metadata_store.query_files(criteria={}) # Pass empty criteria dict
-
-        for file_record in all_files:
-            # Check if 'size_bytes' key exists and is not None before comparison
-            if file_record.get('size_bytes') is not None and file_record['size_bytes'] > min_size_bytes:
-                size_mb = file_record['size_bytes'] / (1024 * 1024)
-                # Append file info dict to the list for 'review_large'
-                action_candidates['review_large'].append({
-                    'action': 'review_large', # Add action key
-                    'path': file_record['path'],
-                    'size': file_record['size_bytes'], # Use correct key
-                    'reason': f'File size ({size_mb:.1f} MB) exceeds threshold ({min_size_mb} MB)'
-                })
-    def _apply_old_file_rule(self, action_candidates: defaultdict):
-        """Applies the old file detection rule."""
+    def _old_file_max_days(self):
+        """Returns the old file threshold in days, or None if the rule is disabled or misconfigured."""
         old_file_rule = self.rules.get('old_files', {})
         if not old_file_rule.get('enabled', False):
-            return # Rule disabled
+            return None # Rule disabled
 
         max_days = old_file_rule.get('max_days')
         if max_days is None:
             print("Warning: Old file rule enabled but max_days not set.")
-            return
+            return None
 
         try:
             max_days_int = int(max_days)
             if max_days_int <= 0:
                 print("Warning: Old file rule max_days must be a positive integer.")
-                return
+                return None
         except (ValueError, TypeError):
             print("Warning: Old file rule max_days must be a positive integer.")
-            return
-
-        now = datetime.now(timezone.utc)
-        threshold_date = now - timedelta(days=max_days_int)
-
-        # Query all files for simplicity now.
-        all_files = self.metadata_store.query_files(criteria={}) # Pass empty criteria dict
-
-        for file_record in all_files:
-            # Ensure last_modified is timezone-aware (assuming UTC from MetadataStore)
-            last_modified = file_record.get('last_modified')
-            if last_modified and last_modified.tzinfo is None:
-                 # Attempt to make it timezone-aware, assuming UTC if naive
-                 # This might need adjustment based on how MetadataStore stores dates
-                 print(f"Warning: Naive datetime encountered for {file_record['path']}. Assuming UTC.")
-                 last_modified = last_modified.replace(tzinfo=timezone.utc)
-
-            if last_modified and last_modified < threshold_date:
-                 # Append file info dict to the list for 'review_old'
-                action_candidates['review_old'].append({
-                    'action': 'review_old', # Add action key
-                    'path': file_record['path'],
-                    'last_modified': last_modified, # Store the actual datetime object
-                    'reason': f'File older than {max_days_int} days'
-                })
+            return None
+        return max_days_int
@@ -0,0 +1,206 @@
+import hashlib
+from bisect import bisect_left
+
+try:
+    import numpy as np # Optional: vectorized cut point search
+except ImportError:
+    np = None
+
+# Content-defined chunking (FastCDC). Chunk boundaries depend only on the bytes
+# around them, so an insertion early in a file shifts offsets without changing
+# the chunks that follow, and files sharing most of their bytes share most chunks.
+
+DEFAULT_CHUNK_AVG_SIZE = 64 * 1024
+
+_MASK64 = (1 << 64) - 1
+
+
+def _gear_table() -> tuple[int, ...]:
+    """256 pseudo-random 64-bit values, derived deterministically so boundaries are stable across runs."""
+    return tuple(
+        int.from_bytes(hashlib.blake2b(bytes([value]), digest_size=8).digest(), 'little')
+        for value in range(256)
+    )
+
+
+_GEAR = _gear_table()
+_GEAR_ARRAY = np.array(_GEAR, dtype=np.uint64) if np is not None else None
+# Bytes before a position that its fingerprint still depends on; older bytes are shifted out
+_WINDOW = 63
+# Smaller blocks are rolled byte by byte, as the numpy calls would cost more than they save
+_MIN_VECTORIZED_BLOCK = 1024
+# Larger blocks are searched in spans of this size, whose fingerprint arrays stay in the CPU cache
+_VECTORIZED_SPAN = 32 * 1024
+
+
+def _top_bits_mask(bits: int) -> int:
+    """A mask over the `bits` most significant bits of the 64-bit fingerprint, which mix in the last 64 bytes."""
+    bits = max(bits, 1)
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def new_chunk_hasher():
+    """Creates the hasher used for chunk digests (BLAKE2b, 128-bit)."""
+    return hashlib.blake2b(digest_size=16)
+
+
+class ContentChunker:
+    """
+    Streaming FastCDC chunker. Feed a file's bytes in order with update(), then
+    call finish() for the list of (offset, length, digest) chunks.
+
+    Cut points are found with a gear rolling hash. The first min_size bytes of
+    each chunk are never cut points and are skipped without hashing them into
+    the fingerprint. Up to avg_size a stricter mask is used, and a looser one
+    after it (normalized chunking), so chunk sizes cluster around avg_size.
+    A chunk never exceeds max_size.
+
+    With numpy installed, the fingerprint of every position in a block is
+    computed at once and only the positions matching a mask are visited, so
+    chunking runs close to hashing speed. Without it, each byte is rolled in
+    Python. Both find the same chunks.
+    """
+    __slots__ = ('min_size', 'avg_size', 'max_size', 'chunks', '_mask_strict', '_mask_loose',
+                 '_offset', '_length', '_fingerprint', '_hasher', '_tail', '_scratch')
+
+    def __init__(self, avg_size: int = DEFAULT_CHUNK_AVG_SIZE, min_size: int | None = None,
+                 max_size: int | None = None):
+        if avg_size < 256:
+            raise ValueError(f"Chunk average size must be at least 256 bytes, got {avg_size}")
+        self.avg_size = avg_size
+        self.min_size = min_size if min_size is not None else avg_size // 4
+        self.max_size = max_size if max_size is not None else avg_size * 8
+        bits = avg_size.bit_length() - 1
+        self._mask_strict = _top_bits_mask(bits + 2)
+        self._mask_loose = _top_bits_mask(bits - 2)
+        self.chunks = []
+        self._offset = 0 # File offset of the chunk being assembled
+        self._length = 0
+        self._fingerprint = 0
+        self._hasher = new_chunk_hasher()
+        self._tail = b'' # Last _WINDOW bytes seen
+        self._scratch = None # Reused fingerprint arrays, see _window_fingerprints
+
+    def update(self, data):
+        """Consumes the next block of the file (bytes, bytearray or memoryview)."""
+        if np is None:
+            self._update_bytes(data)
+            return
+        data = memoryview(data)
+        for offset in range(0, len(data), _VECTORIZED_SPAN):
+            span = data[offset:offset + _VECTORIZED_SPAN]
+            if len(span) < _MIN_VECTORIZED_BLOCK:
+                self._update_bytes(span)
+                self._tail = (self._tail + bytes(span[-_WINDOW:]))[-_WINDOW:]
+            else:
+                self._update_vectorized(span)
+
+    def _update_vectorized(self, data):
+        """Consumes a block by searching the cut points of all its positions with numpy."""
+        block = np.frombuffer(data, dtype=np.uint8)
+        fingerprints = self._window_fingerprints(block)
+        candidates = np.flatnonzero((fingerprints & np.uint64(self._mask_loose)) == 0)
+        # The strict mask covers the loose one, so strict cut points are among the candidates
+        strict = set(candidates[(fingerprints[candidates] & np.uint64(self._mask_strict)) == 0].tolist())
+        candidates = candidates.tolist()
+        size = len(block)
+        pos = 0
+        while pos < size:
+            # Until a chunk has rolled a full window past min_size, its fingerprint
+            # still depends on where the chunk started, so those bytes go one by one
+            warm_up = self.min_size + _WINDOW - self._length
+            if warm_up > 0:
+                stop = min(size, pos + warm_up)
+                self._update_bytes(data[pos:stop])
+                pos = stop
+                continue
+
+            end = min(size, pos + self.max_size - self._length)
+            strict_end = min(end, pos + max(self.avg_size - self._length, 0))
+            index, cut = end, False
+            for candidate in candidates[bisect_left(candidates, pos):]:
+                if candidate >= end:
+                    break
+                if candidate >= strict_end or candidate in strict:
+                    index, cut = candidate + 1, True
+                    break
+
+            self._hasher.update(data[pos:index])
+            self._length += index - pos
+            pos = index
+            if cut or self._length >= self.max_size:
+                self._emit()
+            else:
+                # Carried over in case the next block is rolled byte by byte
+                self._fingerprint = int(fingerprints[index - 1])
+
+    def _window_fingerprints(self, block):
+        """
+        Returns the fingerprint after each byte of block, over the 64 bytes ending
+        there (including the end of the previous block). Sums over 1, 2, 4, ... 64
+        bytes are built by doubling: the sum over 2k bytes is the sum over the
+        last k plus the sum over the k before, shifted k bits.
+        """
+        tail = len(self._tail)
+        total = tail + len(block)
+        if self._scratch is None or len(self._scratch[0]) < total:
+            self._scratch = (np.empty(total, dtype=np.uint64), np.empty(total, dtype=np.uint64))
+        fingerprints, shifted = (array[:total] for array in self._scratch)
+        np.take(_GEAR_ARRAY, np.frombuffer(self._tail, dtype=np.uint8), out=fingerprints[:tail], mode='clip')
+        np.take(_GEAR_ARRAY, block, out=fingerprints[tail:], mode='clip')
+        shift = 1
+        while shift < min(total, _WINDOW + 1):
+            np.left_shift(fingerprints[:total - shift], shift, out=shifted[:total - shift])
+            np.add(fingerprints[shift:], shifted[:total - shift], out=fingerprints[shift:])
+            shift *= 2
+        self._tail = block[-_WINDOW:].tobytes() # Copied, as block may be a reused read buffer
+        return fingerprints[tail:]
+
+    def _update_bytes(self, data):
+        """Consumes a block by rolling the fingerprint one byte at a time."""
+        size = len(data)
+        pos = 0
+        gear = _GEAR
+        while pos < size:
+            if self._length < self.min_size:
+                take = min(self.min_size - self._length, size - pos)
+                self._hasher.update(data[pos:pos + take])
+                self._length += take
+                pos += take
+                continue
+
+            fingerprint = self._fingerprint
+            end = min(size, pos + self.max_size - self._length)
+            index = min(end, pos + max(self.avg_size - self._length, 0)) # End of the strict-mask span
+            cut = False
+            # Iterating a slice is about twice as fast as indexing byte by byte
+            for span_start, span_end, mask in ((pos, index, self._mask_strict), (index, end, self._mask_loose)):
+                for index, byte in enumerate(data[span_start:span_end], span_start + 1):
+                    fingerprint = ((fingerprint << 1) + gear[byte]) & _MASK64
+                    if not fingerprint & mask:
+                        cut = True
+                        break
+                if cut:
+                    break
+                index = span_end
+
+            self._hasher.update(data[pos:index])
+            self._length += index - pos
+            pos = index
+            if cut or self._length >= self.max_size:
+                self._emit()
+            else:
+                self._fingerprint = fingerprint
+
+    def _emit(self):
+        self.chunks.append((self._offset, self._length, self._hasher.hexdigest()))
+        self._offset += self._length
+        self._length = 0
+        self._fingerprint = 0
+        self._hasher = new_chunk_hasher()
+
+    def finish(self) -> list[tuple[int, int, str]]:
+        """Closes the final chunk and returns all chunks as (offset, length, digest) tuples."""
+        if self._length:
+            self._emit()
+        return self.chunks
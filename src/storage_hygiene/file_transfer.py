@@ -0,0 +1,302 @@
+import errno
+import os
+import shutil
+import stat
+
+# Optional: reflinks need ioctl, which only exists on Unix
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# How staged files are moved (action_executor.staging_strategy):
+#   auto      rename within a filesystem, else reflink or zero-copy copy, then unlink the source
+#   hardlink  link the destination to the source's inode, then unlink the source; falls back to auto
+STAGING_STRATEGIES = ('auto', 'hardlink')
+DEFAULT_STAGING_STRATEGY = 'auto'
+
+# How duplicates share their original's data (action_executor.link_method, see link_duplicate):
+#   auto      reflink, else hardlink
+#   reflink   an independent copy-on-write file sharing the original's extents
+#   hardlink  another name for the original's inode
+LINK_METHODS = ('auto', 'reflink', 'hardlink')
+DEFAULT_LINK_METHOD = 'auto'
+
+# ioctl request for FICLONE (_IOW(0x94, 9, int)); shares extents on btrfs, XFS and other CoW filesystems
+_FICLONE = 0x40049409
+# Bytes per copy_file_range/sendfile call; both may copy less, so calls are repeated
+_ZERO_COPY_SPAN = 1 << 30
+# Errors meaning "not supported here" rather than an I/O failure, so the next method is tried
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                       errno.EBADF, errno.EPERM, errno.ENOTSUP}
+# Errors after which a hardlink cannot be made, so the strategy falls back to auto
+_NO_HARDLINK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS}
+# Block size for comparing file contents
+_COMPARE_BLOCK = 1 << 20
+# link_duplicate builds a link as .{name}.{pid}.link next to the duplicate
+_LINK_TEMP_SUFFIX = '.link'
+
+
+class DuplicateChangedError(Exception):
+    """A duplicate and its original no longer have the same content, so they were not linked."""
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    """Shares the source's extents with the (empty) destination; False where reflinks are unsupported."""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _UNSUPPORTED_ERRNOS:
+            return False
+        raise
+
+
+def _zero_copy(copy_call, src_fd: int, dst_fd: int) -> bool:
+    """
+    Copies the whole source with copy_call(src_fd, dst_fd, offset, count),
+    which returns the bytes written; the data never passes through Python.
+    Returns False if the first call reports the method as unsupported.
+    """
+    offset = 0
+    while True:
+        try:
+            written = copy_call(src_fd, dst_fd, offset, _ZERO_COPY_SPAN)
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if written == 0:
+            return True
+        offset += written
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def copy_file(src: str, dst: str) -> str:
+    """
+    Copies a regular file to a new path with the cheapest method available:
+    a reflink (FICLONE), then copy_file_range (which the kernel or an NFS/SMB
+    server may also serve without moving the data), then sendfile, then a
+    buffered copy. Permissions and timestamps are copied as by shutil.copy2.
+
+    Args:
+        src: The source file.
+        dst: The destination, which must not exist.
+
+    Returns:
+        The method used: 'reflink', 'copy_file_range', 'sendfile' or 'copy'.
+
+    Raises:
+        FileExistsError: If the destination exists.
+        OSError: If the copy fails; a partial destination is removed.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        try:
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            if _reflink(src_fd, dst_fd):
+                method = 'reflink'
+            elif hasattr(os, 'copy_file_range') and _zero_copy(_copy_file_range, src_fd, dst_fd):
+                method = 'copy_file_range'
+            elif hasattr(os, 'sendfile') and _zero_copy(_sendfile, src_fd, dst_fd):
+                method = 'sendfile'
+            else:
+                shutil.copyfileobj(fsrc, fdst)
+                method = 'copy'
+        except BaseException:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+    return method
+
+
+def move_file(src: str, dst, strategy: str = DEFAULT_STAGING_STRATEGY) -> str:
+    """
+    Moves a regular file, preferring operations that do not copy data.
+
+    With 'auto', a move within a filesystem is an atomic os.rename; across
+    filesystems (including btrfs subvolumes, where a reflink still works) the
+    file is copied with copy_file and the source unlinked. With 'hardlink',
+    the destination is linked to the source's inode before the source is
+    unlinked, so the data never moves and an existing destination is never
+    replaced; where hardlinks are impossible it falls back to 'auto'.
+
+    Args:
+        src: The file to move.
+        dst: The destination path.
+        strategy: One of STAGING_STRATEGIES.
+
+    Returns:
+        The method used: 'rename', 'hardlink', or one of copy_file's methods.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+        OSError: If the move fails; the source is left in place.
+    """
+    if strategy not in STAGING_STRATEGIES:
+        raise ValueError(f"Unknown staging strategy '{strategy}'. Available: {', '.join(STAGING_STRATEGIES)}")
+    src, dst = os.fspath(src), os.fspath(dst)
+
+    if strategy == 'hardlink':
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno not in _NO_HARDLINK_ERRNOS:
+                raise
+        else:
+            os.unlink(src)
+            return 'hardlink'
+
+    try:
+        os.rename(src, dst)
+        return 'rename'
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    method = copy_file(src, dst)
+    os.unlink(src)
+    return method
+
+
+def same_content(path_a: str, path_b: str) -> bool:
+    """True if two files have the same bytes, compared block by block; stops at the first difference."""
+    if os.stat(path_a).st_size != os.stat(path_b).st_size:
+        return False
+    with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+        while True:
+            block = file_a.read(_COMPARE_BLOCK)
+            if block != file_b.read(_COMPARE_BLOCK):
+                return False
+            if not block:
+                return True
+
+
+def _clone_as(original: str, duplicate: str, temp: str) -> bool:
+    """
+    Creates temp as a reflink of original carrying duplicate's permissions,
+    timestamps and ownership. Returns False, leaving no temp file, where
+    reflinks are unsupported or the ownership cannot be kept.
+    """
+    with open(original, 'rb') as fsrc, open(temp, 'xb') as fdst:
+        try:
+            cloned = _reflink(fsrc.fileno(), fdst.fileno())
+            duplicate_stat, temp_stat = os.stat(duplicate), os.fstat(fdst.fileno())
+            if cloned and hasattr(os, 'fchown') and \
+                    (temp_stat.st_uid, temp_stat.st_gid) != (duplicate_stat.st_uid, duplicate_stat.st_gid):
+                os.fchown(fdst.fileno(), duplicate_stat.st_uid, duplicate_stat.st_gid)
+        except PermissionError:
+            cloned = False
+        except BaseException:
+            fdst.close()
+            os.unlink(temp)
+            raise
+    try:
+        if cloned:
+            shutil.copystat(duplicate, temp)
+            return True
+    except BaseException:
+        os.unlink(temp)
+        raise
+    os.unlink(temp)
+    return False
+
+
+def link_duplicate(original: str, duplicate: str, method: str = DEFAULT_LINK_METHOD) -> str | None:
+    """
+    Replaces a duplicate with a file sharing its original's data, freeing the
+    duplicate's blocks without copying anything.
+
+    The two files are compared byte for byte first. A reflink is a separate
+    copy-on-write file that keeps the duplicate's permissions, ownership and
+    timestamps. A hardlink makes the duplicate another name for the
+    original's inode; it is only made when both files have the same
+    permissions and ownership, and the duplicate then shows the original's
+    timestamps. The link is built under a temporary name next to the
+    duplicate and renamed over it, so the duplicate's path always holds
+    either the old or the new file.
+
+    Args:
+        original: The file to keep.
+        duplicate: The file to replace.
+        method: One of LINK_METHODS.
+
+    Returns:
+        The method used, 'reflink' or 'hardlink', or None if neither is
+        possible here (different filesystems, no reflink support, or a
+        hardlink would change the duplicate's permissions or ownership).
+
+    Raises:
+        ValueError: If the method is unknown.
+        DuplicateChangedError: If the contents differ, or either file changed while linking.
+        OSError: If a file cannot be read or replaced; the duplicate is left in place.
+    """
+    if method not in LINK_METHODS:
+        raise ValueError(f"Unknown link method '{method}'. Available: {', '.join(LINK_METHODS)}")
+    original, duplicate = os.fspath(original), os.fspath(duplicate)
+    original_stat, duplicate_stat = os.stat(original), os.stat(duplicate)
+    if original_stat.st_dev != duplicate_stat.st_dev:
+        return None
+    if not same_content(original, duplicate):
+        raise DuplicateChangedError(f"{duplicate} no longer has the same content as {original}")
+
+    directory, name = os.path.split(duplicate)
+    temp = os.path.join(directory, f".{name}.{os.getpid()}{_LINK_TEMP_SUFFIX}")
+    if method != 'hardlink' and _clone_as(original, duplicate, temp):
+        used = 'reflink'
+    elif method != 'reflink' and stat.S_IMODE(original_stat.st_mode) == stat.S_IMODE(duplicate_stat.st_mode) \
+            and (original_stat.st_uid, original_stat.st_gid) == (duplicate_stat.st_uid, duplicate_stat.st_gid):
+        try:
+            os.link(original, temp)
+        except OSError as e:
+            if e.errno in _NO_HARDLINK_ERRNOS:
+                return None
+            raise
+        used = 'hardlink'
+    else:
+        return None
+
+    try:
+        # Neither file may have been rewritten since they were compared (a hardlink changes only ctime)
+        for path, before in ((original, original_stat), (duplicate, duplicate_stat)):
+            after = os.stat(path)
+            if (after.st_ino, after.st_size, after.st_mtime_ns) != (before.st_ino, before.st_size, before.st_mtime_ns):
+                raise DuplicateChangedError(f"{path} changed while it was being linked")
+        os.replace(temp, duplicate)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return used
+
+
+def remove_link_temps(duplicate: str) -> int:
+    """
+    Removes the temporary links that interrupted link_duplicate calls left next
+    to a duplicate, by any process. Returns the number removed.
+    """
+    directory, name = os.path.split(os.fspath(duplicate))
+    prefix = f".{name}."
+    removed = 0
+    try:
+        with os.scandir(directory or '.') as entries:
+            temps = [entry.path for entry in entries if entry.name.startswith(prefix)
+                     and entry.name.endswith(_LINK_TEMP_SUFFIX)
+                     and entry.name[len(prefix):-len(_LINK_TEMP_SUFFIX)].isdigit()]
+    except FileNotFoundError:
+        return 0
+    for temp in temps:
+        try:
+            os.unlink(temp)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,46 @@
+import hashlib
+
+# Optional fast hashers; only offered when the package is installed
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_HASH_ALGORITHM = 'sha256'
+
+_HASHER_FACTORIES = {
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+}
+if blake3 is not None:
+    _HASHER_FACTORIES['blake3'] = blake3.blake3
+if xxhash is not None:
+    _HASHER_FACTORIES['xxh3'] = xxhash.xxh3_128
+
+
+def available_algorithms() -> list[str]:
+    """Returns the names of the hash algorithms usable in this environment."""
+    return sorted(_HASHER_FACTORIES)
+
+
+def new_hasher(algorithm: str = DEFAULT_HASH_ALGORITHM):
+    """
+    Creates a hasher object with the hashlib interface (update/hexdigest).
+
+    Args:
+        algorithm: One of available_algorithms().
+
+    Raises:
+        ValueError: If the algorithm is unknown or its package is not installed.
+    """
+    factory = _HASHER_FACTORIES.get(algorithm)
+    if factory is None:
+        raise ValueError(
+            f"Unsupported hash algorithm '{algorithm}'. Available: {', '.join(available_algorithms())}"
+        )
+    return factory()
@@ -20,6 +20,46 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = "config.yaml" # Assuming a default config name
 DEFAULT_DB_PATH = "metadata.db" # Assuming a default db name
+TOP_DUPLICATE_GROUPS = 10 # Duplicate groups listed individually in the analysis summary
+
+def _run_scan(args, config_manager, metadata_store):
+    """Scans the target directories into the metadata store, exiting if none is valid."""
+    logger.info("Initializing scanner...")
+    scanner = Scanner(config_manager, metadata_store) # Pass store instance
+    scan_targets = [Path(d) for d in args.target_dirs]
+    logger.info(f"Scanning target directories: {', '.join(map(str, scan_targets))}")
+    scan_errors = False
+    found_valid_target = False # Track if at least one target is valid
+    for target_dir in scan_targets:
+        if not target_dir.is_dir():
+            logger.warning(f"Target directory not found or is not a directory: {target_dir}. Skipping.")
+            continue # Skip this invalid target
+
+        found_valid_target = True # Mark that we found at least one valid target
+        try:
+            logger.info(f"Scanning {target_dir}...")
+            scanner.scan_directory(target_dir)
+            logger.info(f"Finished scanning {target_dir}.")
+        except OSError as e: # Catch specific file access errors
+            logger.error(f"Error accessing file during scan of {target_dir}: {e}", exc_info=True)
+            scan_errors = True
+            # Continue scanning other files/directories
+        except ValueError as e: # Catch critical data errors (e.g., from MetadataStore upsert)
+             logger.critical(f"Critical data error during scanning of {target_dir}: {e}", exc_info=True)
+             scan_errors = True # Mark error occurred
+             raise # Re-raise to halt execution via outer try/except
+        except Exception as e: # Catch other unexpected errors during scan
+            logger.error(f"Unexpected error during scanning of {target_dir}: {e}", exc_info=True)
+            scan_errors = True
+            # Continue scanning other directories for now
+
+    if not found_valid_target:
+         logger.error("No valid target directories found to scan.")
+         sys.exit(1) # Exit if no valid targets were provided/found
+
+    if scan_errors:
+        logger.warning("Errors occurred during scanning. Proceeding with analysis, but results may be incomplete.")
+    logger.info("Scanning phase complete.")
 
 def main():
     """Main function to orchestrate the storage hygiene workflow."""
@@ -32,7 +72,7 @@ def main():
     )
     parser.add_argument(
         "target_dirs",
-        nargs='+', # Require at least one directory
+        nargs='*', # At least one directory is required unless resuming
         type=str,
         help="One or more target directories to scan."
     )
@@ -47,7 +87,17 @@ def main():
         action="store_true",
         help="Perform a dry run without executing any file actions."
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Settle the moves an interrupted run left in the action journal, then analyze "
+             "and execute again without rescanning."
+    )
     args = parser.parse_args()
+    if not args.target_dirs and not args.resume:
+        parser.error("at least one target directory is required unless --resume is given")
+    if args.resume and args.dry_run:
+        parser.error("--resume cannot be combined with --dry-run")
 
     logger.info("Starting Storage Hygiene System...")
 
@@ -76,48 +126,30 @@ def main():
 
     # --- 2. Initialize and Use MetadataStore ---
     db_path = args.db_path
+    memory_limit = config_manager.get('metadata_store.memory_limit')
+    # The journal lives next to the database whose paths it keeps in step with the disk
+    journal_path = config_manager.get('action_executor.journal_path') or f"{db_path}.journal"
     logger.info(f"Initializing metadata store at: {db_path}")
     try:
         # Use MetadataStore as a context manager
-        with MetadataStore(db_path=db_path) as metadata_store:
-
-            # --- 3. Run Scanner (within the 'with' block) ---
-            logger.info("Initializing scanner...")
-            scanner = Scanner(config_manager, metadata_store) # Pass store instance
-            scan_targets = [Path(d) for d in args.target_dirs]
-            logger.info(f"Scanning target directories: {', '.join(map(str, scan_targets))}")
-            scan_errors = False
-            found_valid_target = False # Track if at least one target is valid
-            for target_dir in scan_targets:
-                if not target_dir.is_dir():
-                    logger.warning(f"Target directory not found or is not a directory: {target_dir}. Skipping.")
-                    continue # Skip this invalid target
-
-                found_valid_target = True # Mark that we found at least one valid target
+        with MetadataStore(db_path=db_path, memory_limit=memory_limit) as metadata_store:
+
+            # --- 3. Settle an interrupted run, or Run Scanner (within the 'with' block) ---
+            if args.resume:
+                logger.info(f"Resuming from action journal: {journal_path}")
                 try:
-                    logger.info(f"Scanning {target_dir}...")
-                    scanner.scan_directory(target_dir)
-                    logger.info(f"Finished scanning {target_dir}.")
-                except OSError as e: # Catch specific file access errors
-                    logger.error(f"Error accessing file during scan of {target_dir}: {e}", exc_info=True)
-                    scan_errors = True
-                    # Continue scanning other files/directories
-                except ValueError as e: # Catch critical data errors (e.g., from MetadataStore upsert)
-                     logger.critical(f"Critical data error during scanning of {target_dir}: {e}", exc_info=True)
-                     scan_errors = True # Mark error occurred
-                     raise # Re-raise to halt execution via outer try/except
-                except Exception as e: # Catch other unexpected errors during scan
-                    logger.error(f"Unexpected error during scanning of {target_dir}: {e}", exc_info=True)
-                    scan_errors = True
-                    # Continue scanning other directories for now
-
-            if not found_valid_target:
-                 logger.error("No valid target directories found to scan.")
-                 sys.exit(1) # Exit if no valid targets were provided/found
-
-            if scan_errors:
-                logger.warning("Errors occurred during scanning. Proceeding with analysis, but results may be incomplete.")
-            logger.info("Scanning phase complete.")
+                    ActionExecutor(config_manager, metadata_store, journal_path=journal_path).resume()
+                except OSError as e:
+                    logger.critical(f"Critical OS error while resuming the action journal: {e}", exc_info=True)
+                    sys.exit(1)
+            else:
+                _run_scan(args, config_manager, metadata_store)
+                if config_manager.get('metadata_store.optimize_layout', False):
+                    logger.info("Rewriting the metadata store in hash order...")
+                    try:
+                        metadata_store.optimize_layout()
+                    except Exception as e: # The rewrite is rolled back; the store is still usable
+                        logger.warning(f"Could not optimize the metadata store layout: {e}")
 
             # --- 4. Run AnalysisEngine (within the 'with' block) ---
             logger.info("Initializing analysis engine...")
@@ -131,6 +163,21 @@ def main():
                 for action_type, files in analysis_results.items():
                    if files: # Only log if there are files for this action type
                        logger.info(f" - {action_type}: {len(files)} files")
+                duplicate_groups, wasted_bytes = 0, 0
+                for group in analysis_engine.iter_duplicate_groups():
+                    duplicate_groups += 1
+                    wasted_bytes += group.wasted_bytes or 0
+                    if duplicate_groups <= TOP_DUPLICATE_GROUPS:
+                        logger.info(f" - duplicate group: {group.file_count} copies of {group.original_path}, "
+                                    f"{(group.wasted_bytes or 0) / (1024 * 1024):.1f} MB reclaimable")
+                if duplicate_groups:
+                    logger.info(f" - duplicates: {duplicate_groups} groups, "
+                                f"{wasted_bytes / (1024 * 1024):.1f} MB reclaimable")
+                for pair in analysis_engine.iter_near_duplicates():
+                    logger.info(f" - near duplicate: {pair.path} and {pair.other_path} share "
+                                f"{pair.shared_bytes / (1024 * 1024):.1f} MB ({pair.shared_ratio:.0%})")
+                for pair in analysis_engine.iter_similar_images():
+                    logger.info(f" - similar images: {pair.path} and {pair.other_path} (distance {pair.distance})")
             except Exception as e:
                 logger.error(f"Error during analysis: {e}", exc_info=True)
                 sys.exit(1) # Exit if analysis fails within the 'with' block
@@ -142,7 +189,7 @@ def main():
             else:
                 logger.info("Initializing action executor...")
                 # Instantiate without dry_run, as it's handled in execute_actions
-                action_executor = ActionExecutor(config_manager, metadata_store) # Pass metadata_store
+                action_executor = ActionExecutor(config_manager, metadata_store, journal_path=journal_path)
                 logger.info(f"Executing actions... (Dry Run: {effective_dry_run})")
                 try:
                     # Pass the effective_dry_run value as an override
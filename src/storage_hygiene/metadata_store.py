@@ -1,23 +1,177 @@
 import duckdb
 from pathlib import Path
+import itertools
 import logging
+import math
+import time
 from collections import defaultdict # Import defaultdict
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple
+from .hashing import DEFAULT_HASH_ALGORITHM
+
+try:
+    import pyarrow as pa # Optional: fastest bulk ingestion path
+except ImportError:
+    pa = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Column order used by upserts and record queries
+_FILE_COLUMNS = ('path', 'filename', 'size_bytes', 'last_modified', 'hash', 'last_scanned', 'hash_algorithm',
+                 'device', 'inode', 'mtime_ns', 'ctime_ns')
+_SELECT_COLUMNS = ', '.join(_FILE_COLUMNS)
+# Keys every upserted record must provide; the rest default to NULL
+_REQUIRED_KEYS = {'path', 'filename', 'size_bytes', 'last_modified', 'hash', 'last_scanned'}
+# Secondary indexes maintained by the schema: hash and inode lookups. The size
+# and age rules scan the table (their predicates sit in projections), so
+# indexes on those columns only slowed writes; earlier databases drop them
+_FILE_INDEXES = {
+    'idx_files_hash': 'hash',
+    'idx_files_inode': 'inode',
+}
+_DROPPED_FILE_INDEXES = ('idx_files_size_bytes', 'idx_files_last_modified', 'idx_files_last_scanned')
+# Physical order written by optimize_layout(); keeps duplicate groups contiguous
+_LAYOUT_ORDER = 'hash_algorithm, hash, size_bytes, path'
+# Every write to a files row takes the next value of this sequence, so rows
+# changed since an earlier point are those with a larger change_seq
+_NEXT_CHANGE_SEQ = "nextval('files_change_seq')"
+# Rows per multi-row VALUES statement when pyarrow is not installed
+_VALUES_CHUNK_ROWS = 1000
+# Rows pulled per fetchmany() call by the streaming iterators
+_ITER_BATCH_ROWS = 10000
+# Rows per Arrow record batch for the columnar iterators
+_ARROW_BATCH_ROWS = 122880
+# Comparison operators accepted by range conditions
+_RANGE_OPERATORS = {'=', '!=', '<', '<=', '>', '>='}
+
+class FileRecord(NamedTuple):
+    """One row of the 'files' table, in _FILE_COLUMNS order. Yielded by the streaming iterators."""
+    path: str
+    filename: str | None = None
+    size_bytes: int | None = None
+    last_modified: datetime | None = None
+    hash: str | None = None
+    last_scanned: datetime | None = None
+    hash_algorithm: str | None = None
+    device: int | None = None # st_dev, st_ino and st_mtime_ns when the file was hashed
+    inode: int | None = None
+    mtime_ns: int | None = None
+    ctime_ns: int | None = None # st_ctime_ns, compared with mtime_ns and size by the incremental scan
+
+
+class RuleMatch(NamedTuple):
+    """A file matched by at least one analysis rule, labelled with every rule it matches."""
+    path: str
+    hash: str | None
+    size_bytes: int | None
+    last_modified: datetime | None
+    original_path: str | None # Oldest file sharing this hash; set when is_duplicate
+    is_duplicate: bool
+    is_large: bool
+    is_old: bool
+    hash_algorithm: str | None = None
+
+
+# RuleMatch columns; also the column order of the analysis_results table
+_RULE_MATCH_COLUMNS = ', '.join(RuleMatch._fields)
+
+
+class DuplicateGroup(NamedTuple):
+    """One row of the 'duplicate_groups' table: a hash shared by more than one file."""
+    hash_algorithm: str | None
+    hash: str
+    file_count: int
+    wasted_bytes: int | None # Total size of every copy except the original
+    original_path: str # Oldest file in the group, ties broken by path
+
+
+class SharedChunks(NamedTuple):
+    """Two files with different content that share content-defined chunks."""
+    path: str
+    other_path: str
+    shared_bytes: int # Bytes of the chunks both files contain
+    chunked_bytes: int # Bytes of path's distinct chunks
+    other_chunked_bytes: int
+    shared_ratio: float # shared_bytes over the smaller file's chunked bytes
+
+
+class SimilarImages(NamedTuple):
+    """Two images whose perceptual hashes differ in at most the requested number of bits."""
+    path: str
+    other_path: str
+    distance: int # Hamming distance between the 64-bit perceptual hashes
+
+
+# Cap on block combinations (self-joins) per similarity query, see _hamming_index_plan
+_MAX_HAMMING_COMBINATIONS = 100
+
+
+def _hamming_index_plan(max_distance: int, rows: int) -> tuple[list[tuple[int, int]], list[tuple[int, ...]]]:
+    """
+    Plans a multi-index Hamming search over 64-bit hashes. Split into m blocks,
+    two hashes within max_distance bits agree exactly on at least
+    m - max_distance blocks (pigeonhole), so joining on every combination of
+    that many blocks finds all close pairs without comparing all pairs. m
+    grows until a combination spans about log2(rows) + 2 bits, so each lookup
+    meets few unrelated hashes, while the number of combinations stays small.
+
+    Returns:
+        ([(shift, width)] per block, [block index tuple] per combination).
+    """
+    target_bits = math.ceil(math.log2(max(rows, 2))) + 2
+    blocks = max_distance + 1
+    while blocks < 64 and 64 * (blocks - max_distance) // blocks < target_bits and \
+            math.comb(blocks + 1, max_distance) <= _MAX_HAMMING_COMBINATIONS:
+        blocks += 1
+    widths = [64 // blocks + (1 if i < 64 % blocks else 0) for i in range(blocks)]
+    shifts = [64 - sum(widths[:i + 1]) for i in range(blocks)]
+    return list(zip(shifts, widths)), list(itertools.combinations(range(blocks), blocks - max_distance))
+
+
+# A linked_files row l still describes the files row f: the file at that path is the
+# link dedupe_link made (a hardlink changes ctime when any other name is linked)
+_LINK_IS_CURRENT = "COALESCE(l.device = f.device AND l.inode = f.inode AND l.mtime_ns = f.mtime_ns, FALSE)"
+# Aggregates hash groups of the files table into duplicate_groups rows; the original
+# is the oldest file, ties broken by path. Files replaced by a link come last, since
+# a hardlink takes its original's timestamps. 'filter' selects the rows to group.
+_DUPLICATE_GROUP_SQL = f"""
+    SELECT hash_algorithm, hash, COUNT(*) AS file_count,
+           SUM(f.size_bytes) - FIRST(f.size_bytes ORDER BY {_LINK_IS_CURRENT}, f.last_modified, f.path) AS wasted_bytes,
+           FIRST(f.path ORDER BY {_LINK_IS_CURRENT}, f.last_modified, f.path) AS original_path
+    FROM files f LEFT JOIN linked_files l ON l.path = f.path
+    WHERE {{filter}}
+    GROUP BY hash_algorithm, hash
+    HAVING COUNT(*) > 1
+"""
+_HASHED_ROWS = "hash IS NOT NULL AND hash != ''"
+
+
+def _record_values(file_metadata: dict) -> tuple:
+    """
+    Returns the column values of a record in _FILE_COLUMNS order. Hashed records
+    written without 'hash_algorithm' are assumed to use the default algorithm.
+    """
+    record = dict(file_metadata)
+    if record.get('hash') and not record.get('hash_algorithm'):
+        record['hash_algorithm'] = DEFAULT_HASH_ALGORITHM
+    return tuple(record.get(col) for col in _FILE_COLUMNS)
+
+
 class MetadataStore:
     """
     Manages the DuckDB database connection and operations for file metadata.
     """
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, memory_limit: str | None = None):
         """
         Initializes the MetadataStore, connecting to the DuckDB database.
         Creates the database file if it doesn't exist.
 
         Args:
             db_path: The path to the DuckDB database file.
+            memory_limit: Optional DuckDB memory limit (e.g. '512MB'). Sorts and
+                          buffered pages beyond it spill to disk instead of RAM.
         """
         self.db_path = db_path
         self.conn = None
@@ -25,6 +179,9 @@ class MetadataStore:
             # Connect to the database (creates the file if it doesn't exist)
             self.conn = duckdb.connect(database=str(self.db_path), read_only=False)
             logger.info(f"Successfully connected to database: {self.db_path}")
+            if memory_limit:
+                self.conn.execute("SET memory_limit = ?", [str(memory_limit)])
+                logger.info(f"Database memory limit set to {memory_limit}")
             # Initialize schema
             self._initialize_schema()
         except Exception as e:
@@ -60,19 +217,111 @@ class MetadataStore:
 
         try:
             cursor = self.conn.cursor()
+            cursor.execute("CREATE SEQUENCE IF NOT EXISTS files_change_seq;")
             # TDD Anchor: [MS_Schema] - Create files table
-            cursor.execute("""
+            cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS files (
                     path VARCHAR PRIMARY KEY,
                     filename VARCHAR,
                     size_bytes BIGINT,
                     last_modified TIMESTAMP WITH TIME ZONE,
                     hash VARCHAR,
-                    last_scanned TIMESTAMP WITH TIME ZONE
+                    last_scanned TIMESTAMP WITH TIME ZONE,
+                    hash_algorithm VARCHAR,
+                    change_seq BIGINT DEFAULT {_NEXT_CHANGE_SEQ},
+                    device UBIGINT,
+                    inode UBIGINT,
+                    mtime_ns BIGINT,
+                    ctime_ns BIGINT
+                );
+            """)
+            # Migrate databases created before hashes recorded their algorithm;
+            # every hash written before then was SHA-256.
+            cursor.execute("ALTER TABLE files ADD COLUMN IF NOT EXISTS hash_algorithm VARCHAR;")
+            cursor.execute(f"""
+                UPDATE files SET hash_algorithm = '{DEFAULT_HASH_ALGORITHM}'
+                WHERE hash IS NOT NULL AND hash != '' AND hash_algorithm IS NULL;
+            """)
+            # Databases created before change tracking get a sequence value per existing row
+            cursor.execute(f"ALTER TABLE files ADD COLUMN IF NOT EXISTS change_seq BIGINT DEFAULT {_NEXT_CHANGE_SEQ};")
+            # File identity for hash reuse across renames and nanosecond change detection;
+            # unknown (NULL) for rows written before, which are rehashed on their next scan
+            for column, column_type in (('device', 'UBIGINT'), ('inode', 'UBIGINT'), ('mtime_ns', 'BIGINT'),
+                                        ('ctime_ns', 'BIGINT')):
+                cursor.execute(f"ALTER TABLE files ADD COLUMN IF NOT EXISTS {column} {column_type};")
+            for index_name, column in _FILE_INDEXES.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON files ({column});")
+            for index_name in _DROPPED_FILE_INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+            # Duplicates replaced by a link to their original, with the identity the link left
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS linked_files (
+                    path VARCHAR PRIMARY KEY,
+                    original_path VARCHAR,
+                    device UBIGINT,
+                    inode UBIGINT,
+                    mtime_ns BIGINT
+                );
+            """)
+            # Duplicate groups are kept current by writes; existing databases are filled once here
+            groups_exist = cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'duplicate_groups';").fetchone()[0]
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS duplicate_groups (
+                    hash_algorithm VARCHAR,
+                    hash VARCHAR,
+                    file_count BIGINT,
+                    wasted_bytes BIGINT,
+                    original_path VARCHAR
+                );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_duplicate_groups_hash ON duplicate_groups (hash);")
+            if not groups_exist:
+                cursor.execute(f"INSERT INTO duplicate_groups {_DUPLICATE_GROUP_SQL.format(filter=_HASHED_ROWS)};")
+            # Groups whose rows were written since the last recount; readers recount them first
+            cursor.execute("CREATE TABLE IF NOT EXISTS stale_duplicate_groups (hash_algorithm VARCHAR, hash VARCHAR);")
+            # Content-defined chunks of large files, written by the scanner when chunking is enabled
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    path VARCHAR,
+                    chunk_offset BIGINT,
+                    length BIGINT,
+                    hash VARCHAR
+                );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks (path);")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks (hash);")
+            # 64-bit perceptual hashes of image files, written by the scanner when enabled
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS perceptual_hashes (
+                    path VARCHAR PRIMARY KEY,
+                    algorithm VARCHAR,
+                    hash UBIGINT
+                );
+            """)
+            # Persisted rule matches and the watermark for incremental analysis
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_results (
+                    path VARCHAR PRIMARY KEY,
+                    hash VARCHAR,
+                    size_bytes BIGINT,
+                    last_modified TIMESTAMP WITH TIME ZONE,
+                    original_path VARCHAR,
+                    is_duplicate BOOLEAN,
+                    is_large BOOLEAN,
+                    is_old BOOLEAN,
+                    hash_algorithm VARCHAR
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_state (
+                    id INTEGER PRIMARY KEY,
+                    watermark BIGINT,
+                    duplicates BOOLEAN,
+                    size_above BIGINT,
+                    modified_before TIMESTAMP WITH TIME ZONE
                 );
             """)
-            # Consider adding indexes later for performance if needed, e.g., on hash or last_scanned
-            # cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_hash ON files (hash);")
             logger.info("Database schema initialized successfully (files table).")
             cursor.close() # Close cursor after use
         except Exception as e:
@@ -90,6 +339,7 @@ class MetadataStore:
             file_metadata: A dictionary containing file metadata matching the table schema.
                            Expected keys: 'path', 'filename', 'size_bytes',
                                           'last_modified', 'hash', 'last_scanned'.
+                           Optional keys: 'hash_algorithm' (defaults to SHA-256 for hashed records).
         """
         if not self.conn:
             logger.error("Cannot upsert record, no database connection.")
@@ -97,37 +347,147 @@ class MetadataStore:
             return
 
         # Ensure all required keys are present (optional but good practice)
-        required_keys = {'path', 'filename', 'size_bytes', 'last_modified', 'hash', 'last_scanned'}
+        required_keys = _REQUIRED_KEYS
         if not required_keys.issubset(file_metadata):
             missing = required_keys - set(file_metadata)
             logger.error(f"Missing required keys for upsert: {missing}")
             raise ValueError(f"Missing required keys for upsert: {missing}") # Raise error
 
-        sql = """
-            INSERT OR REPLACE INTO files (path, filename, size_bytes, last_modified, hash, last_scanned)
-            VALUES (?, ?, ?, ?, ?, ?);
-        """
-        params = (
-            file_metadata['path'],
-            file_metadata['filename'],
-            file_metadata['size_bytes'],
-            file_metadata['last_modified'],
-            file_metadata['hash'],
-            file_metadata['last_scanned'],
-        )
+        sql = f"""
+            INSERT OR REPLACE INTO files ({_SELECT_COLUMNS}, change_seq)
+            VALUES ({', '.join('?' * len(_FILE_COLUMNS))}, {_NEXT_CHANGE_SEQ});
+        """
+        params = _record_values(file_metadata)
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(sql, params)
+            # One transaction so the groups are marked stale together with the row change
+            self.conn.begin()
+            # Recount both the group the row leaves and the group it joins
+            self._touch_duplicate_groups("path = ?", [file_metadata['path']])
+            self.conn.execute(sql, params)
+            self._touch_duplicate_groups("path = ?", [file_metadata['path']])
             self.conn.commit() # Explicitly commit changes
             logger.debug(f"Upserted record for path: {file_metadata['path']}")
-            cursor.close()
         except Exception as e:
             logger.error(f"Failed to upsert record for path {file_metadata.get('path', 'N/A')}: {e}")
-            # Consider rolling back if part of a larger transaction context
-            # self.conn.rollback()
+            self.conn.rollback()
             raise # Re-raise the exception
 
+    def upsert_file_records(self, records, batch_size: int = 50000) -> int:
+        """
+        Inserts or updates many file records inside a single transaction.
+        Records are loaded in batches through Arrow ingestion when pyarrow is
+        installed, otherwise through multi-row INSERT OR REPLACE statements.
+
+        Args:
+            records: An iterable of dictionaries with the same keys as
+                     upsert_file_record expects.
+            batch_size: Number of records loaded per batch.
+
+        Returns:
+            The number of records written.
+        """
+        if not self.conn:
+            logger.error("Cannot upsert records, no database connection.")
+            return 0
+
+        required_keys = _REQUIRED_KEYS
+        start = time.perf_counter()
+        total = 0
+        batch = {}
+        try:
+            self.conn.begin()
+            for file_metadata in records:
+                if not required_keys.issubset(file_metadata):
+                    missing = required_keys - set(file_metadata)
+                    logger.error(f"Missing required keys for upsert: {missing}")
+                    raise ValueError(f"Missing required keys for upsert: {missing}")
+                # Keyed by path so a batch never holds two rows for one primary key
+                batch[file_metadata['path']] = _record_values(file_metadata)
+                if len(batch) >= batch_size:
+                    total += self._insert_batch(list(batch.values()))
+                    batch = {}
+            if batch:
+                total += self._insert_batch(list(batch.values()))
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to upsert batch of records: {e}")
+            self.conn.rollback()
+            raise
+
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed > 0 else float(total)
+        logger.info(f"Upserted {total} records in {elapsed:.2f}s ({rate:.0f} rows/s).")
+        return total
+
+    def _insert_batch(self, rows: list[tuple]) -> int:
+        """
+        Writes one batch of row tuples (in _FILE_COLUMNS order), replacing rows
+        with the same path. New paths are inserted through the primary key index;
+        rows whose path is already stored are deleted and re-inserted, the delete
+        returning the hashes of the duplicate groups they leave, which are marked
+        stale together with the groups of the batch's own hashes. Runs on the
+        main connection so it joins the caller's open transaction.
+        """
+        columns = _SELECT_COLUMNS
+        if pa is not None:
+            timestamp_type = pa.timestamp('us', tz='UTC')
+            column_types = {'size_bytes': pa.int64(), 'last_modified': timestamp_type, 'last_scanned': timestamp_type,
+                            'device': pa.uint64(), 'inode': pa.uint64(), 'mtime_ns': pa.int64(),
+                            'ctime_ns': pa.int64()}
+
+            def arrow_table(batch_rows):
+                return pa.table({
+                    col: pa.array(values, column_types.get(col, pa.string()))
+                    for col, values in zip(_FILE_COLUMNS, zip(*batch_rows))
+                })
+
+            self.conn.register('staging_files', arrow_table(rows))
+            try:
+                inserted = {row[0] for row in self.conn.execute(f"""
+                    INSERT INTO files ({columns}, change_seq)
+                    SELECT {columns}, {_NEXT_CHANGE_SEQ} FROM staging_files
+                    ON CONFLICT DO NOTHING RETURNING path;
+                """).fetchall()}
+                if len(inserted) < len(rows):
+                    replaced = [row for row in rows if row[0] not in inserted]
+                    self.conn.register('replaced_files', arrow_table(replaced))
+                    try:
+                        self._mark_groups_stale(self.conn.execute(
+                            "DELETE FROM files WHERE path IN (SELECT path FROM replaced_files) RETURNING hash_algorithm, hash;"
+                        ).fetchall())
+                        self.conn.execute(f"""
+                            INSERT INTO files ({columns}, change_seq)
+                            SELECT {columns}, {_NEXT_CHANGE_SEQ} FROM replaced_files;
+                        """)
+                    finally:
+                        self.conn.unregister('replaced_files')
+                self.conn.execute(f"""
+                    INSERT INTO stale_duplicate_groups
+                    SELECT DISTINCT hash_algorithm, hash FROM staging_files WHERE {_HASHED_ROWS};
+                """)
+            finally:
+                self.conn.unregister('staging_files')
+        else:
+            placeholders = '(' + ', '.join('?' * len(_FILE_COLUMNS)) + f', {_NEXT_CHANGE_SEQ})'
+            hash_index, algorithm_index = _FILE_COLUMNS.index('hash'), _FILE_COLUMNS.index('hash_algorithm')
+            for offset in range(0, len(rows), _VALUES_CHUNK_ROWS):
+                chunk = rows[offset:offset + _VALUES_CHUNK_ROWS]
+                values = ', '.join([placeholders] * len(chunk))
+                inserted = {row[0] for row in self.conn.execute(
+                    f"INSERT INTO files ({columns}, change_seq) VALUES {values} ON CONFLICT DO NOTHING RETURNING path;",
+                    [value for row in chunk for value in row]).fetchall()}
+                replaced = [row for row in chunk if row[0] not in inserted]
+                if replaced:
+                    self._mark_groups_stale(self.conn.execute(
+                        f"DELETE FROM files WHERE path IN ({', '.join('?' * len(replaced))}) RETURNING hash_algorithm, hash;",
+                        [row[0] for row in replaced]).fetchall())
+                    self.conn.execute(
+                        f"INSERT INTO files ({columns}, change_seq) VALUES {', '.join([placeholders] * len(replaced))};",
+                        [value for row in replaced for value in row])
+                self._mark_groups_stale([(row[algorithm_index], row[hash_index]) for row in chunk])
+        return len(rows)
+
     def update_file_path(self, old_path: str, new_path: str):
         """
         Updates the path and filename of a file record in the database.
@@ -143,28 +503,107 @@ class MetadataStore:
         new_path_obj = Path(new_path)
         new_filename = new_path_obj.name
 
-        sql = """
+        sql = f"""
             UPDATE files
-            SET path = ?, filename = ?
+            SET path = ?, filename = ?, change_seq = {_NEXT_CHANGE_SEQ}
             WHERE path = ?;
         """
         params = (new_path, new_filename, old_path)
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(sql, params)
-            updated_rows = cursor.rowcount # DuckDB returns rowcount after execute
+            self.conn.begin()
+            # The hash is unchanged, but the group's original may have been the moved file
+            self._touch_duplicate_groups("path = ?", [old_path])
+            updated_rows = self.conn.execute(sql, params).fetchone()[0] # DuckDB returns the updated row count
+            self.conn.execute("UPDATE chunks SET path = ? WHERE path = ?;", [new_path, old_path])
+            self.conn.execute("UPDATE perceptual_hashes SET path = ? WHERE path = ?;", [new_path, old_path])
+            if updated_rows:
+                # A link record describes the file at its path, so neither path keeps one
+                self.conn.execute("DELETE FROM linked_files WHERE path IN (?, ?);", [old_path, new_path])
             self.conn.commit()
             if updated_rows > 0:
                 logger.info(f"Updated path for {old_path} to {new_path}")
             else:
                 logger.warning(f"No record found with path {old_path} to update.")
-            cursor.close()
         except Exception as e:
             logger.error(f"Failed to update path for {old_path} to {new_path}: {e}")
-            # Consider rolling back if part of a larger transaction context
-            # self.conn.rollback()
+            self.conn.rollback()
             raise # Re-raise the exception
+
+    def update_file_paths(self, path_pairs: list[tuple[str, str]]) -> int:
+        """
+        Applies many renames in a single transaction: the pairs are loaded into
+        a temp table and joined against files, chunks and perceptual_hashes,
+        so a large staging run commits once instead of once per file.
+
+        Args:
+            path_pairs: A list of (old_path, new_path) tuples. A record still
+                        stored at a new path (and not itself moved) is replaced
+                        when old_path has a record, as the move overwrote that
+                        file; a move that was already applied changes nothing.
+
+        Returns:
+            The number of records whose path was updated.
+        """
+        if not self.conn:
+            logger.error("Cannot update paths, no database connection.")
+            return 0
+        if not path_pairs:
+            return 0
+
+        moved_rows = "path IN (SELECT old_path FROM path_moves)"
+        try:
+            self.conn.begin()
+            self.conn.execute("CREATE OR REPLACE TEMP TABLE path_moves (old_path VARCHAR, new_path VARCHAR, filename VARCHAR);")
+            if pa is not None:
+                old_paths, new_paths = zip(*path_pairs)
+                moves = pa.table({'old_path': pa.array(old_paths, pa.string()),
+                                  'new_path': pa.array(new_paths, pa.string()),
+                                  'filename': pa.array([Path(path).name for path in new_paths], pa.string())})
+                self.conn.register('staged_path_moves', moves)
+                try:
+                    self.conn.execute("INSERT INTO path_moves SELECT * FROM staged_path_moves;")
+                finally:
+                    self.conn.unregister('staged_path_moves')
+            else:
+                for offset in range(0, len(path_pairs), _VALUES_CHUNK_ROWS):
+                    chunk = path_pairs[offset:offset + _VALUES_CHUNK_ROWS]
+                    self.conn.execute(
+                        f"INSERT INTO path_moves VALUES {', '.join(['(?, ?, ?)'] * len(chunk))};",
+                        [value for old_path, new_path in chunk for value in (old_path, new_path, Path(new_path).name)])
+            # Rows left at a destination would collide with the moved row's primary key. Only
+            # moves whose source row exists replace anything, so replaying a move is a no-op
+            replaced_rows = ("path IN (SELECT m.new_path FROM path_moves m JOIN files f ON f.path = m.old_path)"
+                             " AND path NOT IN (SELECT old_path FROM path_moves)")
+            replaced = self.conn.execute(f"DELETE FROM files WHERE {replaced_rows} RETURNING hash_algorithm, hash;").fetchall()
+            self._mark_groups_stale(replaced)
+            self.conn.execute(f"DELETE FROM chunks WHERE {replaced_rows};")
+            self.conn.execute(f"DELETE FROM perceptual_hashes WHERE {replaced_rows};")
+            self.conn.execute(f"DELETE FROM linked_files WHERE {replaced_rows} OR {moved_rows};")
+            # Hashes are unchanged, but a group's original may have been one of the moved files
+            self._touch_duplicate_groups(moved_rows)
+            updated_rows = self.conn.execute(f"""
+                UPDATE files SET path = m.new_path, filename = m.filename, change_seq = {_NEXT_CHANGE_SEQ}
+                FROM path_moves m WHERE files.path = m.old_path;
+            """).fetchone()[0]
+            self.conn.execute("UPDATE chunks SET path = m.new_path FROM path_moves m WHERE chunks.path = m.old_path;")
+            self.conn.execute("""
+                UPDATE perceptual_hashes SET path = m.new_path FROM path_moves m WHERE perceptual_hashes.path = m.old_path;
+            """)
+            self.conn.execute("DROP TABLE path_moves;")
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to update {len(path_pairs)} paths: {e}")
+            self.conn.rollback()
+            raise
+
+        if replaced:
+            logger.warning(f"Replaced {len(replaced)} records already stored at a destination path.")
+        if updated_rows < len(path_pairs):
+            logger.warning(f"No record found for {len(path_pairs) - updated_rows} of {len(path_pairs)} moved paths.")
+        logger.info(f"Updated {updated_rows} paths.")
+        return updated_rows
+
     def query_files(self, criteria: dict) -> list[dict]:
         """
         Queries the 'files' table based on the provided criteria.
@@ -184,7 +623,7 @@ class MetadataStore:
             return []
 
         # Define valid columns for filtering to prevent potential issues
-        valid_columns = {'path', 'filename', 'size_bytes', 'last_modified', 'hash', 'last_scanned'}
+        valid_columns = set(_FILE_COLUMNS)
         where_clauses = []
         params = []
 
@@ -193,7 +632,7 @@ class MetadataStore:
             # Alternatively, could raise an error or return empty list based on desired behavior.
             # Returning all for now, but this might be inefficient for large tables.
             logger.info("Query called with no criteria, returning all records.")
-            sql = "SELECT path, filename, size_bytes, last_modified, hash, last_scanned FROM files;"
+            sql = f"SELECT {_SELECT_COLUMNS} FROM files;"
             # No params needed
         else:
             # Build WHERE clause dynamically for exact matches
@@ -209,7 +648,7 @@ class MetadataStore:
                  logger.warning("No valid query criteria found after filtering.")
                  return [] # Return empty if only invalid criteria were provided
 
-            sql = f"SELECT path, filename, size_bytes, last_modified, hash, last_scanned FROM files WHERE {' AND '.join(where_clauses)};"
+            sql = f"SELECT {_SELECT_COLUMNS} FROM files WHERE {' AND '.join(where_clauses)};"
 
         results = []
         try:
@@ -232,49 +671,1086 @@ class MetadataStore:
 
         return results
 
-    def get_duplicates(self) -> dict[str, list[dict]]:
+    def _build_where(self, criteria: dict | None,
+                     conditions: list[tuple[str, str, object]] | None) -> tuple[str, list] | None:
         """
-        Finds duplicate files based on hash values stored in the metadata.
+        Builds a parameterized WHERE clause from exact-match criteria and range
+        conditions, dropping invalid columns and operators.
 
         Returns:
-            A dictionary where keys are hash values of duplicate files and
-            values are lists of file record dictionaries sharing that hash.
-            Only includes hashes associated with more than one file.
+            (where_sql, params), where where_sql is '' when nothing was requested,
+            or None if filters were requested but none of them were valid.
+        """
+        valid_columns = set(_FILE_COLUMNS)
+        where_clauses = []
+        params = []
+        requested = 0
+        for key, value in (criteria or {}).items():
+            requested += 1
+            if key in valid_columns:
+                where_clauses.append(f"{key} = ?")
+                params.append(value)
+            else:
+                logger.warning(f"Ignoring invalid query criterion: {key}")
+        for column, operator, value in (conditions or []):
+            requested += 1
+            if column in valid_columns and operator in _RANGE_OPERATORS:
+                where_clauses.append(f"{column} {operator} ?")
+                params.append(value)
+            else:
+                logger.warning(f"Ignoring invalid range condition: {column} {operator}")
+
+        if requested and not where_clauses:
+            logger.warning("No valid query criteria found after filtering.")
+            return None
+        if not where_clauses:
+            return '', params
+        return f" WHERE {' AND '.join(where_clauses)}", params
+
+    def iter_files(self, criteria: dict | None = None,
+                   conditions: list[tuple[str, str, object]] | None = None,
+                   batch_size: int = _ITER_BATCH_ROWS) -> Iterator[FileRecord]:
+        """
+        Streams file records matching exact-match criteria and range conditions.
+        Rows are pulled from a cursor with fetchmany(), so memory stays bounded
+        by batch_size rather than by the number of matching rows. Records are
+        FileRecord tuples, far smaller than one dict per row.
+
+        Args:
+            criteria: Column -> value exact matches, as in query_files().
+            conditions: (column, operator, value) tuples, e.g. ('size_bytes', '>', 1048576).
+                        Operators: =, !=, <, <=, >, >=.
+            batch_size: Number of rows fetched from the database per round trip.
+
+        Yields:
+            One FileRecord per row. Yields nothing if criteria or
+            conditions were given but none of them were valid.
+        """
+        if not self.conn:
+            logger.error("Cannot query records, no database connection.")
+            return
+
+        where = self._build_where(criteria, conditions)
+        if where is None:
+            return
+        where_sql, params = where
+        sql = f"SELECT {_SELECT_COLUMNS} FROM files{where_sql}"
+
+        try:
+            cursor = self.conn.cursor()
+            logger.debug(f"Streaming query: {sql} with params: {params}")
+            cursor.execute(sql, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from map(FileRecord._make, rows)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to stream records for {criteria} {conditions}: {e}")
+
+    def iter_duplicate_groups(self, batch_size: int = _ITER_BATCH_ROWS) -> Iterator[tuple[str, list[FileRecord]]]:
+        """
+        Streams duplicate groups one at a time. Rows arrive ordered by
+        (hash_algorithm, hash), so only the group being assembled is held in memory.
+
+        Args:
+            batch_size: Number of rows fetched from the database per round trip.
+
+        Yields:
+            (hash, FileRecord list) tuples, records ordered by last_modified then path.
+            Only hashes shared by more than one file are yielded.
         """
         if not self.conn:
             logger.error("Cannot get duplicates, no database connection.")
+            return
+        self._refresh_stale_groups()
+
+        # Digests are only comparable when produced by the same algorithm.
+        # Group membership comes from the maintained duplicate_groups table.
+        sql = f"""
+            SELECT {_SELECT_COLUMNS}
+            FROM files
+            WHERE (hash_algorithm, hash) IN (SELECT hash_algorithm, hash FROM duplicate_groups)
+            ORDER BY hash_algorithm, hash, last_modified, path; -- Order for consistent grouping
+        """
+        try:
+            cursor = self.conn.cursor()
+            logger.debug(f"Executing query to find duplicates: {sql}")
+            cursor.execute(sql)
+            try:
+                group_key = None
+                group = []
+                group_count = 0
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for record in map(FileRecord._make, rows):
+                        key = (record.hash_algorithm, record.hash)
+                        if key != group_key:
+                            if group:
+                                group_count += 1
+                                yield group_key[1], group
+                            group_key, group = key, []
+                        group.append(record)
+                if group:
+                    group_count += 1
+                    yield group_key[1], group
+                logger.debug(f"Found {group_count} hashes with duplicates.")
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to execute duplicate query: {e}")
+
+    def _rule_match_query(self, duplicates: bool, size_above: int | None,
+                          modified_before: datetime | None, source: str = 'files') -> tuple[str, list] | None:
+        """
+        Compiles the enabled rules into one statement that reads 'source' (the
+        files table, or a table of the same shape) once and labels each row with
+        every rule it matches. Duplicates are the rows of a duplicate_groups
+        group other than its original, found by joining the maintained groups
+        rather than ranking every hash group; files still linked to that
+        original are skipped. Callers recount stale groups first.
+
+        Returns:
+            (sql, params), or None if no rule is enabled.
+        """
+        if not duplicates and size_above is None and modified_before is None:
+            return None
+
+        params = []
+        if duplicates:
+            original_sql = "g.original_path"
+            # A file already linked to its original frees nothing more until it changes
+            duplicate_sql = (f"COALESCE(f.path != g.original_path, FALSE)"
+                             f" AND NOT (COALESCE(l.original_path = g.original_path, FALSE) AND {_LINK_IS_CURRENT})")
+            join_sql = (" LEFT JOIN duplicate_groups g ON f.hash_algorithm = g.hash_algorithm AND f.hash = g.hash"
+                        " LEFT JOIN linked_files l ON l.path = f.path")
+        else:
+            original_sql, duplicate_sql, join_sql = "NULL", "FALSE", ""
+        large_sql = "FALSE"
+        if size_above is not None:
+            large_sql = "COALESCE(f.size_bytes > ?, FALSE)"
+            params.append(size_above)
+        old_sql = "FALSE"
+        if modified_before is not None:
+            old_sql = "COALESCE(f.last_modified < ?, FALSE)"
+            params.append(modified_before)
+
+        sql = f"""
+            SELECT * FROM (
+                SELECT f.path, f.hash, f.size_bytes, f.last_modified,
+                       {original_sql} AS original_path,
+                       {duplicate_sql} AS is_duplicate,
+                       {large_sql} AS is_large,
+                       {old_sql} AS is_old,
+                       f.hash_algorithm
+                FROM {source} f{join_sql}
+            ) WHERE is_duplicate OR is_large OR is_old
+        """
+        return sql, params
+
+    def iter_rule_matches(self, duplicates: bool = False, size_above: int | None = None,
+                          modified_before: datetime | None = None,
+                          batch_size: int = _ITER_BATCH_ROWS) -> Iterator[RuleMatch]:
+        """
+        Streams every file matched by at least one enabled rule, in a single
+        pass over the table however many rules are enabled.
+
+        Args:
+            duplicates: Label files that duplicate an older file with the same hash.
+            size_above: Label files with size_bytes strictly greater than this.
+            modified_before: Label files with last_modified strictly before this.
+            batch_size: Number of rows fetched from the database per round trip.
+
+        Yields:
+            RuleMatch tuples. Yields nothing if no rule is enabled.
+        """
+        if not self.conn:
+            logger.error("Cannot query records, no database connection.")
+            return
+        if duplicates:
+            self._refresh_stale_groups()
+        query = self._rule_match_query(duplicates, size_above, modified_before)
+        if query is None:
+            return
+        yield from self._iter_rule_match_rows(*query, batch_size)
+
+    def _iter_rule_match_rows(self, sql: str, params: list, batch_size: int) -> Iterator[RuleMatch]:
+        """Executes a rule match query on its own cursor and yields RuleMatch tuples."""
+        try:
+            cursor = self.conn.cursor()
+            logger.debug(f"Executing rule match query: {sql} with params: {params}")
+            cursor.execute(sql, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from map(RuleMatch._make, rows)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to execute rule match query: {e}")
+
+    def iter_rule_match_batches(self, duplicates: bool = False, size_above: int | None = None,
+                                modified_before: datetime | None = None,
+                                batch_size: int = _ARROW_BATCH_ROWS) -> Iterator["pa.RecordBatch"]:
+        """
+        Arrow form of iter_rule_matches(): the same single-pass query, returned as
+        record batches with the RuleMatch fields as columns.
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow record batches")
+        if not self.conn:
+            logger.error("Cannot query records, no database connection.")
+            return
+        if duplicates:
+            self._refresh_stale_groups()
+        query = self._rule_match_query(duplicates, size_above, modified_before)
+        if query is None:
+            return
+        yield from self._iter_record_batches(*query, batch_size)
+
+    def refresh_analysis_results(self, duplicates: bool = False, size_above: int | None = None,
+                                 modified_before: datetime | None = None) -> dict:
+        """
+        Brings the persisted analysis_results table up to date for the given rules,
+        re-evaluating only what can have changed since the previous refresh.
+
+        The watermark is the highest files.change_seq seen by the last refresh.
+        Re-evaluated rows are those written since then, rows that aged past the
+        old-file cutoff since the previous cutoff, and every member of a hash
+        group that gained, lost or renamed a file. A full rebuild runs on the
+        first refresh, or when the rule parameters changed (other than the
+        old-file cutoff moving forward).
+
+        Args:
+            duplicates, size_above, modified_before: As in iter_rule_matches().
+
+        Returns:
+            A dict with 'mode' ('full' or 'incremental'), 'evaluated' (rows
+            re-evaluated) and 'watermark'.
+        """
+        if not self.conn:
+            logger.error("Cannot refresh analysis results, no database connection.")
+            return {'mode': None, 'evaluated': 0, 'watermark': None}
+        if duplicates:
+            self._refresh_stale_groups()
+
+        try:
+            self.conn.begin()
+            state = self.conn.execute(
+                "SELECT watermark, duplicates, size_above, modified_before FROM analysis_state WHERE id = 1;").fetchone()
+            watermark = self.conn.execute("SELECT COALESCE(MAX(change_seq), 0) FROM files;").fetchone()[0]
+
+            full = (
+                state is None
+                or state[1] != duplicates
+                or state[2] != size_above
+                or (state[3] is None) != (modified_before is None)
+                or (modified_before is not None and modified_before < state[3])
+            )
+            if full:
+                self.conn.execute("DELETE FROM analysis_results;")
+                evaluated = self.conn.execute("SELECT COUNT(*) FROM files;").fetchone()[0]
+                source = 'files'
+            else:
+                evaluated = self._build_analysis_scope(state[0], state[3], modified_before)
+                # Drop results being re-evaluated and results for paths that no longer exist
+                self.conn.execute("""
+                    DELETE FROM analysis_results
+                    WHERE path IN (SELECT path FROM analysis_scope)
+                       OR path NOT IN (SELECT path FROM files);
+                """)
+                source = 'analysis_scope'
+
+            query = self._rule_match_query(duplicates, size_above, modified_before, source=source)
+            if query is not None:
+                sql, params = query
+                self.conn.execute(f"INSERT INTO analysis_results ({_RULE_MATCH_COLUMNS}) {sql};", params)
+            if not full:
+                self.conn.execute("DROP TABLE analysis_scope;")
+
+            self.conn.execute("""
+                INSERT OR REPLACE INTO analysis_state (id, watermark, duplicates, size_above, modified_before)
+                VALUES (1, ?, ?, ?, ?);
+            """, [watermark, duplicates, size_above, modified_before])
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to refresh analysis results: {e}")
+            self.conn.rollback()
+            raise
+
+        mode = 'full' if full else 'incremental'
+        logger.info(f"Analysis results refreshed ({mode}): re-evaluated {evaluated} rows up to change {watermark}.")
+        return {'mode': mode, 'evaluated': evaluated, 'watermark': watermark}
+
+    def _build_analysis_scope(self, previous_watermark: int, previous_cutoff: datetime | None,
+                              modified_before: datetime | None) -> int:
+        """
+        Creates the temp table 'analysis_scope' holding the files rows an
+        incremental refresh must re-evaluate, and returns its row count.
+        Runs inside the caller's transaction.
+        """
+        # Rows written since the last refresh, plus rows that crossed the old-file cutoff
+        self.conn.execute("CREATE TEMP TABLE analysis_scope_paths AS SELECT path FROM files WHERE change_seq > ?;",
+                          [previous_watermark])
+        if modified_before is not None and previous_cutoff is not None:
+            self.conn.execute("""
+                INSERT INTO analysis_scope_paths
+                SELECT path FROM files
+                WHERE change_seq <= ? AND last_modified >= ? AND last_modified < ?;
+            """, [previous_watermark, previous_cutoff, modified_before])
+
+        # Hash groups those rows belong to now, and groups a stored duplicate result
+        # ties them to (the row or its original changed hash, moved or disappeared)
+        self.conn.execute("""
+            CREATE TEMP TABLE analysis_scope_groups AS
+            SELECT DISTINCT hash_algorithm, hash FROM files
+            WHERE path IN (SELECT path FROM analysis_scope_paths) AND hash IS NOT NULL AND hash != ''
+            UNION
+            SELECT DISTINCT hash_algorithm, hash FROM analysis_results
+            WHERE is_duplicate AND (
+                path IN (SELECT path FROM analysis_scope_paths)
+                OR original_path IN (SELECT path FROM analysis_scope_paths)
+                OR path NOT IN (SELECT path FROM files)
+                OR original_path NOT IN (SELECT path FROM files)
+            );
+        """)
+        # Whole groups are included so duplicate ranking sees every member
+        self.conn.execute(f"""
+            CREATE TEMP TABLE analysis_scope AS
+            SELECT {_SELECT_COLUMNS} FROM files
+            WHERE path IN (SELECT path FROM analysis_scope_paths)
+               OR (hash_algorithm, hash) IN (SELECT hash_algorithm, hash FROM analysis_scope_groups);
+        """)
+        self.conn.execute("DROP TABLE analysis_scope_paths;")
+        self.conn.execute("DROP TABLE analysis_scope_groups;")
+        return self.conn.execute("SELECT COUNT(*) FROM analysis_scope;").fetchone()[0]
+
+    def iter_analysis_results(self, batch_size: int = _ITER_BATCH_ROWS) -> Iterator[RuleMatch]:
+        """
+        Streams the persisted rule matches written by refresh_analysis_results().
+
+        Yields:
+            RuleMatch tuples.
+        """
+        if not self.conn:
+            logger.error("Cannot query analysis results, no database connection.")
+            return
+        yield from self._iter_rule_match_rows(f"SELECT {_RULE_MATCH_COLUMNS} FROM analysis_results", [], batch_size)
+
+    def iter_analysis_result_batches(self, batch_size: int = _ARROW_BATCH_ROWS) -> Iterator["pa.RecordBatch"]:
+        """
+        Arrow form of iter_analysis_results().
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow record batches")
+        if not self.conn:
+            logger.error("Cannot query analysis results, no database connection.")
+            return
+        yield from self._iter_record_batches(f"SELECT {_RULE_MATCH_COLUMNS} FROM analysis_results", [], batch_size)
+
+    def _iter_record_batches(self, sql: str, params: list, batch_size: int) -> Iterator["pa.RecordBatch"]:
+        """Executes a query on its own cursor and yields its result as Arrow record batches."""
+        try:
+            cursor = self.conn.cursor()
+            logger.debug(f"Streaming Arrow query: {sql} with params: {params}")
+            cursor.execute(sql, params)
+            try:
+                # to_arrow_reader() replaced fetch_record_batch() in newer DuckDB releases
+                to_reader = getattr(cursor, 'to_arrow_reader', None) or cursor.fetch_record_batch
+                for batch in to_reader(batch_size):
+                    if batch.num_rows:
+                        yield batch
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to stream Arrow batches for query: {e}")
+
+    def get_scan_index(self, path_prefix: str) -> dict[str, tuple[int, int | None, int | None, str | None]]:
+        """
+        Loads the incremental-scan index for every stored path under a prefix
+        in a single query, so the scanner can decide what to skip locally.
+
+        Args:
+            path_prefix: The normalized scan root; records whose path starts
+                         with it are returned.
+
+        Returns:
+            A dictionary mapping path to (size_bytes, mtime_ns, ctime_ns,
+            hash_algorithm), where hash_algorithm is None for unhashed records
+            and the timestamps are None for records written before they were
+            stored. Returns an empty dict on error.
+        """
+        if not self.conn:
+            logger.error("Cannot load scan index, no database connection.")
             return {}
 
         sql = """
-            WITH DuplicateHashes AS (
-                SELECT hash
+            SELECT path, size_bytes, mtime_ns, ctime_ns,
+                   CASE WHEN hash IS NULL OR hash = '' THEN NULL ELSE hash_algorithm END
+            FROM files
+            WHERE starts_with(path, ?);
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, (path_prefix,))
+            index = {path: tuple(values) for path, *values in cursor.fetchall()}
+            cursor.close()
+            logger.debug(f"Loaded scan index with {len(index)} records for {path_prefix}.")
+        except Exception as e:
+            logger.error(f"Failed to load scan index for {path_prefix}: {e}")
+            return {}
+
+        return index
+
+    def find_hashes_by_inode(self, identities: list[tuple[int, int, int, int]],
+                             hash_algorithm: str = DEFAULT_HASH_ALGORITHM) -> dict[tuple[int, int, int, int], tuple[str, str]]:
+        """
+        Looks up stored hashes by file identity, so a file that was moved or
+        renamed can reuse its hash instead of being read again. A stored row
+        matches when device, inode, size and nanosecond mtime are all equal and
+        it was hashed with hash_algorithm.
+
+        Args:
+            identities: (device, inode, size_bytes, mtime_ns) tuples.
+            hash_algorithm: The algorithm the reused hash must come from.
+
+        Returns:
+            A dictionary mapping each matched identity to (stored path, hash).
+        """
+        if not self.conn:
+            logger.error("Cannot look up hashes, no database connection.")
+            return {}
+
+        wanted = set(identities)
+        inodes = sorted({inode for _, inode, _, _ in wanted})
+        found = {}
+        try:
+            for offset in range(0, len(inodes), _VALUES_CHUNK_ROWS):
+                chunk = inodes[offset:offset + _VALUES_CHUNK_ROWS]
+                # Inodes are cast to the column type: Python ints bind as BIGINT, and comparing
+                # a UBIGINT column to them scans files instead of probing idx_files_inode
+                rows = self.conn.execute(f"""
+                    SELECT device, inode, size_bytes, mtime_ns, path, hash, hash_algorithm
+                    FROM files WHERE inode IN ({', '.join(['?::UBIGINT'] * len(chunk))});
+                """, chunk).fetchall()
+                for device, inode, size_bytes, mtime_ns, path, hash_value, algorithm in rows:
+                    identity = (device, inode, size_bytes, mtime_ns)
+                    if hash_value and algorithm == hash_algorithm and identity in wanted:
+                        found.setdefault(identity, (path, hash_value))
+        except Exception as e:
+            logger.error(f"Failed to look up hashes by inode: {e}")
+            return {}
+
+        return found
+
+    def copy_file_extras(self, path_sources: dict[str, str]) -> int:
+        """
+        Copies chunks and perceptual hashes to files whose content hash was
+        reused from another path (see find_hashes_by_inode), replacing any the
+        destination had. Runs in a single transaction.
+
+        Args:
+            path_sources: destination path -> source path.
+
+        Returns:
+            The number of destination paths processed.
+        """
+        if not self.conn:
+            logger.error("Cannot copy file extras, no database connection.")
+            return 0
+        if not path_sources:
+            return 0
+
+        pairs = list(path_sources.items())
+        try:
+            self.conn.begin()
+            for offset in range(0, len(pairs), _VALUES_CHUNK_ROWS):
+                chunk = pairs[offset:offset + _VALUES_CHUNK_ROWS]
+                values = ', '.join(['(?, ?)'] * len(chunk))
+                params = [value for pair in chunk for value in pair]
+                destinations = [destination for destination, _ in chunk]
+                placeholders = ', '.join('?' * len(chunk))
+                self.conn.execute(f"DELETE FROM chunks WHERE path IN ({placeholders});", destinations)
+                self.conn.execute(f"DELETE FROM perceptual_hashes WHERE path IN ({placeholders});", destinations)
+                self.conn.execute(f"""
+                    INSERT INTO chunks
+                    SELECT m.destination, c.chunk_offset, c.length, c.hash
+                    FROM (VALUES {values}) AS m(destination, source) JOIN chunks c ON c.path = m.source;
+                """, params)
+                self.conn.execute(f"""
+                    INSERT INTO perceptual_hashes
+                    SELECT m.destination, p.algorithm, p.hash
+                    FROM (VALUES {values}) AS m(destination, source) JOIN perceptual_hashes p ON p.path = m.source;
+                """, params)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to copy file extras: {e}")
+            self.conn.rollback()
+            raise
+
+        return len(pairs)
+
+    def get_size_collision_groups(self, hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+                                  sizes: Iterable[int] | None = None) -> dict[int, list[tuple[str, str | None]]]:
+        """
+        Finds records that share a size with at least one other record, for
+        sizes where some record has not been hashed yet. These are the only
+        files that can still turn out to be unhashed duplicates.
+
+        Args:
+            hash_algorithm: The algorithm currently in use. Hashes made with
+                            another algorithm count as missing.
+            sizes: Optional sizes to check, e.g. those of the files a scan
+                   wrote; groups of other sizes were already resolved as far
+                   as they can be. None checks every size.
+
+        Returns:
+            A dictionary mapping size_bytes to a list of (path, hash) tuples,
+            where hash is None for records that have not been hashed.
+        """
+        if not self.conn:
+            logger.error("Cannot get size collisions, no database connection.")
+            return {}
+        if sizes is not None:
+            sizes = sorted(set(sizes))
+            if not sizes:
+                return {}
+
+        size_filter = "AND size_bytes IN (SELECT size_bytes FROM collision_sizes)" if sizes is not None else ""
+        sql = f"""
+            WITH CandidateSizes AS (
+                SELECT size_bytes
                 FROM files
-                WHERE hash IS NOT NULL AND hash != '' -- Exclude empty/null hashes
-                GROUP BY hash
-                HAVING COUNT(*) > 1
+                WHERE size_bytes IS NOT NULL {size_filter}
+                GROUP BY size_bytes
+                HAVING COUNT(*) > 1 AND COUNT(*) FILTER (
+                    WHERE hash IS NULL OR hash = '' OR hash_algorithm IS DISTINCT FROM $algorithm
+                ) > 0
             )
-            SELECT f.path, f.filename, f.size_bytes, f.last_modified, f.hash, f.last_scanned
+            SELECT f.size_bytes, f.path,
+                   CASE WHEN f.hash_algorithm = $algorithm THEN NULLIF(f.hash, '') END
             FROM files f
-            JOIN DuplicateHashes dh ON f.hash = dh.hash
-            ORDER BY f.hash, f.last_modified, f.path; -- Order for consistent grouping
+            JOIN CandidateSizes cs ON f.size_bytes = cs.size_bytes
+            ORDER BY f.size_bytes, f.path;
+        """
+        groups = defaultdict(list)
+        try:
+            cursor = self.conn.cursor()
+            if sizes is not None:
+                # Temp tables belong to the connection, so this one is created through the cursor
+                cursor.execute("CREATE OR REPLACE TEMP TABLE collision_sizes (size_bytes BIGINT);")
+                for offset in range(0, len(sizes), _VALUES_CHUNK_ROWS):
+                    chunk = sizes[offset:offset + _VALUES_CHUNK_ROWS]
+                    cursor.execute(f"INSERT INTO collision_sizes VALUES {', '.join(['(?)'] * len(chunk))};", chunk)
+            cursor.execute(sql, {'algorithm': hash_algorithm})
+            for size_bytes, path, hash_value in cursor.fetchall():
+                groups[size_bytes].append((path, hash_value))
+            cursor.close()
+            logger.debug(f"Found {len(groups)} sizes with unhashed collision candidates.")
+        except Exception as e:
+            logger.error(f"Failed to query size collisions: {e}")
+            return {}
+
+        return dict(groups)
+
+    def update_file_hashes(self, path_hashes: list[tuple[str, str]],
+                           hash_algorithm: str = DEFAULT_HASH_ALGORITHM) -> int:
+        """
+        Sets the hash of existing records in a single transaction.
+
+        Args:
+            path_hashes: A list of (path, hash) tuples.
+            hash_algorithm: The algorithm that produced the hashes.
+
+        Returns:
+            The number of (path, hash) pairs applied.
+        """
+        if not self.conn:
+            logger.error("Cannot update hashes, no database connection.")
+            return 0
+        if not path_hashes:
+            return 0
+
+        try:
+            self.conn.begin()
+            for offset in range(0, len(path_hashes), _VALUES_CHUNK_ROWS):
+                chunk = path_hashes[offset:offset + _VALUES_CHUNK_ROWS]
+                sql = f"""
+                    UPDATE files
+                    SET hash = v.hash, hash_algorithm = v.hash_algorithm, change_seq = {_NEXT_CHANGE_SEQ}
+                    FROM (VALUES {', '.join(['(?, ?, ?)'] * len(chunk))}) AS v(path, hash, hash_algorithm)
+                    WHERE files.path = v.path;
+                """
+                self._touch_duplicate_groups(f"path IN ({', '.join('?' * len(chunk))})", [path for path, _ in chunk])
+                self.conn.execute(sql, [value for path, hash_value in chunk for value in (path, hash_value, hash_algorithm)])
+                self._mark_groups_stale([(hash_algorithm, hash_value) for _, hash_value in chunk])
+            self.conn.commit()
+            logger.debug(f"Updated hashes for {len(path_hashes)} records.")
+        except Exception as e:
+            logger.error(f"Failed to update hashes: {e}")
+            self.conn.rollback()
+            raise
+
+        return len(path_hashes)
+
+    def update_file_identities(self, identities: list[tuple[str, int, int, int, int]],
+                               links: list[tuple[str, str]] | None = None) -> int:
+        """
+        Records the new inode and timestamps of files replaced in place, e.g. by
+        a link to their original, so the next scan sees them as unchanged.
+        Runs in a single transaction.
+
+        Args:
+            identities: A list of (path, device, inode, mtime_ns, ctime_ns) tuples;
+                        for a path listed more than once, the last one applies.
+            links: Optional (path, original_path) pairs of duplicates replaced by
+                   a link. Each is stored with the path's new identity, and rule
+                   matching skips it while that identity is unchanged.
+
+        Returns:
+            The number of paths updated.
+        """
+        if not self.conn:
+            logger.error("Cannot update file identities, no database connection.")
+            return 0
+        if not identities:
+            return 0
+
+        identities = list({identity[0]: identity for identity in identities}.values())
+
+        try:
+            self.conn.begin()
+            for offset in range(0, len(identities), _VALUES_CHUNK_ROWS):
+                chunk = identities[offset:offset + _VALUES_CHUNK_ROWS]
+                sql = f"""
+                    UPDATE files
+                    SET device = v.device, inode = v.inode, mtime_ns = v.mtime_ns, ctime_ns = v.ctime_ns,
+                        last_modified = to_timestamp(v.mtime_ns / 1e9), change_seq = {_NEXT_CHANGE_SEQ}
+                    FROM (VALUES {', '.join(['(?, ?::UBIGINT, ?::UBIGINT, ?::BIGINT, ?::BIGINT)'] * len(chunk))})
+                        AS v(path, device, inode, mtime_ns, ctime_ns)
+                    WHERE files.path = v.path;
+                """
+                # The hash is unchanged, but last_modified picks the original of a duplicate group
+                self._touch_duplicate_groups(f"path IN ({', '.join('?' * len(chunk))})",
+                                             [identity[0] for identity in chunk])
+                self.conn.execute(sql, [value for identity in chunk for value in identity])
+            links = list(dict(links or []).items())
+            for offset in range(0, len(links), _VALUES_CHUNK_ROWS):
+                chunk = links[offset:offset + _VALUES_CHUNK_ROWS]
+                self.conn.execute(f"""
+                    INSERT OR REPLACE INTO linked_files
+                    SELECT v.path, v.original_path, f.device, f.inode, f.mtime_ns
+                    FROM (VALUES {', '.join(['(?, ?)'] * len(chunk))}) AS v(path, original_path)
+                    JOIN files f ON f.path = v.path;
+                """, [value for link in chunk for value in link])
+            self.conn.commit()
+            logger.debug(f"Updated identities for {len(identities)} records.")
+        except Exception as e:
+            logger.error(f"Failed to update file identities: {e}")
+            self.conn.rollback()
+            raise
+
+        return len(identities)
+
+    def delete_file_records(self, paths: list[str]) -> int:
+        """
+        Removes records, e.g. for files that no longer exist, in a single transaction.
+
+        Args:
+            paths: Paths of the records to delete.
+
+        Returns:
+            The number of records deleted.
+        """
+        if not self.conn:
+            logger.error("Cannot delete records, no database connection.")
+            return 0
+        if not paths:
+            return 0
+
+        deleted = 0
+        try:
+            self.conn.begin()
+            for offset in range(0, len(paths), _VALUES_CHUNK_ROWS):
+                chunk = list(paths[offset:offset + _VALUES_CHUNK_ROWS])
+                selected = f"path IN ({', '.join('?' * len(chunk))})"
+                self._touch_duplicate_groups(selected, chunk)
+                deleted += self.conn.execute(f"DELETE FROM files WHERE {selected};", chunk).fetchone()[0]
+                self.conn.execute(f"DELETE FROM chunks WHERE {selected};", chunk)
+                self.conn.execute(f"DELETE FROM perceptual_hashes WHERE {selected};", chunk)
+                self.conn.execute(f"DELETE FROM linked_files WHERE {selected};", chunk)
+            self.conn.commit()
+            logger.debug(f"Deleted {deleted} records.")
+        except Exception as e:
+            logger.error(f"Failed to delete records: {e}")
+            self.conn.rollback()
+            raise
+
+        return deleted
+
+    def replace_file_chunks(self, file_chunks: dict[str, list[tuple[int, int, str]]]) -> int:
+        """
+        Replaces the stored chunks of each given file in a single transaction.
+        A file mapped to an empty list has its chunks removed.
+
+        Args:
+            file_chunks: path -> list of (offset, length, digest) tuples.
+
+        Returns:
+            The number of chunk rows written.
+        """
+        if not self.conn:
+            logger.error("Cannot write chunks, no database connection.")
+            return 0
+        if not file_chunks:
+            return 0
+
+        paths = list(file_chunks)
+        rows = [(path, offset, length, digest)
+                for path, chunks in file_chunks.items() for offset, length, digest in chunks]
+        try:
+            self.conn.begin()
+            for offset in range(0, len(paths), _VALUES_CHUNK_ROWS):
+                chunk = paths[offset:offset + _VALUES_CHUNK_ROWS]
+                self.conn.execute(f"DELETE FROM chunks WHERE path IN ({', '.join('?' * len(chunk))});", chunk)
+            if rows and pa is not None:
+                table = pa.table({
+                    'path': pa.array([row[0] for row in rows], pa.string()),
+                    'chunk_offset': pa.array([row[1] for row in rows], pa.int64()),
+                    'length': pa.array([row[2] for row in rows], pa.int64()),
+                    'hash': pa.array([row[3] for row in rows], pa.string()),
+                })
+                self.conn.register('staging_chunks', table)
+                try:
+                    self.conn.execute("INSERT INTO chunks SELECT path, chunk_offset, length, hash FROM staging_chunks;")
+                finally:
+                    self.conn.unregister('staging_chunks')
+            else:
+                for offset in range(0, len(rows), _VALUES_CHUNK_ROWS):
+                    chunk = rows[offset:offset + _VALUES_CHUNK_ROWS]
+                    self.conn.execute(f"INSERT INTO chunks VALUES {', '.join(['(?, ?, ?, ?)'] * len(chunk))};",
+                                      [value for row in chunk for value in row])
+            self.conn.commit()
+            logger.debug(f"Wrote {len(rows)} chunks for {len(paths)} files.")
+        except Exception as e:
+            logger.error(f"Failed to write chunks: {e}")
+            self.conn.rollback()
+            raise
+
+        return len(rows)
+
+    def iter_shared_chunk_pairs(self, min_shared_ratio: float = 0.0,
+                                batch_size: int = _ITER_BATCH_ROWS) -> Iterator[SharedChunks]:
+        """
+        Streams pairs of chunked files that share chunks but are not whole-file
+        duplicates, most shared bytes first. A chunk repeated inside one file
+        counts once, and the ratio is taken over the smaller file, so a file
+        embedded in a larger one scores 1.0.
+
+        Args:
+            min_shared_ratio: Only yield pairs whose shared_ratio is at least this.
+            batch_size: Number of rows fetched from the database per round trip.
+
+        Yields:
+            SharedChunks tuples.
+        """
+        if not self.conn:
+            logger.error("Cannot query chunks, no database connection.")
+            return
+
+        sql = """
+            WITH file_chunks AS (
+                SELECT path, hash, ANY_VALUE(length) AS length FROM chunks GROUP BY path, hash
+            ), totals AS (
+                SELECT path, SUM(length) AS chunked_bytes FROM file_chunks GROUP BY path
+            ), shared AS (
+                SELECT a.path, b.path AS other_path, SUM(a.length) AS shared_bytes
+                FROM file_chunks a JOIN file_chunks b ON a.hash = b.hash AND a.path < b.path
+                GROUP BY a.path, b.path
+            )
+            SELECT s.path, s.other_path, s.shared_bytes, ta.chunked_bytes, tb.chunked_bytes,
+                   s.shared_bytes / LEAST(ta.chunked_bytes, tb.chunked_bytes) AS shared_ratio
+            FROM shared s
+            JOIN totals ta ON ta.path = s.path
+            JOIN totals tb ON tb.path = s.other_path
+            JOIN files fa ON fa.path = s.path
+            JOIN files fb ON fb.path = s.other_path
+            -- Whole-file duplicates are already reported through duplicate_groups
+            WHERE (fa.hash_algorithm, fa.hash) IS DISTINCT FROM (fb.hash_algorithm, fb.hash)
+              AND s.shared_bytes / LEAST(ta.chunked_bytes, tb.chunked_bytes) >= ?
+            ORDER BY s.shared_bytes DESC, s.path, s.other_path;
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, [min_shared_ratio])
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from map(SharedChunks._make, rows)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to query shared chunks: {e}")
+
+    def replace_perceptual_hashes(self, path_hashes: dict[str, int | None], algorithm: str) -> int:
+        """
+        Sets the perceptual hash of each given file in a single transaction.
+        A file mapped to None has its stored hash removed.
+
+        Args:
+            path_hashes: path -> unsigned 64-bit perceptual hash, or None.
+            algorithm: The perceptual hash algorithm (see perceptual_hash.py).
+
+        Returns:
+            The number of hashes written.
+        """
+        if not self.conn:
+            logger.error("Cannot write perceptual hashes, no database connection.")
+            return 0
+        if not path_hashes:
+            return 0
+
+        items = list(path_hashes.items())
+        written = 0
+        try:
+            self.conn.begin()
+            for offset in range(0, len(items), _VALUES_CHUNK_ROWS):
+                chunk = items[offset:offset + _VALUES_CHUNK_ROWS]
+                self.conn.execute(f"DELETE FROM perceptual_hashes WHERE path IN ({', '.join('?' * len(chunk))});",
+                                  [path for path, _ in chunk])
+                rows = [(path, algorithm, image_hash) for path, image_hash in chunk if image_hash is not None]
+                if rows:
+                    self.conn.execute(
+                        f"INSERT INTO perceptual_hashes VALUES {', '.join(['(?, ?, ?)'] * len(rows))};",
+                        [value for row in rows for value in row])
+                    written += len(rows)
+            self.conn.commit()
+            logger.debug(f"Wrote {written} perceptual hashes.")
+        except Exception as e:
+            logger.error(f"Failed to write perceptual hashes: {e}")
+            self.conn.rollback()
+            raise
+
+        return written
+
+    def iter_similar_images(self, algorithm: str, max_distance: int = 4,
+                            batch_size: int = _ITER_BATCH_ROWS) -> Iterator[SimilarImages]:
+        """
+        Streams pairs of images whose perceptual hashes are at most max_distance
+        bits apart, closest first. Exact copies (same content hash) are left to
+        duplicate detection.
+
+        The search is a multi-index Hamming search (see _hamming_index_plan):
+        hashes are split into blocks and self-joined on combinations of blocks,
+        so only pairs sharing a block combination are compared instead of all
+        n² pairs. Cost grows quickly with max_distance.
+
+        Args:
+            algorithm: Only hashes of this algorithm are compared.
+            max_distance: Maximum Hamming distance, 0 to 16.
+            batch_size: Number of rows fetched from the database per round trip.
+
+        Yields:
+            SimilarImages tuples.
+
+        Raises:
+            ValueError: If max_distance is out of range.
+        """
+        if not 0 <= max_distance <= 16:
+            raise ValueError(f"max_distance must be between 0 and 16, got {max_distance}")
+        if not self.conn:
+            logger.error("Cannot query perceptual hashes, no database connection.")
+            return
+
+        try:
+            rows = self.conn.execute("SELECT COUNT(*) FROM perceptual_hashes WHERE algorithm = ?;",
+                                     [algorithm]).fetchone()[0]
+            blocks, combinations = _hamming_index_plan(max_distance, rows)
+            block_columns = ', '.join(
+                f"(hash >> {shift}) & {(1 << width) - 1} AS b{i}" for i, (shift, width) in enumerate(blocks))
+            candidates = '\n                UNION\n'.join(
+                f"""                SELECT a.path, b.path AS other_path, a.hash, b.hash AS other_hash
+                FROM h a JOIN h b ON {' AND '.join(f'a.b{i} = b.b{i}' for i in combination)}
+                WHERE a.path < b.path"""
+                for combination in combinations)
+            sql = f"""
+                WITH h AS MATERIALIZED (
+                    SELECT path, hash, {block_columns} FROM perceptual_hashes WHERE algorithm = ?
+                ), candidates AS (
+{candidates}
+                )
+                SELECT c.path, c.other_path, bit_count(xor(c.hash, c.other_hash)) AS distance
+                FROM candidates c
+                JOIN files fa ON fa.path = c.path
+                JOIN files fb ON fb.path = c.other_path
+                WHERE bit_count(xor(c.hash, c.other_hash)) <= ?
+                  AND (fa.hash_algorithm, fa.hash) IS DISTINCT FROM (fb.hash_algorithm, fb.hash)
+                ORDER BY distance, c.path, c.other_path;
+            """
+            logger.debug(f"Similarity search over {rows} hashes: {len(blocks)} blocks, {len(combinations)} joins.")
+            cursor = self.conn.cursor()
+            cursor.execute(sql, [algorithm, max_distance])
+            try:
+                while True:
+                    fetched = cursor.fetchmany(batch_size)
+                    if not fetched:
+                        break
+                    yield from map(SimilarImages._make, fetched)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to query similar images: {e}")
+
+    def _touch_duplicate_groups(self, where_sql: str, params: list | None = None):
+        """
+        Marks the hash groups of the files rows matching where_sql as stale.
+        Writers call it before changing or removing rows, for the groups those
+        rows leave, and mark the groups rows join with _mark_groups_stale().
+        Must run inside the writer's transaction on self.conn.
+        """
+        self.conn.execute(f"""
+            INSERT INTO stale_duplicate_groups
+            SELECT DISTINCT hash_algorithm, hash FROM files
+            WHERE ({where_sql}) AND hash IS NOT NULL AND hash != '';
+        """, params or [])
+
+    def _mark_groups_stale(self, groups: list[tuple[str, str]]):
+        """Marks the given (hash_algorithm, hash) groups as stale; empty hashes are skipped."""
+        groups = list({group for group in groups if group[1]})
+        if groups and pa is not None:
+            algorithms, hashes = zip(*groups)
+            self.conn.register('staged_stale_groups', pa.table({'hash_algorithm': pa.array(algorithms, pa.string()),
+                                                                'hash': pa.array(hashes, pa.string())}))
+            try:
+                self.conn.execute("INSERT INTO stale_duplicate_groups SELECT * FROM staged_stale_groups;")
+            finally:
+                self.conn.unregister('staged_stale_groups')
+            return
+        for offset in range(0, len(groups), _VALUES_CHUNK_ROWS):
+            chunk = groups[offset:offset + _VALUES_CHUNK_ROWS]
+            self.conn.execute(f"INSERT INTO stale_duplicate_groups VALUES {', '.join(['(?, ?)'] * len(chunk))};",
+                              [value for group in chunk for value in group])
+
+    def _refresh_stale_groups(self):
+        """
+        Recounts the duplicate_groups rows marked stale since the last recount.
+        Readers of duplicate_groups call it first, so a scan's many write
+        transactions share one recount; each recount reads the files table.
+        """
+        if not self.conn.execute("SELECT 1 FROM stale_duplicate_groups LIMIT 1;").fetchone():
+            return
+        try:
+            self.conn.begin()
+            hashes = [row[0] for row in self.conn.execute("SELECT DISTINCT hash FROM stale_duplicate_groups;").fetchall()]
+            stale = f"{_HASHED_ROWS} AND (hash_algorithm, hash) IN (SELECT hash_algorithm, hash FROM stale_duplicate_groups)"
+            params = []
+            if len(hashes) <= _VALUES_CHUNK_ROWS:
+                # A bare list of hashes is probed through idx_files_hash; extra predicates would
+                # turn it into a scan. The index scan is chosen at execution time, so EXPLAIN
+                # shows a sequential scan and only EXPLAIN ANALYZE shows the probe.
+                # Stale hashes are never empty.
+                stale = f"hash IN ({', '.join('?' * len(hashes))})"
+                params = hashes
+            self.conn.execute(f"DELETE FROM duplicate_groups WHERE {stale};", params)
+            self.conn.execute(f"INSERT INTO duplicate_groups {_DUPLICATE_GROUP_SQL.format(filter=stale)};", params)
+            self.conn.execute("DELETE FROM stale_duplicate_groups;")
+            self.conn.commit()
+            logger.debug(f"Recounted {len(hashes)} stale duplicate groups.")
+        except Exception as e:
+            logger.error(f"Failed to recount stale duplicate groups: {e}")
+            self.conn.rollback()
+            raise
+
+    def iter_duplicate_group_summaries(self, batch_size: int = _ITER_BATCH_ROWS) -> Iterator[DuplicateGroup]:
+        """
+        Streams the precomputed duplicate groups, largest wasted_bytes first.
+        Reads only the duplicate_groups table, so the cost is proportional to
+        the number of groups rather than the number of files.
+
+        Yields:
+            DuplicateGroup tuples.
+        """
+        if not self.conn:
+            logger.error("Cannot get duplicate groups, no database connection.")
+            return
+        self._refresh_stale_groups()
+
+        sql = f"""
+            SELECT {', '.join(DuplicateGroup._fields)} FROM duplicate_groups
+            ORDER BY wasted_bytes DESC NULLS LAST, hash_algorithm, hash;
         """
-        duplicates_by_hash = defaultdict(list)
         try:
             cursor = self.conn.cursor()
-            logger.debug(f"Executing query to find duplicates: {sql}")
             cursor.execute(sql)
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from map(DuplicateGroup._make, rows)
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Failed to query duplicate groups: {e}")
 
-            for row in rows:
-                record = dict(zip(columns, row))
-                duplicates_by_hash[record['hash']].append(record)
+    def optimize_layout(self):
+        """
+        Rewrites the files table in (hash_algorithm, hash, size_bytes, path) order.
 
-            cursor.close()
-            logger.debug(f"Found {len(duplicates_by_hash)} hashes with duplicates.")
+        DuckDB keeps min/max statistics per row group, so with this layout the
+        duplicate query reads each hash group from contiguous storage and hash
+        lookups can skip most row groups. Constraints and indexes are kept
+        because rows are re-inserted into the same table. Worth running after
+        large scans (see 'metadata_store.optimize_layout'); the rewrite takes
+        one transaction.
+        """
+        if not self.conn:
+            logger.error("Cannot optimize layout, no database connection.")
+            return
 
+        start = time.perf_counter()
+        try:
+            self.conn.begin()
+            # change_seq is carried over unchanged: a layout rewrite is not a content change
+            columns = f"{_SELECT_COLUMNS}, change_seq"
+            self.conn.execute(f"CREATE TEMP TABLE files_layout AS SELECT {columns} FROM files ORDER BY {_LAYOUT_ORDER};")
+            self.conn.execute("DELETE FROM files;")
+            self.conn.execute(f"INSERT INTO files ({columns}) SELECT {columns} FROM files_layout;")
+            self.conn.execute("DROP TABLE files_layout;")
+            self.conn.commit()
         except Exception as e:
-            logger.error(f"Failed to execute duplicate query: {e}")
-            return {} # Return empty dict on error
+            logger.error(f"Failed to optimize table layout: {e}")
+            self.conn.rollback()
+            raise
+        self.conn.execute("CHECKPOINT;") # Write the new layout to the database file
+        logger.info(f"Rewrote files table in hash order in {time.perf_counter() - start:.2f}s.")
 
-        return dict(duplicates_by_hash)
\ No newline at end of file
+    def get_duplicates(self) -> dict[str, list[dict]]:
+        """
+        Finds duplicate files based on hash values stored in the metadata.
+        Materializes iter_duplicate_groups(); prefer the iterator for large stores.
+
+        Returns:
+            A dictionary where keys are hash values of duplicate files and
+            values are lists of file record dictionaries sharing that hash.
+            Only includes hashes associated with more than one file.
+        """
+        return {
+            hash_value: [record._asdict() for record in records]
+            for hash_value, records in self.iter_duplicate_groups()
+        }
\ No newline at end of file
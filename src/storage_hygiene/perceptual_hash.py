@@ -0,0 +1,109 @@
+import math
+import os
+
+# Optional: decoding images needs Pillow; without it no perceptual hashes are computed
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PERCEPTUAL_ALGORITHMS = ('ahash', 'dhash', 'phash')
+DEFAULT_PERCEPTUAL_ALGORITHM = 'dhash'
+
+# Besides OSError, what Pillow raises for truncated, corrupt or oversized images
+IMAGE_DECODE_ERRORS = (EOFError, SyntaxError, ValueError) + ((Image.DecompressionBombError,) if Image else ())
+
+IMAGE_EXTENSIONS = frozenset({'.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp'})
+
+# Side of the grayscale grid the pHash DCT runs over; the top-left 8x8 coefficients are kept
+_PHASH_GRID = 32
+_DCT_COSINES = tuple(
+    tuple(math.cos(math.pi * (2 * x + 1) * u / (2 * _PHASH_GRID)) for x in range(_PHASH_GRID))
+    for u in range(8)
+)
+
+
+def perceptual_hash_available() -> bool:
+    """True if Pillow is installed, so image files can be decoded."""
+    return Image is not None
+
+
+def is_image_path(file_path: str) -> bool:
+    """True if the path has one of the IMAGE_EXTENSIONS (case-insensitive)."""
+    return os.path.splitext(file_path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _bits_to_int(bits) -> int:
+    """Packs 64 booleans, most significant first, into an unsigned 64-bit integer."""
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bool(bit)
+    return value
+
+
+def ahash_bits(pixels: list[list[int]]) -> int:
+    """Average hash of an 8x8 grayscale grid: one bit per pixel brighter than the mean."""
+    flat = [p for row in pixels for p in row]
+    mean = sum(flat) / len(flat)
+    return _bits_to_int(p > mean for p in flat)
+
+
+def dhash_bits(pixels: list[list[int]]) -> int:
+    """Difference hash of an 8-row, 9-column grayscale grid: one bit per pixel brighter than its right neighbour."""
+    return _bits_to_int(row[x] > row[x + 1] for row in pixels for x in range(len(row) - 1))
+
+
+def phash_bits(pixels: list[list[int]]) -> int:
+    """
+    DCT hash of a 32x32 grayscale grid: the 8x8 lowest-frequency DCT-II
+    coefficients, one bit per coefficient above their median.
+    """
+    # Separable DCT, computing only the 8 lowest frequencies in each direction
+    rows = [[sum(c * p for c, p in zip(cosines, row)) for cosines in _DCT_COSINES] for row in pixels]
+    low = [
+        sum(cosines[y] * rows[y][u] for y in range(_PHASH_GRID))
+        for v, cosines in enumerate(_DCT_COSINES) for u in range(8)
+    ]
+    median = sorted(low)[len(low) // 2]
+    return _bits_to_int(c > median for c in low)
+
+
+_GRID_SIZES = {'ahash': (8, 8), 'dhash': (9, 8), 'phash': (_PHASH_GRID, _PHASH_GRID)}
+_BIT_FUNCTIONS = {'ahash': ahash_bits, 'dhash': dhash_bits, 'phash': phash_bits}
+
+
+def perceptual_hash(file_path: str, algorithm: str = DEFAULT_PERCEPTUAL_ALGORITHM) -> int | None:
+    """
+    Computes a 64-bit perceptual hash of an image file. Similar images have
+    hashes a small Hamming distance apart, unlike content hashes.
+
+    Kept at module level so it can be pickled for pool workers.
+
+    Args:
+        file_path: Path of the image.
+        algorithm: One of PERCEPTUAL_ALGORITHMS.
+
+    Returns:
+        The hash as an unsigned integer, or None if Pillow is missing or the
+        file cannot be decoded.
+
+    Raises:
+        ValueError: If the algorithm is unknown.
+    """
+    if algorithm not in _GRID_SIZES:
+        raise ValueError(
+            f"Unsupported perceptual hash algorithm '{algorithm}'. Available: {', '.join(PERCEPTUAL_ALGORITHMS)}"
+        )
+    if Image is None:
+        return None
+    width, height = _GRID_SIZES[algorithm]
+    try:
+        with Image.open(file_path) as image:
+            image.draft('L', (width * 4, height * 4)) # Lets JPEG decode at reduced size
+            grid = image.convert('L').resize((width, height), Image.Resampling.LANCZOS)
+            values = grid.tobytes() # One byte per pixel in mode L
+    except (OSError, *IMAGE_DECODE_ERRORS) as e:
+        print(f"Error calculating perceptual hash for {file_path}: {e}")
+        return None
+    pixels = [values[y * width:(y + 1) * width] for y in range(height)]
+    return _BIT_FUNCTIONS[algorithm](pixels)
@@ -1,9 +1,128 @@
 import pathlib
 import os
-import hashlib
+import mmap
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Iterator, NamedTuple
+from .chunking import DEFAULT_CHUNK_AVG_SIZE, ContentChunker
 from .config_manager import ConfigManager
+from .hashing import DEFAULT_HASH_ALGORITHM, available_algorithms, new_hasher
 from .metadata_store import MetadataStore
+from .perceptual_hash import (DEFAULT_PERCEPTUAL_ALGORITHM, IMAGE_DECODE_ERRORS, PERCEPTUAL_ALGORITHMS,
+                              is_image_path, perceptual_hash, perceptual_hash_available)
+
+
+class ScanEntry(NamedTuple):
+    """A file found by the directory walker, with the stat result already collected."""
+    path: str # Resolved, absolute path
+    name: str
+    stat: os.stat_result
+
+
+# Per-thread read buffer reused across files, so hashing does not allocate per chunk
+_read_buffers = threading.local()
+
+
+def _get_read_buffer(size: int) -> memoryview:
+    """Returns a writable view of at least `size` bytes from this thread's reused buffer."""
+    buffer = getattr(_read_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _read_buffers.buffer = buffer
+    return memoryview(buffer)
+
+
+def _fadvise(fd: int, advice_name: str, enabled: bool):
+    """Applies posix_fadvise where the platform supports it; advice is best-effort."""
+    if enabled and hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice_name))
+        except OSError:
+            pass
+
+
+def _hash_file(file_path: str, chunk_size: int, algorithm: str = DEFAULT_HASH_ALGORITHM,
+               mmap_threshold: int = 0, fadvise: bool = False,
+               chunker: ContentChunker | None = None) -> str | None:
+    """
+    Calculates the hash of a file with the given algorithm, reading in chunks.
+
+    Chunks are read with readinto() into a reused buffer, sized down for files
+    smaller than chunk_size. Files of at least mmap_threshold bytes (when it is
+    non-zero) are hashed from a memory map instead; a mapped file truncated
+    while it is hashed kills the process with SIGBUS. With fadvise, the kernel is
+    told the read is sequential and the file's cached pages are dropped
+    afterwards, so a scan does not evict the page cache. A chunker, if given,
+    is fed the same blocks, so content-defined chunks cost no extra read.
+
+    Kept at module level so it can be pickled for pool workers. Workers
+    never touch the MetadataStore; results are handed back to the scanning
+    process, which is the single writer for the DuckDB connection.
+    """
+    hasher = new_hasher(algorithm)
+    try:
+        with open(file_path, 'rb', buffering=0) as file:
+            fd = file.fileno()
+            size = os.fstat(fd).st_size
+            _fadvise(fd, 'POSIX_FADV_SEQUENTIAL', fadvise)
+            if mmap_threshold and size >= mmap_threshold:
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                    with memoryview(mapped) as view:
+                        for offset in range(0, size, chunk_size):
+                            hasher.update(view[offset:offset + chunk_size])
+                            if chunker is not None:
+                                chunker.update(view[offset:offset + chunk_size])
+            else:
+                view = _get_read_buffer(chunk_size)[:max(min(chunk_size, size), 1)]
+                while read := file.readinto(view):
+                    hasher.update(view[:read])
+                    if chunker is not None:
+                        chunker.update(view[:read])
+            _fadvise(fd, 'POSIX_FADV_DONTNEED', fadvise)
+        return hasher.hexdigest()
+    except (OSError, ValueError) as e: # mmap raises ValueError if the file is emptied before it is mapped
+        print(f"Error calculating hash for {file_path}: {e}")
+        return None
+
+
+def _hash_file_with_extras(file_path: str, chunk_size: int, algorithm: str, mmap_threshold: int, fadvise: bool,
+                           chunk_avg_size: int | None = None, perceptual_algorithm: str | None = None
+                           ) -> tuple[str | None, list[tuple[int, int, str]] | None, int | None]:
+    """
+    Hashes a file and, when requested, splits it into content-defined chunks
+    in the same read and computes its perceptual hash. Module level for pool
+    workers, like _hash_file.
+
+    Returns:
+        (hash, chunks, perceptual hash). chunks is a list of (offset, length,
+        digest) tuples, or None if not requested or the file could not be read.
+    """
+    chunker = ContentChunker(chunk_avg_size) if chunk_avg_size else None
+    file_hash = _hash_file(file_path, chunk_size, algorithm, mmap_threshold, fadvise, chunker)
+    if file_hash is None:
+        return None, None, None
+    image_hash = perceptual_hash(file_path, perceptual_algorithm) if perceptual_algorithm else None
+    return file_hash, chunker.finish() if chunker else None, image_hash
+
+
+def _partial_hash(file_path: str, size: int, span: int, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str | None:
+    """
+    Hashes only the first and last `span` bytes of a file. Used to rule out
+    same-size files cheaply before paying for a full hash.
+    """
+    hasher = new_hasher(algorithm)
+    try:
+        with open(file_path, 'rb') as file:
+            hasher.update(file.read(span))
+            if size > span:
+                file.seek(max(size - span, span))
+                hasher.update(file.read(span))
+        return hasher.hexdigest()
+    except OSError as e:
+        print(f"Error calculating partial hash for {file_path}: {e}")
+        return None
 
 
 class Scanner:
@@ -21,91 +140,424 @@ class Scanner:
         """
         self.config_manager = config_manager
         self.metadata_store = metadata_store
-        self._hash_chunk_size = 65536 # 64kb chunk size for hashing
+        self._hash_chunk_size = 256 * 1024 # 256 KiB read buffer, see benchmarks/bench_hashing.py
+        self._mmap_threshold = 0 # Hash through mmap from this size up, 0 disables it
+        self._fadvise = True
+        self._pending_records = [] # Records buffered for the next bulk upsert
+        self._batch_size = 1000
+        self._scan_index = {} # path -> (size_bytes, mtime_ns, ctime_ns, hash_algorithm) for the current scan root
+        self._follow_symlinks = False
+        self._cross_mounts = True
+        self._dedup_mode = 'full' # 'full' hashes during the walk, 'staged' defers to _resolve_duplicate_candidates
+        self._staged_sizes = set() # Sizes of the files staged dedup wrote unhashed during this scan
+        self._hash_algorithm = DEFAULT_HASH_ALGORITHM
+        self._path_overrides = {} # Settings from 'scanner.path_overrides' for the current scan root
+        self._chunking = False # Content-defined chunks for near-duplicate detection, see _hash_extras
+        self._chunk_avg_size = DEFAULT_CHUNK_AVG_SIZE
+        self._chunk_min_file_size = 16 * 1024 * 1024
+        self._perceptual_algorithm = None # Perceptual hash algorithm for image files, None when disabled
+        self._pending_hashes = [] # (entry, metadata) awaiting a hash, resolved in batches by _hash_pending
+        self._reused_from = {} # new path -> old path, for records whose hash was reused from a hardlink
+        self._moved_paths = {} # old path -> new path, for records of files moved or renamed since their last scan
+        self._reused_hashes = 0
 
-    def _calculate_hash(self, file_path: pathlib.Path) -> str | None:
-        """Calculates the SHA-256 hash of a file, reading in chunks."""
-        hasher = hashlib.sha256()
+    def _load_path_overrides(self, root: str) -> dict:
+        """
+        Returns the 'scanner.path_overrides' entry whose path is the longest
+        prefix of the scan root, or an empty dict. Lets network mounts use
+        different pool settings than local disks.
+        """
+        overrides = self._get_setting('path_overrides', {})
+        if not isinstance(overrides, dict):
+            return {}
+        best_prefix, best_settings = '', {}
+        normalized_root = os.path.normcase(root)
+        for prefix, settings in overrides.items():
+            normalized_prefix = os.path.normcase(os.path.abspath(prefix)).rstrip(os.sep) or os.sep
+            matches = normalized_root == normalized_prefix or \
+                normalized_root.startswith(normalized_prefix.rstrip(os.sep) + os.sep)
+            if matches and isinstance(settings, dict) and len(normalized_prefix) > len(best_prefix):
+                best_prefix, best_settings = normalized_prefix, settings
+        return best_settings
+
+    def _get_setting(self, name: str, default=None):
+        """Reads a scanner setting, preferring the path override for the current scan root."""
+        if name in self._path_overrides:
+            return self._path_overrides[name]
+        return self.config_manager.get(f'scanner.{name}', default)
+
+    def _get_int_setting(self, name: str, default: int) -> int:
+        """Reads an integer scanner setting, falling back to the default if invalid."""
+        value = self._get_setting(name, default)
         try:
-            with open(file_path, 'rb') as file:
-                while chunk := file.read(self._hash_chunk_size):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        except OSError as e:
-            print(f"Error calculating hash for {file_path}: {e}")
-            return None
+            return int(value)
+        except (ValueError, TypeError):
+            print(f"Warning: Invalid scanner.{name} value '{value}'. Using {default}.")
+            return default
 
-    def scan_directory(self, directory_path: str):
+    def _get_worker_count(self) -> int:
         """
-        Recursively scans a directory, identifies files, and triggers processing.
+        Returns the number of hashing workers configured via 'scanner.workers'.
+        A value of 1 (the default) selects the serial path; 0 means one worker per CPU.
+        """
+        workers = self._get_int_setting('workers', 1)
+        if workers == 0:
+            return os.cpu_count() or 1
+        return max(workers, 1)
 
-        Args:
-            directory_path: The absolute path to the directory to scan.
+    def _buffer_record(self, file_metadata: dict):
+        """Queues a record for the bulk upsert, flushing once the batch is full."""
+        self._pending_records.append(file_metadata)
+        if len(self._pending_records) >= self._batch_size:
+            self._flush_records()
+
+    def _flush_records(self):
+        """Writes all buffered records to the MetadataStore in one transaction, then their chunks and image hashes."""
+        if not self._pending_records:
+            return
+        records, self._pending_records = self._pending_records, []
+        if self._moved_paths:
+            # Renaming first carries over the chunks and image hashes; the upsert then refreshes the rows
+            moved_paths, self._moved_paths = self._moved_paths, {}
+            self.metadata_store.update_file_paths(list(moved_paths.items()))
+        self.metadata_store.upsert_file_records(records)
+        file_chunks = {record['path']: record['chunks'] for record in records if 'chunks' in record}
+        if file_chunks:
+            self.metadata_store.replace_file_chunks(file_chunks)
+        image_hashes = {record['path']: record['perceptual_hash'] for record in records if 'perceptual_hash' in record}
+        if image_hashes:
+            self.metadata_store.replace_perceptual_hashes(image_hashes, self._perceptual_algorithm)
+        if self._reused_from:
+            reused_from, self._reused_from = self._reused_from, {}
+            self.metadata_store.copy_file_extras(reused_from)
+
+    def _walk_files(self, root: str) -> Iterator[ScanEntry]:
         """
-        root_path = pathlib.Path(directory_path)
-        if not root_path.is_dir():
-            # Handle error: path is not a directory or doesn't exist
-            # For now, just return or log, proper error handling later
-            print(f"Error: Path is not a valid directory: {directory_path}")
+        Walks a directory tree with os.scandir and yields a ScanEntry per regular file.
+
+        Entry types come from the cached d_type, so only one stat call is made
+        per file. The root must already be resolved: child paths are built by
+        joining names onto it, and only followed symlinks are resolved again.
+        Symlinks are skipped unless 'scanner.follow_symlinks' is set, and
+        directories on other devices are skipped when 'scanner.cross_mounts' is false.
+        """
+        root_stat = os.stat(root)
+        root_dev = root_stat.st_dev
+        # (st_dev, st_ino) of walked directories, guards against symlink loops
+        visited_dirs = {(root_stat.st_dev, root_stat.st_ino)}
+        stack = [root]
+        while stack:
+            current_dir = stack.pop()
+            try:
+                with os.scandir(current_dir) as entries:
+                    entry_list = list(entries)
+            except OSError as e:
+                print(f"Error reading directory {current_dir}: {e}")
+                continue
+
+            for entry in entry_list:
+                try:
+                    is_link = entry.is_symlink()
+                    if is_link and not self._follow_symlinks:
+                        continue
+                    entry_path = os.path.realpath(entry.path) if is_link else entry.path
+
+                    if entry.is_dir(follow_symlinks=self._follow_symlinks):
+                        if self._follow_symlinks or not self._cross_mounts:
+                            dir_stat = os.stat(entry_path)
+                            if not self._cross_mounts and dir_stat.st_dev != root_dev:
+                                continue
+                            if self._follow_symlinks:
+                                dir_key = (dir_stat.st_dev, dir_stat.st_ino)
+                                if dir_key in visited_dirs:
+                                    continue
+                                visited_dirs.add(dir_key)
+                        stack.append(entry_path)
+                    elif entry.is_file(follow_symlinks=self._follow_symlinks):
+                        stat_result = entry.stat(follow_symlinks=self._follow_symlinks)
+                        yield ScanEntry(entry_path, entry.name, stat_result)
+                except OSError as e:
+                    print(f"Error processing file {entry.path}: {e}")
+
+    def _calculate_hash(self, file_path: pathlib.Path) -> str | None:
+        """Calculates the hash of a file with the configured algorithm, reading in chunks."""
+        return _hash_file(str(file_path), self._hash_chunk_size, self._hash_algorithm,
+                          self._mmap_threshold, self._fadvise)
+
+    def _hash_extras(self, path: str, size: int) -> tuple[int | None, str | None]:
+        """
+        Returns the (chunk average size, perceptual hash algorithm) to compute
+        for a file alongside its hash; each is None when not wanted.
+        """
+        chunk_avg_size = self._chunk_avg_size if self._chunking and size >= self._chunk_min_file_size else None
+        perceptual_algorithm = self._perceptual_algorithm if self._perceptual_algorithm and is_image_path(path) else None
+        return chunk_avg_size, perceptual_algorithm
+
+    def _set_hash_result(self, file_metadata: dict, file_hash: str | None, chunks: list | None = None,
+                         image_hash: int | None = None):
+        """
+        Stores a hash result and the scan time on a record. With chunking or
+        perceptual hashing on, every hashed record carries 'chunks' (empty when
+        not chunked) and 'perceptual_hash' (None for non-images), so the store
+        drops values left over from an earlier version of the file.
+        """
+        file_metadata['hash'] = file_hash
+        file_metadata['hash_algorithm'] = self._hash_algorithm if file_hash else None
+        file_metadata['last_scanned'] = datetime.now(timezone.utc) # Add current scan time
+        if self._chunking and file_hash:
+            file_metadata['chunks'] = chunks or []
+        if self._perceptual_algorithm and file_hash:
+            file_metadata['perceptual_hash'] = image_hash
+
+    def _reuse_moved_hashes(self, items: list[tuple[ScanEntry, dict]]) -> list[tuple[ScanEntry, dict]]:
+        """
+        Looks up a batch of files needing a hash by (device, inode, size,
+        mtime_ns) in one query. Files that were moved or renamed since their
+        last scan match their old record and reuse its hash. If the old path is
+        gone, its record is renamed to the new path at the next flush, so no
+        stale row is left to pose as a duplicate; otherwise (a hardlink) the
+        chunks and perceptual hashes are copied over.
+
+        Returns:
+            The items that still need hashing.
+        """
+        identities = {}
+        for entry, file_metadata in items:
+            if file_metadata['inode']: # 0 where the platform reports no inode numbers
+                identities[(file_metadata['device'], file_metadata['inode'],
+                            file_metadata['size_bytes'], file_metadata['mtime_ns'])] = entry
+        found = self.metadata_store.find_hashes_by_inode(list(identities), self._hash_algorithm) if identities else {}
+
+        misses = []
+        for entry, file_metadata in items:
+            identity = (file_metadata['device'], file_metadata['inode'],
+                        file_metadata['size_bytes'], file_metadata['mtime_ns'])
+            cached = found.get(identity)
+            # A match at the file's own path failed the incremental check, so its content may have changed
+            if cached is None or cached[0] == file_metadata['path']:
+                misses.append((entry, file_metadata))
+                continue
+            old_path, file_hash = cached
+            file_metadata['hash'] = file_hash
+            file_metadata['hash_algorithm'] = self._hash_algorithm
+            file_metadata['last_scanned'] = datetime.now(timezone.utc)
+            renamed_to = self._moved_paths.get(old_path)
+            if renamed_to is None and not os.path.lexists(old_path):
+                self._moved_paths[old_path] = file_metadata['path']
+            elif self._chunking or self._perceptual_algorithm:
+                # Another name of an inode whose record stays, or was already renamed in this batch
+                self._reused_from[file_metadata['path']] = renamed_to or old_path
+            self._reused_hashes += 1
+            self._buffer_record(file_metadata)
+        return misses
+
+    def _prepare_file_metadata(self, entry: ScanEntry) -> dict | None:
+        """
+        Builds metadata for a walked file and performs the incremental check.
+
+        Returns:
+            The metadata dictionary (without 'hash') if the file is new or changed,
+            or None if the stored record is still current.
+        """
+        stat = entry.stat
+        # Integer comparison catches sub-second rewrites; ctime also changes when
+        # content is rewritten with its mtime restored (e.g. by rsync -t or touch -d)
+        identity = (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+        # Check the preloaded scan index for an existing record (Incremental Scan Logic)
+        normalized_path_str = os.path.normcase(entry.path)
+        existing_record = self._scan_index.get(normalized_path_str)
+
+        # Compare metadata if record exists
+        if existing_record:
+            stored_algorithm = existing_record[3]
+            # A hash from another algorithm (or a missing one outside staged mode)
+            # is treated as stale, so switching algorithms rehashes lazily
+            hash_current = stored_algorithm == self._hash_algorithm or \
+                (stored_algorithm is None and self._dedup_mode == 'staged')
+
+            if hash_current and existing_record[:3] == identity:
+                # Metadata matches, skip hashing and upsert
+                print(f"Skipping unchanged file: {entry.path}")
+                return None # Skip processing this file
+
+        return {
+            'path': normalized_path_str, # Store normalized path string
+            'filename': entry.name,
+            'size_bytes': stat.st_size,
+            # The datetime is only built for records being written; the skip check uses the integers
+            'last_modified': datetime.fromtimestamp(stat.st_mtime_ns / 1e9, tz=timezone.utc),
+            'device': stat.st_dev,
+            'inode': stat.st_ino,
+            'mtime_ns': stat.st_mtime_ns,
+            'ctime_ns': stat.st_ctime_ns,
+        }
+
+    def _process_file(self, entry: ScanEntry):
+        """
+        Processes a single file: checks incremental, collects metadata, and
+        queues it for hashing and upsert. Queued files are hashed in batches
+        of 'scanner.batch_size' by _hash_pending.
+        """
+        file_metadata = self._prepare_file_metadata(entry)
+        if file_metadata is None:
             return
 
-        # Define a small tolerance for timestamp comparisons (e.g., 1 second)
-        # due to potential floating point inaccuracies or filesystem differences
-        TIMESTAMP_TOLERANCE_SECONDS = 1 # Define tolerance at class level or pass via config? For now, keep here.
+        # If no record or metadata mismatch, proceed with hashing and upsert.
+        # Staged dedup leaves the hash empty until a size collision requires it.
+        if self._dedup_mode == 'staged':
+            self._set_hash_result(file_metadata, None)
+            self._staged_sizes.add(file_metadata['size_bytes'])
+            self._buffer_record(file_metadata)
+            return
 
-    def _process_file(self, item_path: pathlib.Path):
-        """Processes a single file: checks incremental, collects metadata, hashes, upserts."""
-        TIMESTAMP_TOLERANCE_SECONDS = 1 # Re-define here for now, consider class level later
-        try:
-            resolved_path = item_path.resolve()
-            # Collect basic metadata
-            stat_result = item_path.stat()
-            size = stat_result.st_size
-            mtime_ts = stat_result.st_mtime
-            # Convert mtime to timezone-aware UTC datetime
-            last_modified = datetime.fromtimestamp(mtime_ts, tz=timezone.utc)
-
-            # Check metadata store for existing record (Incremental Scan Logic)
-            # Pass normalized path string within the criteria dictionary
-            normalized_path_str = os.path.normcase(str(resolved_path))
-            existing_records = self.metadata_store.query_files(criteria={'path': normalized_path_str})
-            existing_record = existing_records[0] if existing_records else None
-
-            # Compare metadata if record exists
-            if existing_record:
-                stored_last_modified = existing_record.get('last_modified')
-                stored_size = existing_record.get('size')
-
-                # Check if size and mtime match (within tolerance)
-                if stored_size == size and stored_last_modified and \
-                   abs((last_modified - stored_last_modified).total_seconds()) < TIMESTAMP_TOLERANCE_SECONDS:
-                    # Metadata matches, skip hashing and upsert
-                    print(f"Skipping unchanged file: {resolved_path}")
-                    return # Skip processing this file
-
-            # If no record or metadata mismatch, proceed with hashing and upsert
-            hash_value = self._calculate_hash(item_path)
-
-            # Prepare metadata dictionary
-            file_metadata = {
-                'path': normalized_path_str, # Store normalized path string
-                'filename': item_path.name,
-                'size_bytes': size,
-                'last_modified': last_modified,
-                'hash': hash_value, # Revert to 'hash' as expected by MetadataStore
-                'last_scanned': datetime.now(timezone.utc) # Add current scan time
-            }
-
-            # Call upsert with the metadata dictionary
-            self.metadata_store.upsert_file_record(file_metadata=file_metadata)
-
-        except OSError as e:
-            # Handle potential errors during stat() or hashing
-            print(f"Error processing file {item_path}: {e}")
+        self._pending_hashes.append((entry, file_metadata))
+        if len(self._pending_hashes) >= self._batch_size:
+            self._hash_pending()
+
+    def _hash_pending(self):
+        """Hashes the queued files, reusing stored hashes of moved files, and buffers the records."""
+        if not self._pending_hashes:
+            return
+        items, self._pending_hashes = self._pending_hashes, []
+        for entry, file_metadata in self._reuse_moved_hashes(items):
+            try:
+                if any(extras := self._hash_extras(entry.path, file_metadata['size_bytes'])):
+                    self._set_hash_result(file_metadata, *_hash_file_with_extras(
+                        entry.path, self._hash_chunk_size, self._hash_algorithm,
+                        self._mmap_threshold, self._fadvise, *extras))
+                else:
+                    self._set_hash_result(file_metadata, self._calculate_hash(entry.path))
+            except (OSError, *IMAGE_DECODE_ERRORS) as e:
+                # Handle potential errors during hashing, or decoding an image for its perceptual hash
+                print(f"Error processing file {entry.path}: {e}")
+                continue
+
+            # Buffer the record for the next bulk upsert
+            self._buffer_record(file_metadata)
+
+    def _scan_parallel(self, root: str, workers: int, pool_kind: str):
+        """
+        Scans a directory using a process or thread pool for hashing.
+
+        The scanning process walks the tree and performs the incremental check,
+        workers hash new or changed files, and completed results are buffered
+        and upserted from this process only, so the DuckDB connection has a single writer.
+        Results are consumed in submission order to match the serial path.
+        Files are looked up in batches first, so moved files reuse their
+        stored hash and are never submitted.
+
+        Process pools suit CPU-bound hashing on local disks. Thread pools suit
+        latency-bound network mounts, since hashlib releases the GIL on large
+        updates. Each device (st_dev) has at most 'scanner.max_in_flight'
+        files queued or hashing at once.
+        """
+        max_in_flight = max(self._get_int_setting('max_in_flight', workers * 2), 1)
+        max_pending = max(workers * 4, max_in_flight) # Bound memory use on very large trees
+        pending = deque()
+        in_flight_by_device = defaultdict(int)
+
+        def write_next():
+            file_metadata, device, future = pending.popleft()
+            in_flight_by_device[device] -= 1
+            try:
+                result = future.result()
+            except (OSError, *IMAGE_DECODE_ERRORS) as e:
+                print(f"Error processing file {file_metadata['path']}: {e}")
+                return
+            if isinstance(result, tuple): # From _hash_file_with_extras
+                self._set_hash_result(file_metadata, *result)
+            else:
+                self._set_hash_result(file_metadata, result)
+            self._buffer_record(file_metadata)
+
+        def submit(pool, items):
+            for entry, file_metadata in self._reuse_moved_hashes(items):
+                device = entry.stat.st_dev
+                # Results are written in order, so draining from the head frees this device's slots
+                while in_flight_by_device[device] >= max_in_flight or len(pending) >= max_pending:
+                    write_next()
+
+                extras = self._hash_extras(entry.path, file_metadata['size_bytes'])
+                if any(extras):
+                    future = pool.submit(_hash_file_with_extras, entry.path, self._hash_chunk_size,
+                                         self._hash_algorithm, self._mmap_threshold, self._fadvise, *extras)
+                else:
+                    future = pool.submit(_hash_file, entry.path, self._hash_chunk_size, self._hash_algorithm,
+                                         self._mmap_threshold, self._fadvise)
+                pending.append((file_metadata, device, future))
+                in_flight_by_device[device] += 1
+
+        executor_class = ThreadPoolExecutor if pool_kind == 'thread' else ProcessPoolExecutor
+        with executor_class(max_workers=workers) as pool:
+            items = []
+            for entry in self._walk_files(root):
+                file_metadata = self._prepare_file_metadata(entry)
+                if file_metadata is None:
+                    continue
+                items.append((entry, file_metadata))
+                if len(items) >= self._batch_size:
+                    submit(pool, items)
+                    items = []
+            submit(pool, items)
+
+            while pending:
+                write_next()
+
+    def _resolve_duplicate_candidates(self):
+        """
+        Staged dedup: hashes only files that could be duplicates.
+
+        Files are grouped by size; same-size files get a partial hash of their
+        first and last 'scanner.partial_hash_kib' KiB, and only files whose
+        partial hashes collide are fully hashed. Full hashes are written back to
+        the store, and files with a unique size or partial hash stay unhashed.
+        Only sizes of files written by this scan are checked, since groups
+        left unhashed by earlier scans cannot have changed otherwise.
+        """
+        span = max(self._get_int_setting('partial_hash_kib', 64), 1) * 1024
+        resolved = []
+        candidates = 0
+        bytes_read = 0
+
+        groups = self.metadata_store.get_size_collision_groups(self._hash_algorithm, self._staged_sizes)
+        for size, members in groups.items():
+            candidates += len(members)
+            if size <= 2 * span:
+                # The partial hash would read the whole file anyway
+                for path, hash_value in members:
+                    if hash_value is None and (full_hash := self._calculate_hash(path)):
+                        resolved.append((path, full_hash))
+                        bytes_read += size
+                continue
+
+            by_partial = defaultdict(list)
+            for path, hash_value in members:
+                partial = _partial_hash(path, size, span, self._hash_algorithm)
+                bytes_read += 2 * span
+                if partial is not None:
+                    by_partial[partial].append((path, hash_value))
+
+            for colliding in by_partial.values():
+                if len(colliding) < 2:
+                    continue
+                for path, hash_value in colliding:
+                    if hash_value is None and (full_hash := self._calculate_hash(path)):
+                        resolved.append((path, full_hash))
+                        bytes_read += size
+
+        self.metadata_store.update_file_hashes(resolved, self._hash_algorithm)
+        print(f"Staged dedup: fully hashed {len(resolved)} of {candidates} same-size candidates "
+              f"({bytes_read / (1024 * 1024):.1f} MB read).")
 
     def scan_directory(self, directory_path: str):
         """
         Recursively scans a directory, identifies files, and triggers processing for each.
+        Hashing runs in a process or thread pool ('scanner.pool') when
+        'scanner.workers' is greater than 1, or is deferred to a size-first pass
+        when 'scanner.dedup_mode' is 'staged'. Records are buffered and written
+        in batches of 'scanner.batch_size'. Settings under the longest matching
+        'scanner.path_overrides' prefix take precedence for this directory.
 
         Args:
             directory_path: The absolute path to the directory to scan.
@@ -115,6 +567,70 @@ class Scanner:
             print(f"Error: Path is not a valid directory: {directory_path}")
             return
 
-        for item_path in root_path.rglob('*'):
-            if item_path.is_file():
-                self._process_file(item_path)
\ No newline at end of file
+        # Resolve the root once; the walker builds already-resolved child paths from it
+        root = str(root_path.resolve())
+        self._path_overrides = self._load_path_overrides(root)
+        try:
+            self._scan_root(root)
+        finally:
+            self._path_overrides = {}
+
+    def _scan_root(self, root: str):
+        """Loads the scanner settings for a resolved scan root and scans it."""
+        self._batch_size = max(self._get_int_setting('batch_size', 1000), 1)
+        self._follow_symlinks = bool(self._get_setting('follow_symlinks', False))
+        self._cross_mounts = bool(self._get_setting('cross_mounts', True))
+        self._dedup_mode = self._get_setting('dedup_mode', 'full')
+        if self._dedup_mode not in ('full', 'staged'):
+            print(f"Warning: Unknown scanner.dedup_mode '{self._dedup_mode}'. Using 'full'.")
+            self._dedup_mode = 'full'
+        self._hash_chunk_size = max(self._get_int_setting('hash_buffer_kib', 256), 4) * 1024
+        self._mmap_threshold = max(self._get_int_setting('mmap_threshold_mb', 0), 0) * 1024 * 1024
+        self._fadvise = bool(self._get_setting('fadvise', True))
+        self._hash_algorithm = self._get_setting('hash_algorithm', DEFAULT_HASH_ALGORITHM)
+        if self._hash_algorithm not in available_algorithms():
+            print(f"Warning: Hash algorithm '{self._hash_algorithm}' is not available "
+                  f"(choose from {', '.join(available_algorithms())}). Using '{DEFAULT_HASH_ALGORITHM}'.")
+            self._hash_algorithm = DEFAULT_HASH_ALGORITHM
+        self._chunking = self._get_setting('chunking', False) is True
+        self._chunk_avg_size = max(self._get_int_setting('chunk_avg_kib', DEFAULT_CHUNK_AVG_SIZE // 1024), 1) * 1024
+        self._chunk_min_file_size = max(self._get_int_setting('chunk_min_file_mb', 16), 0) * 1024 * 1024
+        self._perceptual_algorithm = None
+        if self._get_setting('perceptual_hash', False) is True:
+            self._perceptual_algorithm = self._get_setting('perceptual_hash_algorithm', DEFAULT_PERCEPTUAL_ALGORITHM)
+            if self._perceptual_algorithm not in PERCEPTUAL_ALGORITHMS:
+                print(f"Warning: Unknown scanner.perceptual_hash_algorithm '{self._perceptual_algorithm}'. "
+                      f"Using '{DEFAULT_PERCEPTUAL_ALGORITHM}'.")
+                self._perceptual_algorithm = DEFAULT_PERCEPTUAL_ALGORITHM
+            if not perceptual_hash_available():
+                print("Warning: scanner.perceptual_hash requires Pillow. Image files will not get perceptual hashes.")
+                self._perceptual_algorithm = None
+        pool_kind = self._get_setting('pool', 'process')
+        if pool_kind not in ('process', 'thread'):
+            print(f"Warning: Unknown scanner.pool '{pool_kind}'. Using 'process'.")
+            pool_kind = 'process'
+
+        # One bulk query replaces a per-file lookup for the incremental check
+        self._scan_index = self.metadata_store.get_scan_index(os.path.normcase(root))
+        self._reused_hashes = 0
+        self._staged_sizes = set()
+        workers = self._get_worker_count()
+        try:
+            if workers > 1 and self._dedup_mode == 'full':
+                self._scan_parallel(root, workers, pool_kind)
+            else:
+                for entry in self._walk_files(root):
+                    self._process_file(entry)
+                self._hash_pending()
+        finally:
+            # Persist whatever was collected, even if the walk was interrupted
+            self._pending_hashes = []
+            self._flush_records()
+            self._moved_paths = {}
+            self._scan_index = {}
+
+        if self._reused_hashes:
+            print(f"Reused {self._reused_hashes} stored hashes of moved or renamed files.")
+
+        if self._dedup_mode == 'staged':
+            self._resolve_duplicate_candidates()
@@ -65,7 +65,8 @@ def setup_test_environment(tmp_path):
         'action_executor': {
             'staging_dir': str(staging_dir),
             # 'dry_run': False # Let CLI override this
-        }
+        },
+        'metadata_store': {'optimize_layout': True}
     }
     with open(config_path, 'w') as f:
         yaml.dump(config_data, f)
@@ -119,6 +120,9 @@ def test_main_workflow_dry_run(setup_test_environment, capsys):
     assert "- stage_duplicate: 1 files" in result.stderr # One of the duplicates should be marked
     assert "- review_large: 1 files" in result.stderr
     assert "- review_old: 1 files" in result.stderr
+    assert "- duplicates: 1 groups" in result.stderr
+    assert "Rewriting the metadata store in hash order..." in result.stderr
+    assert "Rewrote files table in hash order" in result.stderr
     assert "Initializing action executor..." in result.stderr
     assert "Executing actions... (Dry Run: True)" in result.stderr
     # Check specific dry-run action print statements (stdout)
@@ -961,8 +965,8 @@ def test_main_workflow_staging_permission_error(setup_test_environment, capsys,
     # File that will trigger the error (any file subject to an action)
     target_file_path = scan_dir / "subdir" / "file2.txt" # Duplicate file
 
-    # Mock shutil.move to raise PermissionError - This will now work as main is called directly
-    mock_move = mocker.patch('shutil.move', side_effect=PermissionError("Test permission denied"))
+    # Mock the file move to raise PermissionError - This will now work as main is called directly
+    mock_move = mocker.patch('storage_hygiene.action_executor.move_file', side_effect=PermissionError("Test permission denied"))
 
     # Simulate command-line arguments for direct main() call
     test_argv = [
@@ -989,7 +993,7 @@ def test_main_workflow_staging_permission_error(setup_test_environment, capsys,
     print("STDOUT:\n", captured.out)
     print("STDERR:\n", captured.err)
 
-    # Check that shutil.move was called (or attempted)
+    # Check that the move was called (or attempted)
     mock_move.assert_called()
 
     # Check stdout (since logging is directed there) for the critical error message
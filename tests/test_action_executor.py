@@ -1,9 +1,13 @@
 import os
 import shutil
 import pytest
+from datetime import datetime, timezone
 from unittest.mock import Mock
 
 from storage_hygiene.action_executor import ActionExecutor
+from storage_hygiene.action_journal import DONE, ActionJournal
+from storage_hygiene.file_transfer import move_file
+from storage_hygiene.metadata_store import MetadataStore
 # from storage_hygiene.config_manager import ConfigManager # Keep commented for now, using Mock
 
 def test_action_executor_initialization():
@@ -91,7 +95,7 @@ def test_stage_duplicate_moves_file(mocker):
 
     # Mock file system operations
     mock_makedirs = mocker.patch('os.makedirs')
-    mock_move = mocker.patch('shutil.move')
+    mock_move = mocker.patch('storage_hygiene.action_executor.move_file')
     # Mock Path.exists to simulate destination not existing initially
     mocker.patch('pathlib.Path.exists', return_value=False)
 
@@ -119,7 +123,7 @@ def test_stage_duplicate_moves_file(mocker):
 
     # Assertions
     mock_makedirs.assert_called_once_with(expected_dest_dir, exist_ok=True)
-    mock_move.assert_called_once_with(str(file_path), expected_dest_path)
+    mock_move.assert_called_once_with(str(file_path), expected_dest_path, 'auto')
 # ... (keep existing tests)
 
 def test_stage_duplicate_dry_run_logs_and_skips_move(mocker):
@@ -132,7 +136,7 @@ def test_stage_duplicate_dry_run_logs_and_skips_move(mocker):
 
     # Mock file system operations and print
     mock_makedirs = mocker.patch('os.makedirs')
-    mock_move = mocker.patch('shutil.move')
+    mock_move = mocker.patch('storage_hygiene.action_executor.move_file')
     mock_print = mocker.patch('builtins.print') # Mock print for logging check
 
     mock_metadata_store = mocker.Mock() # Add mock store
@@ -201,7 +205,7 @@ def test_review_large_moves_file(mocker):
 
     # Mock file system operations
     mock_makedirs = mocker.patch('os.makedirs')
-    mock_move = mocker.patch('shutil.move')
+    mock_move = mocker.patch('storage_hygiene.action_executor.move_file')
     mocker.patch('pathlib.Path.exists', return_value=False) # Simulate dest not existing
 
     mock_metadata_store = mocker.Mock() # Add mock store
@@ -225,7 +229,7 @@ def test_review_large_moves_file(mocker):
 
     # Assertions
     mock_makedirs.assert_called_once_with(expected_dest_dir, exist_ok=True)
-    mock_move.assert_called_once_with(str(file_path), expected_dest_path)
+    mock_move.assert_called_once_with(str(file_path), expected_dest_path, 'auto')
 # ... (keep existing tests)
 
 def test_execute_actions_dispatches_review_old(mocker):
@@ -301,7 +305,7 @@ def test_stage_file_handles_file_not_found_error(mocker):
     mock_config_manager = mocker.Mock()
     mock_makedirs = mocker.patch('os.makedirs')
     # Simulate FileNotFoundError during move
-    mock_move = mocker.patch('shutil.move', side_effect=FileNotFoundError("File not found"))
+    mock_move = mocker.patch('storage_hygiene.action_executor.move_file', side_effect=FileNotFoundError("File not found"))
     mock_print = mocker.patch('builtins.print')
     mocker.patch('pathlib.Path.exists', return_value=False) # Dest doesn't exist
 
@@ -324,6 +328,382 @@ def test_stage_file_handles_file_not_found_error(mocker):
 
     # Assertions
     mock_makedirs.assert_called_once() # Make sure it tried to create the dir
-    mock_move.assert_called_once_with(str(file_path), expected_dest_path) # Make sure it tried to move
+    mock_move.assert_called_once_with(str(file_path), expected_dest_path, 'auto') # Make sure it tried to move
     # Check if the error message was printed (it should be before the exception is raised)
-    mock_print.assert_any_call(f"Error moving file {file_path} to {expected_dest_path}: File not found")
\ No newline at end of file
+    mock_print.assert_any_call(f"Error moving file {file_path} to {expected_dest_path}: File not found")
+
+def test_execute_actions_accepts_candidate_stream(mocker):
+    """
+    Test that execute_actions dispatches a flat stream of candidates by their
+    'action' key, consuming it lazily.
+    TDD Anchor: [AX_Dispatch]
+    """
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': './.storage_hygiene_staging',
+        'action_executor.dry_run': True
+    }.get(key, default)
+    mock_stage_dup = mocker.patch('storage_hygiene.action_executor.ActionExecutor._stage_duplicate', return_value=None)
+    mock_large = mocker.patch('storage_hygiene.action_executor.ActionExecutor._review_large', return_value=None)
+
+    executor = ActionExecutor(config_manager=mock_config_manager, metadata_store=mocker.Mock())
+    dup = {'action': 'stage_duplicate', 'path': '/a/dup.txt', 'hash': 'aabb'}
+    large = {'action': 'review_large', 'path': '/a/big.iso', 'size': 10}
+    unknown = {'action': 'unknown', 'path': '/a/other'}
+
+    executor.execute_actions(c for c in (dup, large, unknown))
+
+    mock_stage_dup.assert_called_once_with(dup, Path('./.storage_hygiene_staging'), True)
+    mock_large.assert_called_once_with(large, Path('./.storage_hygiene_staging'), True)
+
+
+def test_execute_actions_iterates_candidate_batches(mocker):
+    """
+    Test that columnar candidate batches in a flat stream are dispatched row by row.
+    TDD Anchor: [AX_Dispatch]
+    """
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': './.storage_hygiene_staging',
+        'action_executor.dry_run': True
+    }.get(key, default)
+    mock_large = mocker.patch('storage_hygiene.action_executor.ActionExecutor._review_large', return_value=None)
+
+    executor = ActionExecutor(config_manager=mock_config_manager, metadata_store=mocker.Mock())
+    # Any non-mapping iterable of candidates is treated as a batch
+    batch = [{'action': 'review_large', 'path': '/a/one.iso', 'size': 1},
+             {'action': 'review_large', 'path': '/a/two.iso', 'size': 2}]
+
+    executor.execute_actions(iter([batch]))
+
+    assert [c.args[0]['path'] for c in mock_large.call_args_list] == ['/a/one.iso', '/a/two.iso']
+
+
+def test_parallel_execution_matches_serial_order_and_skips(tmp_path, mocker):
+    """
+    Test that with 'action_executor.workers' the moves run in a thread pool,
+    yet path updates reach the store in action order from the calling thread,
+    a file staged twice is moved once, and two files with the same staging
+    name never overwrite each other.
+    TDD Anchor: [AX_Parallel]
+    """
+    import threading
+
+    source = tmp_path / "source"
+    (source / "other").mkdir(parents=True)
+    files = [source / f"file{i}.bin" for i in range(12)]
+    for i, path in enumerate(files):
+        path.write_text(f"content {i}")
+    clash = source / "other" / "file0.bin" # Same staging name as file0.bin
+    clash.write_text("different content")
+
+    staging = tmp_path / "staging"
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(staging),
+        'action_executor.dry_run': False,
+        'action_executor.workers': 4,
+    }.get(key, default)
+    mock_metadata_store = mocker.Mock()
+    writer_threads = set()
+    mock_metadata_store.update_file_paths.side_effect = lambda pairs: writer_threads.add(threading.get_ident())
+
+    real_move = move_file
+    move_threads = set()
+
+    def tracking_move(src, dst, strategy):
+        move_threads.add(threading.get_ident())
+        return real_move(src, dst, strategy)
+
+    mocker.patch('storage_hygiene.action_executor.move_file', side_effect=tracking_move)
+
+    actions = [{'action': 'review_large', 'path': str(path), 'size': 1} for path in files]
+    actions.insert(3, {'action': 'review_old', 'path': str(files[1])}) # Already staged by the previous action
+    actions.append({'action': 'review_large', 'path': str(clash), 'size': 1})
+
+    ActionExecutor(mock_config_manager, mock_metadata_store).execute_actions(iter(actions))
+
+    updated = [old for c in mock_metadata_store.update_file_paths.call_args_list for old, _ in c.args[0]]
+    assert updated == [os.path.normcase(str(path)) for path in files]
+    assert sorted(p.name for p in (staging / 'large_files').iterdir()) == sorted(p.name for p in files)
+    assert (staging / 'large_files' / 'file0.bin').read_text() == "content 0"
+    assert clash.exists() and not (staging / 'old_files').exists()
+    assert writer_threads == {threading.get_ident()}
+    assert threading.get_ident() not in move_threads
+
+
+@pytest.mark.parametrize("same_device, allowed_peaks", [(True, {2, 3, 4}), (False, {1})])
+def test_parallel_execution_limits_moves_per_device(tmp_path, mocker, same_device, allowed_peaks):
+    """
+    Test that renames within the staging device run up to
+    'action_executor.same_device_in_flight' at once, while moves from another
+    device are capped at 'action_executor.cross_device_in_flight'.
+    TDD Anchor: [AX_Parallel]
+    """
+    import threading
+    import time
+
+    source = tmp_path / "source"
+    source.mkdir()
+    files = [source / f"file{i}.bin" for i in range(12)]
+    for path in files:
+        path.write_text("x")
+
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(tmp_path / "staging"),
+        'action_executor.workers': 8,
+        'action_executor.same_device_in_flight': 4,
+        'action_executor.cross_device_in_flight': 1,
+    }.get(key, default)
+    staging_device = 1
+    mocker.patch.object(ActionExecutor, '_device_of',
+                        side_effect=lambda path: staging_device if same_device or 'staging' in str(path) else 2)
+
+    real_move = move_file
+    lock = threading.Lock()
+    active = {'now': 0, 'peak': 0}
+
+    def slow_move(src, dst, strategy):
+        with lock:
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+        time.sleep(0.02)
+        try:
+            return real_move(src, dst, strategy)
+        finally:
+            with lock:
+                active['now'] -= 1
+
+    mocker.patch('storage_hygiene.action_executor.move_file', side_effect=slow_move)
+
+    ActionExecutor(mock_config_manager, mocker.Mock()).execute_actions(
+        {'review_large': [{'path': str(path), 'size': 1} for path in files]})
+
+    assert active['peak'] in allowed_peaks
+    assert len(list((tmp_path / "staging" / "large_files").iterdir())) == len(files)
+
+
+def test_path_updates_are_flushed_in_batches_and_on_failure(tmp_path, mocker):
+    """
+    Test that completed moves reach the store through update_file_paths every
+    'action_executor.db_batch_size' moves, and that moves made before a
+    critical error are still written when the run halts.
+    TDD Anchor: [AX_BatchedPathUpdates]
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    files = [source / f"file{i}.bin" for i in range(5)]
+    for path in files:
+        path.write_text("x")
+
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(tmp_path / "staging"),
+        'action_executor.db_batch_size': 2,
+    }.get(key, default)
+    mock_metadata_store = mocker.Mock()
+    executor = ActionExecutor(mock_config_manager, mock_metadata_store)
+
+    executor.execute_actions({'review_large': [{'path': str(path), 'size': 1} for path in files]})
+
+    batches = [[old for old, _ in c.args[0]] for c in mock_metadata_store.update_file_paths.call_args_list]
+    assert batches == [[os.path.normcase(str(path)) for path in chunk] for chunk in (files[:2], files[2:4], files[4:])]
+    mock_metadata_store.update_file_path.assert_not_called()
+
+    mock_metadata_store.reset_mock()
+    moved = tmp_path / "more"
+    moved.mkdir()
+    (moved / "ok.bin").write_text("x")
+    def move_or_deny(src, dst, strategy):
+        if src.endswith("locked.bin"):
+            raise PermissionError("denied")
+        return move_file(src, dst, strategy)
+
+    mocker.patch('storage_hygiene.action_executor.move_file', side_effect=move_or_deny)
+
+    with pytest.raises(PermissionError):
+        executor.execute_actions({'review_old': [{'path': str(moved / "ok.bin")}, {'path': str(moved / "locked.bin")}]})
+
+    mock_metadata_store.update_file_paths.assert_called_once()
+    assert [old for old, _ in mock_metadata_store.update_file_paths.call_args.args[0]] == \
+        [os.path.normcase(str(moved / "ok.bin"))]
+
+
+def test_journaled_moves_are_settled_by_resume(tmp_path, mocker):
+    """
+    Test that a journaled run leaves an empty journal, and that resume()
+    after a crash rolls completed moves forward into the store, removes the
+    destination of an interrupted copy, and replays moves that were done but
+    never committed.
+    TDD Anchor: [AX_Journal]
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    staging = tmp_path / "staging"
+    journal_path = tmp_path / "actions.journal"
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(staging),
+    }.get(key, default)
+    mock_metadata_store = mocker.Mock()
+    executor = ActionExecutor(mock_config_manager, mock_metadata_store, journal_path=journal_path)
+
+    (source / "clean.bin").write_text("x")
+    executor.execute_actions({'review_large': [{'path': str(source / "clean.bin"), 'size': 1}]})
+    assert (staging / "large_files" / "clean.bin").exists()
+    assert journal_path.read_text() == ""
+
+    # A crash after the move of moved.bin, during the copy of copied.bin, and
+    # before the store was written for synced.bin
+    moved, copied, synced = (source / name for name in ("moved.bin", "copied.bin", "synced.bin"))
+    for path in (moved, copied, synced):
+        path.write_text("x")
+    (staging / "old").mkdir(parents=True)
+    with ActionJournal(journal_path) as journal:
+        journal.record_intent('review_old', str(moved), str(staging / "old" / "moved.bin"))
+        journal.record_intent('review_old', str(copied), str(staging / "old" / "copied.bin"))
+        synced_id = journal.record_intent('review_old', str(synced), str(staging / "old" / "synced.bin"))
+        journal.record_states([synced_id], DONE)
+    moved.rename(staging / "old" / "moved.bin")
+    (staging / "old" / "copied.bin").write_text("partial")
+    synced.rename(staging / "old" / "synced.bin")
+    mock_metadata_store.reset_mock()
+
+    counts = ActionExecutor(mock_config_manager, mock_metadata_store, journal_path=journal_path).resume()
+
+    assert counts == {'rolled_forward': 2, 'rolled_back': 1, 'failed': 0}
+    mock_metadata_store.update_file_paths.assert_called_once_with([
+        (os.path.normcase(str(path)), os.path.normcase(str(staging / "old" / path.name))) for path in (moved, synced)
+    ])
+    assert copied.exists() and not (staging / "old" / "copied.bin").exists()
+    assert journal_path.read_text() == ""
+
+
+def test_resume_after_crash_between_store_commit_and_synced(tmp_path, mocker):
+    """
+    Test that resume() only closes a done move whose new path the store
+    already committed, instead of writing the path update a second time.
+    TDD Anchor: [AX_Journal]
+    """
+    source = tmp_path / "source" / "file.bin"
+    destination = tmp_path / "staging" / "old" / "file.bin"
+    source.parent.mkdir()
+    destination.parent.mkdir(parents=True)
+    source.write_text("x")
+    journal_path = tmp_path / "actions.journal"
+    old_path, new_path = os.path.normcase(str(source)), os.path.normcase(str(destination))
+    now = datetime.now(timezone.utc)
+
+    with MetadataStore(db_path=tmp_path / "metadata.db") as store:
+        store.upsert_file_record({'path': old_path, 'filename': source.name, 'size_bytes': 1,
+                                  'last_modified': now, 'hash': 'h', 'last_scanned': now})
+        # The move and its store commit completed, the crash lost the 'synced' line
+        with ActionJournal(journal_path) as journal:
+            journal.record_states([journal.record_intent('review_old', str(source), str(destination))], DONE)
+        source.rename(destination)
+        store.update_file_paths([(old_path, new_path)])
+
+        update_file_paths = mocker.spy(store, 'update_file_paths')
+
+        counts = ActionExecutor(mocker.Mock(), store, journal_path=journal_path).resume()
+
+        assert counts == {'rolled_forward': 1, 'rolled_back': 0, 'failed': 0}
+        update_file_paths.assert_not_called()
+        assert [row['path'] for row in store.query_files(criteria={})] == [new_path]
+        assert journal_path.read_text() == ""
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_dedupe_link_replaces_verified_duplicates_in_place(tmp_path, mocker, workers):
+    """
+    Test that dedupe_link turns duplicates into hardlinks of their original
+    without staging them, records the new inodes in the store, and leaves a
+    file whose content no longer matches its original untouched. Each link
+    is recorded so analysis can skip it.
+    TDD Anchor: [AX_DedupeLink]
+    """
+    mocker.patch('storage_hygiene.file_transfer._reflink', return_value=False)
+    original = tmp_path / "original.bin"
+    original.write_bytes(b"same bytes" * 1000)
+    copies = [tmp_path / f"copy{i}.bin" for i in range(3)]
+    for path in copies:
+        path.write_bytes(original.read_bytes())
+    copies[2].write_bytes(b"edited since the scan")
+    for path in (original, *copies):
+        os.chmod(path, 0o644)
+
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(tmp_path / "staging"),
+        'action_executor.workers': workers,
+    }.get(key, default)
+    mock_metadata_store = mocker.Mock()
+    executor = ActionExecutor(mock_config_manager, mock_metadata_store)
+    actions = {'dedupe_link': [{'action': 'dedupe_link', 'path': str(path), 'hash': 'h',
+                                'original_path': str(original)} for path in copies]}
+
+    executor.execute_actions(actions, dry_run_override=True)
+    assert {path.stat().st_ino for path in copies}.isdisjoint({original.stat().st_ino})
+
+    executor.execute_actions(actions)
+
+    inode = original.stat().st_ino
+    assert [path.stat().st_ino == inode for path in copies] == [True, True, False]
+    assert copies[2].read_bytes() == b"edited since the scan"
+    assert not (tmp_path / "staging").exists()
+    mock_metadata_store.update_file_paths.assert_not_called()
+    identities = [identity for c in mock_metadata_store.update_file_identities.call_args_list for identity in c.args[0]]
+    assert {identity[0] for identity in identities} == {os.path.normcase(str(path)) for path in (original, *copies[:2])}
+    assert all(identity[2] == inode for identity in identities)
+    links = [link for c in mock_metadata_store.update_file_identities.call_args_list for link in c.args[1]]
+    assert sorted(links) == [(os.path.normcase(str(path)), os.path.normcase(str(original))) for path in copies[:2]]
+
+
+def test_dedupe_links_are_journaled_and_settled_by_resume(tmp_path, mocker):
+    """
+    Test that a journaled dedupe_link run leaves an empty journal, and that
+    resume() after a crash removes a temporary link left next to a
+    duplicate and records links that were made but never committed.
+    TDD Anchor: [AX_Journal]
+    """
+    mocker.patch('storage_hygiene.file_transfer._reflink', return_value=False)
+    original = tmp_path / "original.bin"
+    original.write_bytes(b"same bytes" * 100)
+    copies = [tmp_path / f"copy{i}.bin" for i in range(4)]
+    for path in copies:
+        path.write_bytes(original.read_bytes())
+    journal_path = tmp_path / "actions.journal"
+    mock_config_manager = mocker.Mock()
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'action_executor.staging_dir': str(tmp_path / "staging"),
+    }.get(key, default)
+    mock_metadata_store = mocker.Mock()
+
+    ActionExecutor(mock_config_manager, mock_metadata_store, journal_path=journal_path).execute_actions(
+        {'dedupe_link': [{'path': str(copies[0]), 'hash': 'h', 'original_path': str(original)}]})
+    assert os.path.samefile(copies[0], original)
+    assert journal_path.read_text() == ""
+
+    # A crash while copy1 was being linked, after copy2 was linked, and after
+    # copy3 was linked but before its 'done' line reached the journal
+    with ActionJournal(journal_path) as journal:
+        journal.record_intent('dedupe_link', str(copies[1]), str(original))
+        journal.record_states([journal.record_intent('dedupe_link', str(copies[2]), str(original))], DONE)
+        journal.record_intent('dedupe_link', str(copies[3]), str(original))
+    temp = tmp_path / ".copy1.bin.4242.link"
+    os.link(original, temp)
+    for path in copies[2:]:
+        path.unlink()
+        os.link(original, path)
+    mock_metadata_store.reset_mock()
+
+    counts = ActionExecutor(mock_config_manager, mock_metadata_store, journal_path=journal_path).resume()
+
+    assert counts == {'rolled_forward': 2, 'rolled_back': 1, 'failed': 0}
+    assert not temp.exists() and copies[1].read_bytes() == original.read_bytes()
+    mock_metadata_store.update_file_identities.assert_called_once()
+    identities, links = mock_metadata_store.update_file_identities.call_args.args
+    assert {identity[0] for identity in identities} == {os.path.normcase(str(path)) for path in (original, *copies[2:])}
+    assert links == [(os.path.normcase(str(path)), os.path.normcase(str(original))) for path in copies[2:]]
+    assert journal_path.read_text() == ""
@@ -0,0 +1,65 @@
+import json
+
+from storage_hygiene.action_journal import DONE, FAILED, INTENT, SYNCED, ActionJournal
+
+
+def test_journal_tracks_open_entries_and_compacts(tmp_path):
+    """
+    Test TDD Anchor: [AJ_Entries]
+    Test that entries stay open until synced or failed, that ids continue
+    across reopenings, and that the journal is emptied only once all are closed.
+    """
+    journal_path = tmp_path / "actions.journal"
+    with ActionJournal(journal_path) as journal:
+        first = journal.record_intent('review_large', '/data/a.bin', '/staging/a.bin')
+        second = journal.record_intent('review_old', '/data/b.bin', '/staging/b.bin')
+        journal.record_states([first], DONE)
+
+        assert [(entry.entry_id, entry.state) for entry in journal.open_entries()] == [(first, DONE), (second, INTENT)]
+        assert journal.compact() is False
+
+    with ActionJournal(journal_path) as journal:
+        third = journal.record_intent('review_old', '/data/c.bin', '/staging/c.bin')
+        assert third > second
+        journal.record_states([first, third], SYNCED)
+        journal.record_states([second], FAILED)
+
+        assert journal.open_entries() == []
+        assert journal.compact() is True
+    assert journal_path.read_text() == ""
+
+
+def test_journal_ignores_torn_last_line(tmp_path):
+    """
+    Test TDD Anchor: [AJ_Replay]
+    Test that a line cut short by a crash is skipped when the journal is replayed.
+    """
+    journal_path = tmp_path / "actions.journal"
+    intent = {'id': 1, 'state': INTENT, 'action': 'review_large', 'source': '/data/a.bin', 'destination': '/staging/a.bin'}
+    journal_path.write_text(json.dumps(intent) + '\n' + '{"id": 1, "sta')
+
+    with ActionJournal(journal_path) as journal:
+        entries = journal.open_entries()
+
+    assert [(entry.entry_id, entry.source, entry.state) for entry in entries] == [(1, '/data/a.bin', INTENT)]
+
+
+def test_journal_appends_after_torn_last_line(tmp_path):
+    """
+    Test TDD Anchor: [AJ_Replay]
+    Test that a journal reopened after a crash mid-write drops the incomplete
+    line, so the next intent is written on a line of its own and kept.
+    """
+    journal_path = tmp_path / "actions.journal"
+    with ActionJournal(journal_path) as journal:
+        journal.record_intent('review_large', '/data/a.bin', '/staging/a.bin')
+    with open(journal_path, 'a') as journal_file:
+        journal_file.write('{"id": 2, "sta')
+
+    with ActionJournal(journal_path) as journal:
+        entry_id = journal.record_intent('review_old', '/data/b.bin', '/staging/b.bin')
+        entries = journal.open_entries()
+
+    assert entry_id == 2
+    assert [(entry.entry_id, entry.source) for entry in entries] == [(1, '/data/a.bin'), (2, '/data/b.bin')]
+    assert all(json.loads(line) for line in journal_path.read_text().splitlines())
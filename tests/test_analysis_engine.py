@@ -2,7 +2,8 @@ import pytest
 from unittest.mock import MagicMock
 from datetime import datetime, timezone, timedelta
 
-from storage_hygiene.analysis_engine import AnalysisEngine
+from storage_hygiene.analysis_engine import AnalysisEngine, ActionCandidate
+from storage_hygiene.metadata_store import RuleMatch
 
 # Mock dependencies
 @pytest.fixture
@@ -77,17 +78,14 @@ def test_analyze_identifies_duplicate_files(mock_config_manager, mock_metadata_s
         {'path': '/another/path/file4.bin', 'hash': 'hash789', 'size': 500, 'last_modified': datetime(2023, 12, 1, 0, 0, 0, tzinfo=timezone.utc)},
         {'path': '/yet/another/file5.bin', 'hash': 'hash789', 'size': 500, 'last_modified': datetime(2023, 12, 15, 0, 0, 0, tzinfo=timezone.utc)},
     ]
-    # Mock the specific query used by the duplicate rule
-    mock_metadata_store.get_duplicates.return_value = {
-        'hash123': [
-            {'path': '/path/to/file1.txt', 'hash': 'hash123', 'size': 100, 'last_modified': datetime(2024, 1, 1, 10, 0, 0, tzinfo=timezone.utc)},
-            {'path': '/path/to/subdir/file3.txt', 'hash': 'hash123', 'size': 100, 'last_modified': datetime(2024, 1, 1, 11, 0, 0, tzinfo=timezone.utc)},
-        ],
-        'hash789': [
-            {'path': '/another/path/file4.bin', 'hash': 'hash789', 'size': 500, 'last_modified': datetime(2023, 12, 1, 0, 0, 0, tzinfo=timezone.utc)},
-            {'path': '/yet/another/file5.bin', 'hash': 'hash789', 'size': 500, 'last_modified': datetime(2023, 12, 15, 0, 0, 0, tzinfo=timezone.utc)},
-        ]
-    }
+    # Mock the single-pass rule query: the store labels every file after the
+    # oldest in its hash group as a duplicate of that oldest file
+    mock_metadata_store.iter_rule_matches.return_value = iter([
+        RuleMatch('/path/to/subdir/file3.txt', 'hash123', 100, datetime(2024, 1, 1, 11, 0, 0, tzinfo=timezone.utc),
+                  '/path/to/file1.txt', True, False, False),
+        RuleMatch('/yet/another/file5.bin', 'hash789', 500, datetime(2023, 12, 15, 0, 0, 0, tzinfo=timezone.utc),
+                  '/another/path/file4.bin', True, False, False),
+    ])
 
 
     engine = AnalysisEngine(mock_config_manager, mock_metadata_store)
@@ -97,8 +95,8 @@ def test_analyze_identifies_duplicate_files(mock_config_manager, mock_metadata_s
     action_candidates = engine.analyze()
 
     # --- Assert ---
-    # Verify metadata store was queried correctly for duplicates
-    mock_metadata_store.get_duplicates.assert_called_once()
+    # Verify one pass was made with only the duplicate rule enabled
+    mock_metadata_store.iter_rule_matches.assert_called_once_with(duplicates=True, size_above=None, modified_before=None)
 
     # Define expected actions (staging the newer file in each duplicate set)
     expected_actions = [
@@ -131,15 +129,11 @@ def test_analyze_identifies_large_files(mock_config_manager, mock_metadata_store
     }
     mock_config_manager.get.return_value = rules
 
-    # Configure metadata store mock to return files of various sizes
-    mock_metadata_store.query_files.return_value = [
-        {'path': '/path/to/small_file.txt', 'hash': 'hash1', 'size_bytes': 10 * 1024 * 1024, 'last_modified': datetime(2024, 1, 1, 10, 0, 0, tzinfo=timezone.utc)},
-        {'path': '/path/to/large_video.mp4', 'hash': 'hash2', 'size_bytes': 150 * 1024 * 1024, 'last_modified': datetime(2024, 1, 2, 11, 0, 0, tzinfo=timezone.utc)},
-        {'path': '/path/to/exact_size_file.iso', 'hash': 'hash3', 'size_bytes': min_size_bytes, 'last_modified': datetime(2024, 1, 3, 12, 0, 0, tzinfo=timezone.utc)}, # Exactly at threshold
-        {'path': '/path/to/another_large.zip', 'hash': 'hash4', 'size_bytes': 60 * 1024 * 1024, 'last_modified': datetime(2024, 1, 4, 13, 0, 0, tzinfo=timezone.utc)}, # Slightly above threshold
+    # The store filters by size in SQL, so the mock returns only the matching rows
+    mock_metadata_store.iter_rule_matches.return_value = [
+        RuleMatch('/path/to/large_video.mp4', 'hash2', 150 * 1024 * 1024, datetime(2024, 1, 2, 11, 0, 0, tzinfo=timezone.utc), None, False, True, False),
+        RuleMatch('/path/to/another_large.zip', 'hash4', 60 * 1024 * 1024, datetime(2024, 1, 4, 13, 0, 0, tzinfo=timezone.utc), None, False, True, False), # Slightly above threshold
     ]
-    # Mock get_duplicates to return empty if called (it shouldn't be)
-    mock_metadata_store.get_duplicates.return_value = {}
 
     engine = AnalysisEngine(mock_config_manager, mock_metadata_store)
     engine.rules = rules # Explicitly set rules
@@ -148,11 +142,10 @@ def test_analyze_identifies_large_files(mock_config_manager, mock_metadata_store
     action_candidates = engine.analyze()
 
     # --- Assert ---
-    # Verify metadata store was queried correctly (expecting a query for all files)
-    # We'll refine this assertion if a more specific query is implemented later
-    mock_metadata_store.query_files.assert_called_once()
-    # Ensure get_duplicates was NOT called as the rule is disabled
-    mock_metadata_store.get_duplicates.assert_not_called()
+    # Verify the size predicate was pushed down to the store (strictly greater than)
+    # and the disabled rules were left out of the single pass
+    mock_metadata_store.iter_rule_matches.assert_called_once_with(duplicates=False, size_above=min_size_bytes, modified_before=None)
+    mock_metadata_store.query_files.assert_not_called()
 
     # Define expected actions (only files strictly larger than the threshold)
     expected_actions = [
@@ -189,16 +182,12 @@ def test_analyze_identifies_old_files(mock_config_manager, mock_metadata_store):
     }
     mock_config_manager.get.return_value = rules
 
-    # Configure metadata store mock to return files with various modification dates
-    mock_metadata_store.query_files.return_value = [
-        {'path': '/path/to/recent_file.txt', 'hash': 'hash_r', 'size': 1024, 'last_modified': now - timedelta(days=30)},
-        {'path': '/path/to/old_doc.pdf', 'hash': 'hash_o1', 'size': 2048, 'last_modified': now - timedelta(days=100)}, # Older than threshold
-        {'path': '/path/to/very_old_archive.zip', 'hash': 'hash_o2', 'size': 512000, 'last_modified': now - timedelta(days=365)}, # Much older
-        {'path': '/path/to/boundary_file.log', 'hash': 'hash_b', 'size': 4096, 'last_modified': threshold_date - timedelta(seconds=1)}, # Just past threshold
-        {'path': '/path/to/not_old_file.py', 'hash': 'hash_n', 'size': 8192, 'last_modified': threshold_date + timedelta(days=1)}, # Newer than threshold
+    # The store filters by date in SQL, so the mock returns only the matching rows
+    mock_metadata_store.iter_rule_matches.return_value = [
+        RuleMatch('/path/to/old_doc.pdf', 'hash_o1', 2048, now - timedelta(days=100), None, False, False, True), # Older than threshold
+        RuleMatch('/path/to/very_old_archive.zip', 'hash_o2', 512000, now - timedelta(days=365), None, False, False, True), # Much older
+        RuleMatch('/path/to/boundary_file.log', 'hash_b', 4096, threshold_date - timedelta(seconds=1), None, False, False, True), # Just past threshold
     ]
-    # Mock get_duplicates to return empty if called (it shouldn't be)
-    mock_metadata_store.get_duplicates.return_value = {}
 
     engine = AnalysisEngine(mock_config_manager, mock_metadata_store)
     engine.rules = rules # Explicitly set rules
@@ -207,16 +196,18 @@ def test_analyze_identifies_old_files(mock_config_manager, mock_metadata_store):
     action_candidates = engine.analyze()
 
     # --- Assert ---
-    # Verify metadata store was queried correctly (expecting a query for all files)
-    mock_metadata_store.query_files.assert_called_once()
-    # Ensure get_duplicates was NOT called
-    mock_metadata_store.get_duplicates.assert_not_called()
+    # Verify the date predicate was pushed down to the store (strictly older than)
+    mock_metadata_store.iter_rule_matches.assert_called_once()
+    query = mock_metadata_store.iter_rule_matches.call_args.kwargs
+    assert query['duplicates'] is False and query['size_above'] is None
+    assert abs((query['modified_before'] - threshold_date).total_seconds()) < 60
+    mock_metadata_store.query_files.assert_not_called()
 
     # Define expected actions (only files older than the threshold date)
     expected_actions = [
-        {'action': 'review_old', 'path': '/path/to/old_doc.pdf', 'last_modified': mock_metadata_store.query_files.return_value[1]['last_modified'], 'reason': f'File older than {max_days} days'},
-        {'action': 'review_old', 'path': '/path/to/very_old_archive.zip', 'last_modified': mock_metadata_store.query_files.return_value[2]['last_modified'], 'reason': f'File older than {max_days} days'},
-        {'action': 'review_old', 'path': '/path/to/boundary_file.log', 'last_modified': mock_metadata_store.query_files.return_value[3]['last_modified'], 'reason': f'File older than {max_days} days'},
+        {'action': 'review_old', 'path': '/path/to/old_doc.pdf', 'last_modified': mock_metadata_store.iter_rule_matches.return_value[0].last_modified, 'reason': f'File older than {max_days} days'},
+        {'action': 'review_old', 'path': '/path/to/very_old_archive.zip', 'last_modified': mock_metadata_store.iter_rule_matches.return_value[1].last_modified, 'reason': f'File older than {max_days} days'},
+        {'action': 'review_old', 'path': '/path/to/boundary_file.log', 'last_modified': mock_metadata_store.iter_rule_matches.return_value[2].last_modified, 'reason': f'File older than {max_days} days'},
     ]
 
     # Check the 'review_old' list within the returned dict
@@ -236,4 +227,233 @@ def test_analyze_identifies_old_files(mock_config_manager, mock_metadata_store):
     expected_actions_set = set(
         tuple(sorted((k, make_comparable(v)) for k, v in d.items())) for d in expected_actions
     )
-    assert action_candidates_set == expected_actions_set
\ No newline at end of file
+    assert action_candidates_set == expected_actions_set
+
+def test_iter_candidates_streams_lazily(mock_config_manager, mock_metadata_store):
+    """
+    Test TDD Anchor: [AE_Stream]
+    Test that iter_candidates pulls records from the store only as candidates
+    are consumed, rather than materializing the whole result first.
+    """
+    rules = {
+        'duplicate_files': {'enabled': False},
+        'large_files': {'enabled': True, 'min_size_mb': 1},
+        'old_files': {'enabled': False}
+    }
+    mock_config_manager.get.return_value = rules
+    pulled = []
+
+    def record_stream(**kwargs):
+        for i in range(1000):
+            pulled.append(i)
+            yield RuleMatch(f'/big/{i}', None, 2 * 1024 * 1024, None, None, False, True, False)
+
+    mock_metadata_store.iter_rule_matches.side_effect = record_stream
+
+    engine = AnalysisEngine(mock_config_manager, mock_metadata_store)
+    candidates = engine.iter_candidates()
+    first = next(candidates)
+
+    assert first['action'] == 'review_large'
+    assert first['path'] == '/big/0'
+    assert pulled == [0]
+
+
+def test_action_candidate_is_compact_mapping():
+    """
+    Test TDD Anchor: [AE_Candidate]
+    Test that ActionCandidate reads like the dict it replaces, carries no
+    per-instance __dict__, and formats its reason on access.
+    """
+    candidate = ActionCandidate('review_large', '/big.iso', size=150 * 1024 * 1024, threshold=50)
+
+    assert dict(candidate) == {
+        'action': 'review_large', 'path': '/big.iso', 'size': 150 * 1024 * 1024,
+        'reason': 'File size (150.0 MB) exceeds threshold (50 MB)',
+    }
+    assert candidate.get('hash') is None # Not a key for this action
+    with pytest.raises(KeyError):
+        candidate['original_path']
+    assert not hasattr(candidate, '__dict__')
+
+    duplicate = ActionCandidate('stage_duplicate', '/b', hash='h', original_path='/a')
+    assert duplicate == {'action': 'stage_duplicate', 'path': '/b', 'hash': 'h',
+                         'original_path': '/a', 'reason': 'Duplicate of /a'}
+
+
+@pytest.mark.parametrize("batch_size", [2, 3, 1000])
+def test_vectorized_mode_matches_row_mode(tmp_path, batch_size):
+    """
+    Test TDD Anchor: [AE_Vectorized]
+    Test that analysis.mode 'arrow' produces the same candidates as row-by-row
+    analysis, including duplicate groups that span record batches.
+    """
+    pytest.importorskip("pyarrow")
+    from storage_hygiene.analysis_engine import CandidateBatch
+    from storage_hygiene.metadata_store import MetadataStore
+
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=400)
+    records = []
+    for i in range(10):
+        records.append({
+            'path': f'/v/file{i}', 'filename': f'file{i}',
+            'size_bytes': (200 if i % 4 == 0 else 1) * 1024 * 1024,
+            'last_modified': old - timedelta(hours=i) if i % 3 == 0 else now - timedelta(minutes=i),
+            'hash': f'h{i % 3}' if i < 9 else 'unique', 'last_scanned': now,
+        })
+    rules = {
+        'duplicate_files': {'enabled': True},
+        'large_files': {'enabled': True, 'min_size_mb': 100},
+        'old_files': {'enabled': True, 'max_days': 365},
+    }
+    config = MagicMock()
+
+    with MetadataStore(db_path=tmp_path / "vectorized.db") as store:
+        store.upsert_file_records(records)
+        original_batches = store.iter_rule_match_batches
+        store.iter_rule_match_batches = lambda **query: original_batches(batch_size=batch_size, **query)
+
+        config.get.side_effect = lambda key, default=None: {'analysis.rules': rules}.get(key, default)
+        row_results = AnalysisEngine(config, store).analyze()
+
+        config.get.side_effect = lambda key, default=None: {'analysis.rules': rules, 'analysis.mode': 'arrow'}.get(key, default)
+        engine = AnalysisEngine(config, store)
+        batches = list(engine.iter_candidate_batches())
+        arrow_results = engine.analyze()
+
+    assert batches and all(isinstance(batch, CandidateBatch) for batch in batches)
+    # analyze() keeps one columnar batch per action rather than a list of candidates
+    assert all(isinstance(candidates, CandidateBatch) for candidates in arrow_results.values())
+    assert {action: len(c) for action, c in arrow_results.items()} == {action: len(c) for action, c in row_results.items()}
+    assert set(row_results) == {'stage_duplicate', 'review_large', 'review_old'}
+    for action, candidates in row_results.items():
+        assert sorted(dict(c).items() for c in arrow_results[action]) == sorted(dict(c).items() for c in candidates)
+    assert len(row_results['stage_duplicate']) == 6
+
+
+def test_single_pass_fans_out_files_matching_several_rules(tmp_path, mocker):
+    """
+    Test TDD Anchor: [AE_SinglePass]
+    Test that all enabled rules run as one store query, and a file matching
+    several rules yields one candidate per rule.
+    """
+    from storage_hygiene.metadata_store import MetadataStore
+
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=1000)
+    big = 500 * 1024 * 1024
+    records = [
+        {'path': '/s/original', 'filename': 'original', 'size_bytes': 10, 'last_modified': old - timedelta(days=1),
+         'hash': 'h', 'last_scanned': now},
+        # Duplicate of /s/original that is also large and old
+        {'path': '/s/copy', 'filename': 'copy', 'size_bytes': big, 'last_modified': old,
+         'hash': 'h', 'last_scanned': now},
+        {'path': '/s/fresh', 'filename': 'fresh', 'size_bytes': 10, 'last_modified': now,
+         'hash': 'other', 'last_scanned': now},
+    ]
+    rules = {
+        'duplicate_files': {'enabled': True},
+        'large_files': {'enabled': True, 'min_size_mb': 100},
+        'old_files': {'enabled': True, 'max_days': 365},
+    }
+    config = MagicMock()
+    config.get.side_effect = lambda key, default=None: {'analysis.rules': rules}.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "single_pass.db") as store:
+        store.upsert_file_records(records)
+        single_pass = mocker.spy(store, 'iter_rule_matches')
+        other_queries = [mocker.spy(store, name) for name in ('iter_files', 'iter_duplicate_groups', 'query_files')]
+
+        results = AnalysisEngine(config, store).analyze()
+
+    single_pass.assert_called_once()
+    assert all(spy.call_count == 0 for spy in other_queries)
+    assert [c['path'] for c in results['stage_duplicate']] == ['/s/copy']
+    assert results['stage_duplicate'][0]['original_path'] == '/s/original'
+    assert [c['path'] for c in results['review_large']] == ['/s/copy']
+    assert sorted(c['path'] for c in results['review_old']) == ['/s/copy', '/s/original']
+
+
+def test_incremental_mode_reads_persisted_results(tmp_path, mocker):
+    """
+    Test TDD Anchor: [AE_Incremental]
+    Test that analysis.incremental refreshes the store's persisted results and
+    builds candidates from them, matching a full evaluation.
+    """
+    from storage_hygiene.metadata_store import MetadataStore
+
+    now = datetime.now(timezone.utc)
+    records = [
+        {'path': '/i/a', 'filename': 'a', 'size_bytes': 10, 'last_modified': now - timedelta(days=2),
+         'hash': 'h', 'last_scanned': now},
+        {'path': '/i/b', 'filename': 'b', 'size_bytes': 500 * 1024 * 1024, 'last_modified': now,
+         'hash': 'h', 'last_scanned': now},
+    ]
+    rules = {'duplicate_files': {'enabled': True}, 'large_files': {'enabled': True, 'min_size_mb': 100}}
+    config = MagicMock()
+
+    with MetadataStore(db_path=tmp_path / "incremental.db") as store:
+        store.upsert_file_records(records)
+        config.get.side_effect = lambda key, default=None: {'analysis.rules': rules}.get(key, default)
+        full_results = AnalysisEngine(config, store).analyze()
+
+        config.get.side_effect = lambda key, default=None: {'analysis.rules': rules,
+                                                            'analysis.incremental': True}.get(key, default)
+        refresh = mocker.spy(store, 'refresh_analysis_results')
+        full_pass = mocker.spy(store, 'iter_rule_matches')
+        incremental_results = AnalysisEngine(config, store).analyze()
+
+    refresh.assert_called_once_with(duplicates=True, size_above=100 * 1024 * 1024, modified_before=None)
+    assert full_pass.call_count == 0
+    assert {a: [dict(c) for c in cs] for a, cs in incremental_results.items()} == \
+           {a: [dict(c) for c in cs] for a, cs in full_results.items()}
+
+
+@pytest.mark.parametrize("mode", ['rows', 'arrow'])
+def test_duplicate_rule_action_selects_dedupe_link(tmp_path, mode):
+    """
+    Test TDD Anchor: [AE_DedupeLink]
+    Test that the duplicate_files rule's 'action' turns its candidates into
+    'dedupe_link' actions carrying the original, and that an unknown action
+    falls back to 'stage_duplicate'.
+    """
+    pytest.importorskip("pyarrow")
+    from storage_hygiene.metadata_store import MetadataStore
+
+    now = datetime.now(timezone.utc)
+    records = [
+        {'path': f'/d/{name}', 'filename': name, 'size_bytes': 10, 'last_modified': now - timedelta(days=age),
+         'hash': 'h', 'last_scanned': now}
+        for name, age in (('original', 2), ('copy', 1))
+    ]
+    config = MagicMock()
+
+    with MetadataStore(db_path=tmp_path / "dedupe.db") as store:
+        store.upsert_file_records(records)
+        for action, expected in (('dedupe_link', 'dedupe_link'), ('shred', 'stage_duplicate')):
+            rules = {'duplicate_files': {'enabled': True, 'action': action}}
+            config.get.side_effect = lambda key, default=None: {'analysis.rules': rules,
+                                                                'analysis.mode': mode}.get(key, default)
+            results = AnalysisEngine(config, store).analyze()
+
+            assert {a: [dict(c) for c in cs] for a, cs in results.items()} == {expected: [
+                {'action': expected, 'path': '/d/copy', 'hash': 'h', 'original_path': '/d/original',
+                 'reason': 'Duplicate of /d/original'},
+            ]}
+
+
+def test_iter_duplicate_groups_follows_duplicate_rule(mock_config_manager, mock_metadata_store):
+    """
+    Test TDD Anchor: [AE_DuplicateGroups]
+    Test that duplicate group summaries come from the store's precomputed
+    groups, and only while the duplicate_files rule is enabled.
+    """
+    mock_metadata_store.iter_duplicate_group_summaries.return_value = iter(['group'])
+
+    mock_config_manager.get.return_value = {'duplicate_files': {'enabled': False}}
+    assert list(AnalysisEngine(mock_config_manager, mock_metadata_store).iter_duplicate_groups()) == []
+    mock_metadata_store.iter_duplicate_group_summaries.assert_not_called()
+
+    mock_config_manager.get.return_value = {'duplicate_files': {'enabled': True}}
+    assert list(AnalysisEngine(mock_config_manager, mock_metadata_store).iter_duplicate_groups()) == ['group']
@@ -0,0 +1,61 @@
+import random
+import pytest
+
+from storage_hygiene import chunking
+from storage_hygiene.chunking import ContentChunker
+
+
+def _chunk(data: bytes, block_size: int, avg_size: int = 4096, **sizes):
+    chunker = ContentChunker(avg_size, **sizes)
+    view = memoryview(data)
+    for offset in range(0, len(data), block_size):
+        chunker.update(view[offset:offset + block_size])
+    return chunker.finish()
+
+
+@pytest.mark.parametrize("block_size", [1, 1000, 4096, 1 << 20])
+def test_chunks_cover_the_file_and_ignore_read_block_size(block_size):
+    """Test that chunks tile the input within the size bounds, whatever the read block size."""
+    data = random.Random(0).randbytes(200 * 1024)
+    chunks = _chunk(data, block_size)
+
+    assert chunks == _chunk(data, 64 * 1024)
+    assert [offset for offset, _, _ in chunks] == [sum(c[1] for c in chunks[:i]) for i in range(len(chunks))]
+    assert sum(length for _, length, _ in chunks) == len(data)
+    assert all(1024 <= length <= 32 * 1024 for _, length, _ in chunks[:-1])
+
+
+def test_insertion_only_changes_nearby_chunks():
+    """Test that inserting bytes near the start leaves the later chunks unchanged."""
+    data = random.Random(1).randbytes(200 * 1024)
+    edited = data[:5000] + b"inserted bytes" + data[5000:]
+
+    original = {digest for _, _, digest in _chunk(data, 8192)}
+    shifted = {digest for _, _, digest in _chunk(edited, 8192)}
+
+    assert len(original - shifted) <= 2
+    assert len(original & shifted) >= len(original) - 2
+
+
+def test_empty_and_tiny_inputs():
+    """Test that empty input has no chunks and a tiny file is a single chunk."""
+    assert _chunk(b"", 10) == []
+    assert [(offset, length) for offset, length, _ in _chunk(b"tiny", 10)] == [(0, 4)]
+    with pytest.raises(ValueError):
+        ContentChunker(avg_size=16)
+
+
+@pytest.mark.parametrize("sizes", [{}, {'avg_size': 256}, {'min_size': 0}, {'min_size': 10, 'max_size': 70}])
+@pytest.mark.parametrize("block_size", [1500, 5000, 1 << 20])
+def test_vectorized_cut_points_match_byte_by_byte_rolling(monkeypatch, sizes, block_size):
+    """
+    Test that the numpy cut point search finds the same chunks as the pure
+    Python loop, including a short last block that is rolled byte by byte.
+    """
+    pytest.importorskip("numpy")
+    data = random.Random(2).randbytes(64 * 1024) + bytes(16 * 1024)
+
+    vectorized = _chunk(data, block_size, **sizes)
+    monkeypatch.setattr(chunking, "np", None)
+
+    assert vectorized == _chunk(data, block_size, **sizes)
@@ -0,0 +1,185 @@
+import errno
+import os
+
+import pytest
+
+from storage_hygiene import file_transfer
+from storage_hygiene.file_transfer import DuplicateChangedError, copy_file, link_duplicate, move_file
+
+
+def _exdev(*args):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(os.urandom(300 * 1024))
+    os.chmod(path, 0o640)
+    os.utime(path, ns=(1_600_000_000_123_456_789, 1_600_000_000_987_654_321))
+    return path
+
+
+def test_move_within_filesystem_renames(source_file, tmp_path):
+    """
+    Test TDD Anchor: [FT_Move]
+    Test that a move within one filesystem is a rename that keeps the inode.
+    """
+    inode = source_file.stat().st_ino
+    destination = tmp_path / "moved.bin"
+
+    assert move_file(str(source_file), destination) == 'rename'
+
+    assert not source_file.exists()
+    assert destination.stat().st_ino == inode
+
+
+def test_cross_device_move_copies_without_python_buffers(source_file, tmp_path, mocker):
+    """
+    Test TDD Anchor: [FT_Move]
+    Test that when rename fails with EXDEV the file is copied by the kernel,
+    keeping content, permissions and nanosecond mtime, and the source is removed.
+    """
+    content = source_file.read_bytes()
+    stat = source_file.stat()
+    mocker.patch.object(file_transfer.os, 'rename', side_effect=_exdev)
+    copyfileobj = mocker.spy(file_transfer.shutil, 'copyfileobj')
+    destination = tmp_path / "copied.bin"
+
+    method = move_file(str(source_file), destination)
+
+    assert method in {'reflink', 'copy_file_range', 'sendfile'}
+    copyfileobj.assert_not_called()
+    assert not source_file.exists()
+    assert destination.read_bytes() == content
+    assert destination.stat().st_mode == stat.st_mode
+    assert destination.stat().st_mtime_ns == stat.st_mtime_ns
+
+
+@pytest.mark.parametrize("unsupported, expected", [
+    ({'reflink'}, 'copy_file_range'),
+    ({'reflink', 'copy_file_range'}, 'sendfile'),
+    ({'reflink', 'copy_file_range', 'sendfile'}, 'copy'),
+])
+def test_copy_file_falls_back_to_the_next_method(source_file, tmp_path, mocker, unsupported, expected):
+    """
+    Test TDD Anchor: [FT_Copy]
+    Test that each method reporting itself unsupported falls through to the next one.
+    """
+    if 'reflink' in unsupported:
+        mocker.patch.object(file_transfer, '_reflink', return_value=False)
+    for name in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, name):
+            pytest.skip(f"os.{name} is not available")
+        if name in unsupported:
+            mocker.patch.object(file_transfer.os, name, side_effect=OSError(errno.ENOSYS, "Not supported"))
+    destination = tmp_path / "copied.bin"
+
+    assert copy_file(str(source_file), str(destination)) == expected
+    assert destination.read_bytes() == source_file.read_bytes()
+
+
+def test_copy_file_never_replaces_and_cleans_up(source_file, tmp_path, mocker):
+    """
+    Test TDD Anchor: [FT_Copy]
+    Test that an existing destination is never replaced, and that a copy
+    failing midway leaves no partial destination.
+    """
+    existing = tmp_path / "existing.bin"
+    existing.write_bytes(b"keep me")
+    with pytest.raises(FileExistsError):
+        copy_file(str(source_file), str(existing))
+    assert existing.read_bytes() == b"keep me"
+
+    mocker.patch.object(file_transfer, '_reflink', return_value=False)
+    mocker.patch.object(file_transfer, '_zero_copy', side_effect=OSError(errno.EIO, "I/O error"))
+    destination = tmp_path / "partial.bin"
+    with pytest.raises(OSError, match="I/O error"):
+        copy_file(str(source_file), str(destination))
+    assert not destination.exists()
+    assert source_file.exists()
+
+
+def test_hardlink_strategy_links_then_unlinks(source_file, tmp_path, mocker):
+    """
+    Test TDD Anchor: [FT_Hardlink]
+    Test that the hardlink strategy keeps the inode and refuses to replace an
+    existing destination, and falls back to a rename where links fail.
+    """
+    inode = source_file.stat().st_ino
+    existing = tmp_path / "existing.bin"
+    existing.write_bytes(b"keep me")
+    with pytest.raises(FileExistsError):
+        move_file(str(source_file), existing, 'hardlink')
+    assert source_file.exists() and existing.read_bytes() == b"keep me"
+
+    assert move_file(str(source_file), tmp_path / "linked.bin", 'hardlink') == 'hardlink'
+    assert not source_file.exists()
+    assert (tmp_path / "linked.bin").stat().st_ino == inode
+
+    mocker.patch.object(file_transfer.os, 'link', side_effect=OSError(errno.EPERM, "Operation not permitted"))
+    assert move_file(str(tmp_path / "linked.bin"), tmp_path / "renamed.bin", 'hardlink') == 'rename'
+
+    with pytest.raises(ValueError, match="Unknown staging strategy"):
+        move_file(str(tmp_path / "renamed.bin"), tmp_path / "other.bin", 'teleport')
+
+
+def _fake_reflink(src_fd, dst_fd):
+    """Stands in for FICLONE where the test filesystem has no reflinks: copies the data."""
+    os.sendfile(dst_fd, src_fd, 0, os.fstat(src_fd).st_size)
+    return True
+
+
+def test_link_duplicate_reflink_keeps_the_duplicates_metadata(source_file, tmp_path, mocker):
+    """
+    Test TDD Anchor: [FT_Link]
+    Test that a reflinked duplicate is a new file with the original's content
+    and the duplicate's own permissions and nanosecond timestamps.
+    """
+    duplicate = tmp_path / "duplicate.bin"
+    duplicate.write_bytes(source_file.read_bytes())
+    os.chmod(duplicate, 0o600)
+    os.utime(duplicate, ns=(1_650_000_000_000_000_001, 1_650_000_000_000_000_002))
+    inode = duplicate.stat().st_ino
+    mocker.patch.object(file_transfer, '_reflink', side_effect=_fake_reflink)
+
+    assert link_duplicate(str(source_file), str(duplicate)) == 'reflink'
+
+    assert duplicate.read_bytes() == source_file.read_bytes()
+    assert duplicate.stat().st_ino not in {inode, source_file.stat().st_ino}
+    assert oct(duplicate.stat().st_mode & 0o777) == oct(0o600)
+    assert duplicate.stat().st_mtime_ns == 1_650_000_000_000_000_002
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["duplicate.bin", "source.bin"]
+
+
+def test_link_duplicate_hardlinks_only_identical_files_with_same_permissions(source_file, tmp_path, mocker):
+    """
+    Test TDD Anchor: [FT_Link]
+    Test that without reflinks a duplicate becomes a hardlink of the original,
+    that files whose content differs are never linked, and that a hardlink
+    is refused when it would change the duplicate's permissions.
+    """
+    mocker.patch.object(file_transfer, '_reflink', return_value=False)
+    duplicate = tmp_path / "duplicate.bin"
+    content = bytearray(source_file.read_bytes())
+    content[-1] ^= 0xFF
+    duplicate.write_bytes(content)
+    os.chmod(duplicate, 0o640)
+
+    with pytest.raises(DuplicateChangedError):
+        link_duplicate(str(source_file), str(duplicate))
+    assert duplicate.read_bytes() == content
+
+    duplicate.write_bytes(source_file.read_bytes())
+    os.chmod(duplicate, 0o644)
+    assert link_duplicate(str(source_file), str(duplicate)) is None
+    assert link_duplicate(str(source_file), str(duplicate), 'reflink') is None
+
+    os.chmod(duplicate, 0o640)
+    assert link_duplicate(str(source_file), str(duplicate)) == 'hardlink'
+    assert duplicate.stat().st_ino == source_file.stat().st_ino
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["duplicate.bin", "source.bin"]
+
+    with pytest.raises(ValueError, match="Unknown link method"):
+        link_duplicate(str(source_file), str(duplicate), 'symlink')
+
@@ -0,0 +1,28 @@
+import hashlib
+import pytest
+
+from storage_hygiene.hashing import DEFAULT_HASH_ALGORITHM, available_algorithms, new_hasher
+
+
+def test_builtin_algorithms_always_available():
+    """Test that the hashlib-backed algorithms are always offered."""
+    assert DEFAULT_HASH_ALGORITHM == 'sha256'
+    assert {'sha256', 'blake2b'} <= set(available_algorithms())
+
+
+@pytest.mark.parametrize("algorithm, reference", [
+    ('sha256', hashlib.sha256),
+    ('blake2b', hashlib.blake2b),
+])
+def test_new_hasher_matches_hashlib(algorithm, reference):
+    """Test that new_hasher returns a hasher producing the hashlib digest."""
+    hasher = new_hasher(algorithm)
+    hasher.update(b"some ")
+    hasher.update(b"content")
+    assert hasher.hexdigest() == reference(b"some content").hexdigest()
+
+
+def test_new_hasher_rejects_unknown_algorithm():
+    """Test that an unknown algorithm name raises ValueError."""
+    with pytest.raises(ValueError, match="Unsupported hash algorithm 'md4'"):
+        new_hasher('md4')
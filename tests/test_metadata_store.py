@@ -1,4 +1,4 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import pytest
 import os
 import duckdb
@@ -69,6 +69,12 @@ def test_initialize_schema(tmp_path):
                 'last_modified': 'TIMESTAMP WITH TIME ZONE',
                 'hash': 'VARCHAR',          # Assuming SHA-256 hex digest
                 'last_scanned': 'TIMESTAMP WITH TIME ZONE',
+                'hash_algorithm': 'VARCHAR',  # Algorithm that produced 'hash'
+                'change_seq': 'BIGINT',  # Sequence value of the last write, for incremental analysis
+                'device': 'UBIGINT',  # st_dev, st_ino and st_mtime_ns, for hash reuse across renames
+                'inode': 'UBIGINT',
+                'mtime_ns': 'BIGINT',
+                'ctime_ns': 'BIGINT',  # st_ctime_ns, for nanosecond change detection
                 # Add other columns from pseudocode/ADR if necessary
                 # 'creation_time': 'TIMESTAMP',
                 # 'last_access_time': 'TIMESTAMP',
@@ -328,4 +334,572 @@ def test_query_files_multiple_criteria(tmp_path):
 
         # --- Assertions ---
         assert isinstance(results_no_match, list)
-        assert len(results_no_match) == 0, "Should find no records for non-matching criteria."
\ No newline at end of file
+        assert len(results_no_match) == 0, "Should find no records for non-matching criteria."
+
+@pytest.mark.parametrize("use_arrow", [True, False])
+def test_upsert_file_records_bulk(tmp_path, monkeypatch, use_arrow):
+    """
+    Test that upsert_file_records inserts and replaces many records in one call,
+    both through Arrow ingestion and the multi-row VALUES fallback.
+    """
+    from storage_hygiene import metadata_store as metadata_store_module
+    if use_arrow:
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(metadata_store_module, "pa", None)
+
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    records = [
+        {'path': f'/bulk/file{i}.txt', 'filename': f'file{i}.txt', 'size_bytes': i,
+         'last_modified': now, 'hash': f'hash{i}', 'last_scanned': now}
+        for i in range(25)
+    ]
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_record({**records[0], 'hash': 'stale'})
+
+        written = store.upsert_file_records(records, batch_size=10)
+        # A later record for the same path in one batch replaces the earlier one
+        store.upsert_file_records([{**records[1], 'size_bytes': 7}, {**records[1], 'size_bytes': 99}])
+
+        assert written == 25
+        rows = {r['path']: r for r in store.query_files(criteria={})}
+        assert len(rows) == 25
+        assert rows['/bulk/file0.txt']['hash'] == 'hash0'
+        assert rows['/bulk/file1.txt']['size_bytes'] == 99
+        assert abs(rows['/bulk/file3.txt']['last_modified'] - now).total_seconds() < 1
+
+
+@pytest.mark.parametrize("use_arrow", [True, False])
+def test_update_file_paths_applies_renames_in_one_transaction(tmp_path, monkeypatch, use_arrow):
+    """
+    Test that update_file_paths renames many records, their chunks and
+    perceptual hashes, and the duplicate group originals through one temp-table
+    join, skips unknown paths, and leaves everything unchanged if it fails.
+    A record already stored at a destination is replaced by the moved one,
+    and replaying a move that was already applied keeps the moved record.
+    """
+    from storage_hygiene import metadata_store as metadata_store_module
+    if use_arrow:
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(metadata_store_module, "pa", None)
+
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    records = [
+        {'path': f'/src/file{i}.txt', 'filename': f'file{i}.txt', 'size_bytes': 10,
+         'last_modified': now - timedelta(days=i), 'hash': f'hash{i % 2}', 'last_scanned': now}
+        for i in range(1, 2500)
+    ]
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records(records)
+        store.replace_file_chunks({'/src/file1.txt': [(0, 10, 'x')]})
+        store.replace_perceptual_hashes({'/src/file2.txt': 7}, 'dhash')
+        pairs = [(f'/src/file{i}.txt', f'/staged/{i}/file{i}.txt') for i in range(1, 2500, 2)]
+
+        assert store.update_file_paths(pairs + [('/src/missing.txt', '/staged/missing.txt')]) == len(pairs)
+
+        rows = {r['path']: r['filename'] for r in store.query_files(criteria={})}
+        assert len(rows) == len(records)
+        assert rows['/staged/1/file1.txt'] == 'file1.txt' and '/src/file1.txt' not in rows
+        assert '/src/file2.txt' in rows
+        assert store.conn.execute("SELECT path FROM chunks;").fetchall() == [('/staged/1/file1.txt',)]
+        assert store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall() == [('/src/file2.txt',)]
+        # The oldest file of the odd group moved, so the group's original follows it
+        originals = {g.hash: g.original_path for g in store.iter_duplicate_group_summaries()}
+        assert originals == {'hash1': '/staged/2499/file2499.txt', 'hash0': '/src/file2498.txt'}
+
+        with pytest.raises(duckdb.ConstraintException):
+            store.update_file_paths([('/src/file2.txt', '/dup.txt'), ('/src/file4.txt', '/dup.txt')])
+        assert store.query_files(criteria={'path': '/src/file2.txt'})
+        assert store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall() == [('/src/file2.txt',)]
+
+        # One destination still holds a stale record; the rest of the batch applies with it
+        store.replace_file_chunks({'/src/file4.txt': [(0, 10, 'y')]})
+        assert store.update_file_paths([('/src/file2.txt', '/src/file4.txt'),
+                                        ('/src/file6.txt', '/staged/6/file6.txt')]) == 2
+        rows = {r['path']: r for r in store.query_files(criteria={})}
+        assert len(rows) == len(records) - 1
+        assert '/src/file2.txt' not in rows and rows['/src/file4.txt']['last_modified'] == now - timedelta(days=2)
+        assert '/staged/6/file6.txt' in rows
+        assert store.conn.execute("SELECT path FROM chunks ORDER BY path;").fetchall() == [('/staged/1/file1.txt',)]
+        assert store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall() == [('/src/file4.txt',)]
+        assert sum(g.file_count for g in store.iter_duplicate_group_summaries()) == len(records) - 1
+
+        # Replaying moves that were already applied keeps the moved records
+        assert store.update_file_paths([('/src/file2.txt', '/src/file4.txt'),
+                                        ('/src/file6.txt', '/staged/6/file6.txt')]) == 0
+        rows = {r['path']: r for r in store.query_files(criteria={})}
+        assert len(rows) == len(records) - 1
+        assert '/src/file4.txt' in rows and '/staged/6/file6.txt' in rows
+        assert store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall() == [('/src/file4.txt',)]
+
+
+def test_upsert_file_records_rolls_back_on_invalid_record(tmp_path):
+    """Test that a record with missing keys aborts the whole bulk upsert."""
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    good = {'path': '/bulk/good.txt', 'filename': 'good.txt', 'size_bytes': 1,
+            'last_modified': now, 'hash': 'h', 'last_scanned': now}
+
+    with MetadataStore(db_path=db_file) as store:
+        with pytest.raises(ValueError, match="Missing required keys"):
+            store.upsert_file_records([good, {'path': '/bulk/bad.txt'}], batch_size=1)
+        assert store.query_files(criteria={}) == []
+
+
+def test_iter_files_and_duplicate_groups_stream_in_batches(tmp_path):
+    """
+    Test that the streaming iterators yield the same rows as the list queries
+    when batches split rows and duplicate groups.
+    TDD Anchor: [MS_Query_Stream]
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    records = []
+    for i in range(25):
+        # Groups of three files share a hash; the last file is unique
+        records.append({
+            'path': f'/s/file{i:02d}', 'filename': f'file{i:02d}', 'size_bytes': i,
+            'last_modified': now, 'hash': f'h{i // 3}' if i < 24 else 'unique',
+            'last_scanned': now,
+        })
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records(records)
+
+        streamed = list(store.iter_files(batch_size=4))
+        assert len(streamed) == 25
+        assert {r.path for r in streamed} == {r['path'] for r in records}
+
+        filtered = list(store.iter_files(criteria={'hash': 'h1'}, conditions=[('size_bytes', '>', 3)], batch_size=1))
+        assert [r.path for r in filtered] == ['/s/file04', '/s/file05']
+
+        # Invalid filters yield nothing rather than the whole table
+        assert list(store.iter_files(criteria={'bogus': 1})) == []
+
+        groups = list(store.iter_duplicate_groups(batch_size=2))
+        assert len(groups) == 8
+        assert all(len(files) == 3 for _, files in groups)
+        assert [h for h, _ in groups] == sorted(f'h{i}' for i in range(8))
+        assert {h: [r._asdict() for r in files] for h, files in groups} == store.get_duplicates()
+
+
+def test_memory_limit_is_applied(tmp_path):
+    """
+    Test that an optional memory limit is passed through to DuckDB.
+    TDD Anchor: [MS_Init]
+    """
+    with MetadataStore(db_path=tmp_path / "limited.db", memory_limit='256MB') as store:
+        limit = store.conn.execute("SELECT current_setting('memory_limit')").fetchone()[0]
+    assert limit.startswith('244')  # DuckDB reports 256MB as 244.1 MiB
+
+
+def test_get_scan_index_returns_records_under_prefix(tmp_path):
+    """Test that get_scan_index loads (size, mtime_ns, ctime_ns) for paths under the prefix only."""
+    db_file = tmp_path / "test_metadata.db"
+    modified = datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+    now = datetime.now(timezone.utc)
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([
+            {'path': '/scan/root/a.txt', 'filename': 'a.txt', 'size_bytes': 10,
+             'last_modified': modified, 'hash': 'h1', 'last_scanned': now},
+            {'path': '/scan/root/sub/b.txt', 'filename': 'b.txt', 'size_bytes': 20,
+             'last_modified': modified, 'hash': 'h2', 'last_scanned': now,
+             'mtime_ns': 1_714_564_800_123_456_789, 'ctime_ns': 1_714_564_801_000_000_001},
+            {'path': '/other/c.txt', 'filename': 'c.txt', 'size_bytes': 30,
+             'last_modified': modified, 'hash': 'h3', 'last_scanned': now},
+        ])
+
+        index = store.get_scan_index('/scan/root')
+
+        assert set(index) == {'/scan/root/a.txt', '/scan/root/sub/b.txt'}
+        assert index['/scan/root/sub/b.txt'] == (20, 1_714_564_800_123_456_789, 1_714_564_801_000_000_001, 'sha256')
+        assert index['/scan/root/a.txt'] == (10, None, None, 'sha256') # Written without nanosecond stamps
+
+
+def test_size_collision_groups_and_update_file_hashes(tmp_path):
+    """
+    Test that get_size_collision_groups returns only same-size groups with an
+    unhashed member, optionally limited to given sizes, and that
+    update_file_hashes fills those hashes in.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+
+    def record(path, size, hash_value):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': size,
+                'last_modified': now, 'hash': hash_value, 'last_scanned': now}
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([
+            record('/c/a', 100, None),
+            record('/c/b', 100, 'known'),
+            record('/c/unique', 200, None),
+            record('/c/hashed1', 300, 'h1'),
+            record('/c/hashed2', 300, 'h2'),
+        ])
+
+        groups = store.get_size_collision_groups()
+        assert groups == {100: [('/c/a', None), ('/c/b', 'known')]}
+        assert store.get_size_collision_groups(sizes=[100, 200]) == groups
+        assert store.get_size_collision_groups(sizes=[200, 300]) == {}
+        assert store.get_size_collision_groups(sizes=[]) == {}
+
+        assert store.update_file_hashes([('/c/a', 'known')]) == 1
+        assert store.get_size_collision_groups() == {}
+        assert [r['path'] for r in store.get_duplicates()['known']] == ['/c/a', '/c/b']
+
+
+
+def test_update_file_identities_refreshes_inode_and_timestamps(tmp_path):
+    """
+    Test TDD Anchor: [MS_Identities]
+    Test that update_file_identities rewrites device, inode and timestamps of
+    existing records, including last_modified, and leaves the hash alone.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_record({'path': '/l/dup', 'filename': 'dup', 'size_bytes': 10, 'last_modified': now,
+                                  'hash': 'h', 'last_scanned': now, 'device': 1, 'inode': 2,
+                                  'mtime_ns': 3, 'ctime_ns': 4})
+
+        assert store.update_file_identities([('/l/dup', 5, 6, 7, 8),
+                                             ('/l/dup', 2**63 + 1, 99, 1_600_000_000_500_000_000, 1_700_000_000_000_000_001),
+                                             ('/l/missing', 1, 1, 1, 1)]) == 2
+
+        row = store.conn.execute("SELECT device, inode, mtime_ns, ctime_ns, last_modified, hash FROM files;").fetchone()
+        assert row[:4] == (2**63 + 1, 99, 1_600_000_000_500_000_000, 1_700_000_000_000_000_001)
+        assert row[4] == datetime(2020, 9, 13, 12, 26, 40, 500000, tzinfo=timezone.utc)
+        assert row[5] == 'h'
+
+
+def test_linked_duplicates_are_skipped_until_they_change(tmp_path):
+    """
+    Test TDD Anchor: [MS_LinkedFiles]
+    Test that a duplicate recorded as linked to its original is no longer
+    matched, stays out of the original's place after taking its timestamps,
+    and is matched again once the file changes. Deleting or renaming the
+    record drops its link record.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    linked_at = datetime(2020, 9, 13, 12, 26, 40, tzinfo=timezone.utc)
+    mtime_ns = 1_600_000_000_000_000_000
+
+    def record(path, last_modified, inode, file_mtime_ns):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': 10, 'last_modified': last_modified,
+                'hash': 'h', 'last_scanned': linked_at, 'device': 1, 'inode': inode,
+                'mtime_ns': file_mtime_ns, 'ctime_ns': file_mtime_ns}
+
+    def duplicates(store):
+        return [(m.path, m.original_path) for m in store.iter_rule_matches(duplicates=True)]
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([record('/z/original', linked_at, 1, mtime_ns),
+                                   record('/a/copy', linked_at + timedelta(days=1), 2, mtime_ns + 1)])
+        assert duplicates(store) == [('/a/copy', '/z/original')]
+        assert store.refresh_analysis_results(duplicates=True)['mode'] == 'full'
+
+        # A hardlink: the copy shares the original's inode and timestamps, and its path sorts first
+        store.update_file_identities([('/a/copy', 1, 1, mtime_ns, mtime_ns + 5),
+                                      ('/z/original', 1, 1, mtime_ns, mtime_ns + 5)],
+                                     links=[('/a/copy', '/z/original')])
+
+        assert duplicates(store) == []
+        assert [g.original_path for g in store.iter_duplicate_group_summaries()] == ['/z/original']
+        assert store.refresh_analysis_results(duplicates=True)['mode'] == 'incremental'
+        assert list(store.iter_analysis_results()) == []
+
+        # Rewritten since it was linked: matched again
+        store.upsert_file_record(record('/a/copy', linked_at + timedelta(days=2), 3, mtime_ns + 10))
+        assert duplicates(store) == [('/a/copy', '/z/original')]
+        assert store.delete_file_records(['/a/copy']) == 1
+        assert store.conn.execute("SELECT COUNT(*) FROM linked_files;").fetchone()[0] == 0
+
+        # A renamed link is no longer recorded at either path
+        store.upsert_file_record(record('/a/copy', linked_at, 1, mtime_ns))
+        store.update_file_identities([('/a/copy', 1, 1, mtime_ns, mtime_ns + 5)], links=[('/a/copy', '/z/original')])
+        store.update_file_path('/a/copy', '/b/copy')
+        assert store.conn.execute("SELECT COUNT(*) FROM linked_files;").fetchone()[0] == 0
+
+
+def test_schema_creates_secondary_indexes(tmp_path):
+    """
+    Test that the schema creates indexes for hash and inode lookups, and drops
+    the size and age indexes of databases created before they were removed.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    with MetadataStore(db_path=db_file) as store:
+        store.conn.execute("CREATE INDEX idx_files_size_bytes ON files (size_bytes);")
+        store.conn.execute("CREATE INDEX idx_files_last_scanned ON files (last_scanned);")
+
+    with MetadataStore(db_path=db_file) as store:
+        indexes = dict(store.conn.execute(
+            "SELECT index_name, expressions FROM duckdb_indexes() WHERE table_name = 'files';"
+        ).fetchall())
+
+    assert set(indexes) == {'idx_files_hash', 'idx_files_inode'}
+
+
+def test_optimize_layout_keeps_rows_constraints_and_indexes(tmp_path):
+    """
+    Test that optimize_layout rewrites the table in hash order without losing
+    rows, the primary key, or the secondary indexes.
+    """
+    now = datetime.now(timezone.utc)
+    records = [
+        {'path': f'/layout/{i}', 'filename': str(i), 'size_bytes': i, 'last_modified': now,
+         'hash': f'hash{i % 3}', 'last_scanned': now}
+        for i in range(9)
+    ]
+
+    with MetadataStore(db_path=tmp_path / "test_metadata.db") as store:
+        store.upsert_file_records(records)
+        duplicates_before = store.get_duplicates()
+
+        store.optimize_layout()
+
+        hashes_in_storage_order = [row[0] for row in store.conn.execute("SELECT hash FROM files;").fetchall()]
+        assert hashes_in_storage_order == sorted(hashes_in_storage_order)
+        assert store.get_duplicates() == duplicates_before
+        index_count = store.conn.execute(
+            "SELECT COUNT(*) FROM duckdb_indexes() WHERE table_name = 'files';"
+        ).fetchone()[0]
+        assert index_count == 2
+        with pytest.raises(duckdb.ConstraintException):
+            store.conn.execute("INSERT INTO files (path) VALUES ('/layout/0');")
+
+
+def test_refresh_analysis_results_incremental_matches_full_evaluation(tmp_path):
+    """
+    Test TDD Anchor: [MS_IncrementalAnalysis]
+    Test that after inserts, renames and hash changes an incremental refresh
+    re-evaluates only the touched rows and groups, yet stores exactly the
+    matches a full evaluation produces.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=1000)
+    rules = {'duplicates': True, 'size_above': 100, 'modified_before': now - timedelta(days=365)}
+
+    def record(path, hash_value, size=10, modified=now):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': size,
+                'last_modified': modified, 'hash': hash_value, 'last_scanned': now}
+
+    def stored_matches(store):
+        return sorted(store.iter_analysis_results())
+
+    def full_matches(store):
+        return sorted(store.iter_rule_matches(**rules))
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records(
+            [record(f'/inc/u{i}', f'u{i}') for i in range(20)]
+            + [record('/inc/a1', 'a', modified=old), record('/inc/a2', 'a'),
+               record('/inc/b1', 'b', modified=old), record('/inc/b2', 'b'),
+               record('/inc/big', 'big', size=500)])
+
+        first = store.refresh_analysis_results(**rules)
+        assert first['mode'] == 'full'
+        assert first['evaluated'] == 25
+        assert stored_matches(store) == full_matches(store)
+
+        unchanged = store.refresh_analysis_results(**rules)
+        assert unchanged == {'mode': 'incremental', 'evaluated': 0, 'watermark': first['watermark']}
+
+        # New original for group 'a', rename of a duplicate, and a hash change that dissolves group 'b'
+        store.upsert_file_record(record('/inc/a0', 'a', modified=old - timedelta(days=1)))
+        store.update_file_path('/inc/a2', '/inc/a2-moved')
+        store.update_file_hashes([('/inc/b2', 'b-changed')])
+
+        incremental = store.refresh_analysis_results(**rules)
+        assert incremental['mode'] == 'incremental'
+        # Groups 'a' (3 rows) and 'b' (1 row left), plus /inc/b2
+        assert incremental['evaluated'] == 5
+        assert stored_matches(store) == full_matches(store)
+        duplicates = {m.path: m.original_path for m in store.iter_analysis_results() if m.is_duplicate}
+        assert duplicates == {'/inc/a1': '/inc/a0', '/inc/a2-moved': '/inc/a0'}
+
+        # Changing a rule parameter forces a full rebuild
+        rules['size_above'] = 5
+        assert store.refresh_analysis_results(**rules)['mode'] == 'full'
+        assert stored_matches(store) == full_matches(store)
+
+
+def test_duplicate_groups_are_maintained_by_writes(tmp_path):
+    """
+    Test TDD Anchor: [MS_DuplicateGroups]
+    Test that upserts, renames, hash updates and deletes keep the
+    duplicate_groups table equal to a full rebuild, with the original and
+    wasted bytes of each group.
+    """
+    from storage_hygiene.metadata_store import DuplicateGroup, _DUPLICATE_GROUP_SQL, _HASHED_ROWS
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+
+    def record(path, hash_value, size=100, age_days=0):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': size,
+                'last_modified': now - timedelta(days=age_days), 'hash': hash_value, 'last_scanned': now}
+
+    def groups(store):
+        return sorted(store.iter_duplicate_group_summaries())
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([record('/g/a1', 'a', age_days=3), record('/g/a2', 'a', age_days=1),
+                                   record('/g/b1', 'b', size=50), record('/g/b2', 'b', size=50),
+                                   record('/g/b3', 'b', size=50), record('/g/c', 'c')])
+        assert [(g.hash, g.file_count, g.wasted_bytes) for g in store.iter_duplicate_group_summaries()] == \
+               [('a', 2, 100), ('b', 3, 100)]
+
+        store.upsert_file_record(record('/g/a0', 'a', age_days=5)) # New original
+        store.update_file_path('/g/b1', '/g/b9') # Moves the original's path
+        store.update_file_hashes([('/g/c', 'a')]) # Joins group 'a'
+        store.upsert_file_record(record('/g/b2', 'unique')) # Leaves group 'b'
+        assert store.delete_file_records(['/g/b3', '/g/missing']) == 1 # Dissolves group 'b'
+        # Replaces a stored row and inserts a new one: leaves group 'a', forms group 'd'
+        store.upsert_file_records([record('/g/a2', 'd', age_days=1), record('/g/d', 'd')])
+
+        maintained = groups(store)
+        assert [(g.hash, g.file_count, g.original_path) for g in maintained] == [('a', 3, '/g/a0'), ('d', 2, '/g/a2')]
+        rebuilt = store.conn.execute(_DUPLICATE_GROUP_SQL.format(filter=_HASHED_ROWS)).fetchall()
+        assert sorted(DuplicateGroup._make(row) for row in rebuilt) == maintained
+        assert sorted(store.get_duplicates()) == ['a', 'd']
+
+
+def test_duplicate_groups_filled_for_existing_database(tmp_path):
+    """Test that opening a database created before duplicate_groups fills the table once."""
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([{'path': f'/old/{i}', 'filename': str(i), 'size_bytes': 10,
+                                    'last_modified': now, 'hash': 'same', 'last_scanned': now} for i in range(3)])
+        store.conn.execute("DROP TABLE duplicate_groups;")
+
+    with MetadataStore(db_path=db_file) as store:
+        assert [(g.hash, g.file_count, g.original_path) for g in store.iter_duplicate_group_summaries()] == \
+               [('same', 3, '/old/0')]
+
+
+def test_file_chunks_follow_renames_deletes_and_replacement(tmp_path):
+    """
+    Test TDD Anchor: [MS_Chunks]
+    Test that replace_file_chunks swaps a file's chunks, that renames and
+    deletes carry over to its chunks, and that shared-chunk pairs report
+    shared bytes relative to the smaller file.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+
+    def record(path, hash_value):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': 400,
+                'last_modified': now, 'hash': hash_value, 'last_scanned': now}
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([record('/k/a', 'ha'), record('/k/b', 'hb'), record('/k/c', 'hc')])
+        assert store.replace_file_chunks({
+            '/k/a': [(0, 100, 'x'), (100, 100, 'y'), (200, 200, 'z')],
+            '/k/b': [(0, 100, 'x'), (100, 100, 'y')],
+            '/k/c': [(0, 400, 'old')],
+        }) == 6
+
+        pairs = list(store.iter_shared_chunk_pairs())
+        assert [(p.path, p.other_path, p.shared_bytes, p.shared_ratio) for p in pairs] == [('/k/a', '/k/b', 200, 1.0)]
+
+        store.replace_file_chunks({'/k/c': [(0, 200, 'x'), (200, 200, 'z')]})
+        store.update_file_path('/k/b', '/k/b-moved')
+        store.delete_file_records(['/k/a'])
+        pairs = list(store.iter_shared_chunk_pairs(min_shared_ratio=0.5))
+        assert [(p.path, p.other_path, p.shared_bytes) for p in pairs] == [('/k/b-moved', '/k/c', 100)]
+        assert store.conn.execute("SELECT COUNT(*) FROM chunks WHERE path = '/k/a';").fetchone()[0] == 0
+
+        store.replace_file_chunks({'/k/c': []})
+        assert list(store.iter_shared_chunk_pairs()) == []
+
+
+def test_find_hashes_by_inode_and_copy_file_extras(tmp_path):
+    """
+    Test TDD Anchor: [MS_HashCache]
+    Test that stored hashes are found by (device, inode, size, mtime_ns) only
+    when every part matches and the algorithm agrees, and that chunks and
+    perceptual hashes can be copied to the file's new path.
+    """
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+
+    def record(path, inode, hash_value, algorithm='sha256'):
+        return {'path': path, 'filename': Path(path).name, 'size_bytes': 400, 'last_modified': now,
+                'hash': hash_value, 'hash_algorithm': algorithm, 'last_scanned': now,
+                'device': 2**63 + 5, 'inode': inode, 'mtime_ns': 1_700_000_000_123_456_789}
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([record('/old/a', 11, 'ha'), record('/old/b', 12, 'hb', 'blake2b'),
+                                   record('/old/c', 13, None)])
+        store.replace_file_chunks({'/old/a': [(0, 400, 'x')]})
+        store.replace_perceptual_hashes({'/old/a': 42}, 'dhash')
+
+        identity = (2**63 + 5, 11, 400, 1_700_000_000_123_456_789)
+        found = store.find_hashes_by_inode([
+            identity,
+            (2**63 + 5, 11, 400, 1_700_000_000_123_456_790), # Modified since
+            (2**63 + 5, 12, 400, 1_700_000_000_123_456_789), # Other algorithm
+            (2**63 + 5, 13, 400, 1_700_000_000_123_456_789), # Never hashed
+            (7, 11, 400, 1_700_000_000_123_456_789), # Same inode on another device
+        ], 'sha256')
+        assert found == {identity: ('/old/a', 'ha')}
+
+        store.upsert_file_record(record('/new/a', 11, 'ha'))
+        store.replace_file_chunks({'/new/a': [(0, 400, 'stale')]})
+        assert store.copy_file_extras({'/new/a': '/old/a'}) == 1
+        assert store.conn.execute("SELECT path, hash FROM chunks ORDER BY path;").fetchall() == \
+            [('/new/a', 'x'), ('/old/a', 'x')]
+        assert store.conn.execute("SELECT path, algorithm, hash FROM perceptual_hashes ORDER BY path;").fetchall() == \
+            [('/new/a', 'dhash', 42), ('/old/a', 'dhash', 42)]
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 9])
+def test_iter_similar_images_matches_brute_force(tmp_path, max_distance):
+    """
+    Test TDD Anchor: [MS_SimilarImages]
+    Test that the multi-index Hamming search finds exactly the pairs a
+    pairwise comparison finds, skipping whole-file duplicates and other algorithms.
+    """
+    import random
+
+    db_file = tmp_path / "test_metadata.db"
+    now = datetime.now(timezone.utc)
+    rng = random.Random(max_distance)
+    hashes = {}
+    for i in range(300):
+        if i % 3 and i > 0:
+            # Flip a few bits of the previous image's hash
+            value = hashes[f'/p/{i - 1}']
+            for bit in rng.sample(range(64), rng.randint(0, 10)):
+                value ^= 1 << bit
+        else:
+            value = rng.getrandbits(64)
+        hashes[f'/p/{i}'] = value
+    hashes['/p/copy'] = hashes['/p/0'] # Same content as /p/0, see the file hash below
+
+    with MetadataStore(db_path=db_file) as store:
+        store.upsert_file_records([{'path': path, 'filename': path, 'size_bytes': 1, 'last_modified': now,
+                                    'hash': 'h0' if path in ('/p/0', '/p/copy') else path, 'last_scanned': now}
+                                   for path in hashes])
+        assert store.replace_perceptual_hashes(hashes, 'dhash') == len(hashes)
+        store.replace_perceptual_hashes({'/p/other-algorithm': hashes['/p/1']}, 'ahash')
+
+        found = [(pair.path, pair.other_path, pair.distance)
+                 for pair in store.iter_similar_images('dhash', max_distance=max_distance)]
+
+    paths = sorted(hashes)
+    expected = sorted(
+        (distance, a, b) for i, a in enumerate(paths) for b in paths[i + 1:]
+        if (distance := bin(hashes[a] ^ hashes[b]).count('1')) <= max_distance and {a, b} != {'/p/0', '/p/copy'}
+    )
+    assert found == [(a, b, distance) for distance, a, b in expected]
+    assert found or max_distance == 0
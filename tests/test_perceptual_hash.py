@@ -0,0 +1,48 @@
+import pytest
+
+from storage_hygiene.perceptual_hash import (PERCEPTUAL_ALGORITHMS, ahash_bits, dhash_bits, is_image_path,
+                                             perceptual_hash, phash_bits)
+
+
+def _gradient(width, height, brightness=0):
+    return [[min(255, x * 20 + y * 3 + brightness) for x in range(width)] for y in range(height)]
+
+
+def test_bit_functions_return_64_bit_hashes():
+    """Test that each hash packs 64 bits, most significant first."""
+    assert ahash_bits([[0] * 8] * 4 + [[255] * 8] * 4) == (1 << 32) - 1
+    assert dhash_bits([[9 - x for x in range(9)]] * 8) == (1 << 64) - 1
+    assert 0 <= phash_bits(_gradient(32, 32)) < 1 << 64
+
+
+@pytest.mark.parametrize("bits, size", [(ahash_bits, 8), (phash_bits, 32)])
+def test_hash_is_stable_under_brightness_change(bits, size):
+    """Test that a uniform brightness shift barely changes the hash."""
+    original = bits(_gradient(size, size))
+    brighter = bits(_gradient(size, size, brightness=5))
+    assert bin(original ^ brighter).count('1') <= 4
+
+
+def test_image_path_detection_and_unknown_algorithm():
+    """Test extension matching and that an unknown algorithm raises ValueError."""
+    assert is_image_path('/photos/IMG_0001.JPG')
+    assert not is_image_path('/docs/report.pdf')
+    with pytest.raises(ValueError, match="Unsupported perceptual hash algorithm 'mhash'"):
+        perceptual_hash('/photos/a.jpg', 'mhash')
+
+
+@pytest.mark.parametrize("algorithm", PERCEPTUAL_ALGORITHMS)
+def test_resized_image_stays_close(tmp_path, algorithm):
+    """Test that a downscaled, re-encoded copy hashes within a few bits of the original."""
+    Image = pytest.importorskip("PIL.Image")
+    original = Image.new('L', (256, 256))
+    # Smooth shapes, like a photo: a diagonal gradient with a bright disc
+    original.putdata([255 if (x - 90) ** 2 + (y - 150) ** 2 < 2500 else (x + 2 * y) // 3
+                      for y in range(256) for x in range(256)])
+    original.convert('RGB').save(tmp_path / "original.png")
+    original.resize((128, 128)).convert('RGB').save(tmp_path / "small.jpg", quality=85)
+
+    distance = bin(perceptual_hash(str(tmp_path / "original.png"), algorithm)
+                   ^ perceptual_hash(str(tmp_path / "small.jpg"), algorithm)).count('1')
+    assert distance <= 8
+    assert perceptual_hash(str(tmp_path / "missing.png"), algorithm) is None
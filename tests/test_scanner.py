@@ -100,30 +100,30 @@ def test_scan_directory_finds_files_and_calls_upsert(tmp_path):
     mock_config_manager.get.return_value = [str(tmp_path)] # Simulate config returning scan paths
 
     mock_metadata_store = Mock(spec=MetadataStore)
-    # Configure query_files to return empty list (simulate no existing records)
-    mock_metadata_store.query_files.return_value = []
+    # Configure the scan index to be empty (simulate no existing records)
+    mock_metadata_store.get_scan_index.return_value = {}
+    mock_metadata_store.find_hashes_by_inode.return_value = {}
 
     scanner = Scanner(mock_config_manager, mock_metadata_store)
 
     # Act: Scan the temporary directory
     scanner.scan_directory(str(tmp_path)) # Method doesn't exist yet
 
-    # Assert: Check if upsert_file_record was called correctly for each file
-    assert mock_metadata_store.upsert_file_record.call_count == 3
+    # Assert: Check that the buffered records were flushed in one bulk upsert
+    mock_metadata_store.upsert_file_record.assert_not_called()
+    assert mock_metadata_store.upsert_file_records.call_count == 1
 
-    calls = mock_metadata_store.upsert_file_record.call_args_list
+    flushed_records = mock_metadata_store.upsert_file_records.call_args.args[0]
+    assert len(flushed_records) == 3
     # Use a tolerance for timestamp comparisons
     time_tolerance_seconds = 2 # Generous tolerance for filesystem/OS differences
 
     called_data = {}
-    for call in calls:
-        # Extract path from the 'file_metadata' dictionary argument
-        file_metadata_arg = call.kwargs.get('file_metadata')
-        if file_metadata_arg:
-            file_path_str = file_metadata_arg.get('path')
-            if file_path_str:
-                 # Convert back to Path for comparison with expected keys
-                called_data[pathlib.Path(file_path_str)] = file_metadata_arg
+    for file_metadata_arg in flushed_records:
+        file_path_str = file_metadata_arg.get('path')
+        if file_path_str:
+             # Convert back to Path for comparison with expected keys
+            called_data[pathlib.Path(file_path_str)] = file_metadata_arg
 
     assert set(called_data.keys()) == set(expected_metadata.keys()), \
            f"Mismatch in file paths called vs expected.\nCalled: {set(called_data.keys())}\nExpected: {set(expected_metadata.keys())}"
@@ -151,7 +151,7 @@ def test_scan_directory_skips_unchanged_files(tmp_path):
     """
     Test TDD Anchors: [SCAN_Incremental], [SCAN_InteractMS]
     Test that scan_directory skips hashing and upserting files if their
-    metadata (size, mtime) matches a record in the MetadataStore.
+    metadata (size, mtime_ns, ctime_ns) matches a record in the MetadataStore.
     """
     # Arrange: Create a file
     file_content = b"unchanged content"
@@ -161,7 +161,6 @@ def test_scan_directory_skips_unchanged_files(tmp_path):
     # Allow time for timestamp to settle
     time.sleep(0.1)
     stat_info = unchanged_file.stat()
-    mtime_dt = datetime.fromtimestamp(stat_info.st_mtime, tz=timezone.utc)
     size = stat_info.st_size
 
     # Mock dependencies
@@ -170,17 +169,11 @@ def test_scan_directory_skips_unchanged_files(tmp_path):
 
     mock_metadata_store = Mock(spec=MetadataStore)
 
-    # Configure query_files mock to return the existing record
-    existing_record = {
-        'file_path': str(unchanged_file.resolve()),
-        'size': size,
-        'last_modified': mtime_dt, # Same timestamp and size
-        'hash': 'dummy_hash_should_not_be_recalculated',
-        'created_time': mtime_dt, # Dummy value
-        'last_scanned': datetime.now(timezone.utc) # Dummy value
+    # Configure the preloaded scan index to contain the existing record
+    existing_path = os.path.normcase(str(unchanged_file.resolve()))
+    mock_metadata_store.get_scan_index.return_value = {
+        existing_path: (size, stat_info.st_mtime_ns, stat_info.st_ctime_ns, 'sha256'), # Same size, times and algorithm
     }
-    # query_files should return a list containing the record when queried by path
-    mock_metadata_store.query_files.return_value = [existing_record]
 
     scanner = Scanner(mock_config_manager, mock_metadata_store)
     # Mock the internal _calculate_hash method to check if it's called
@@ -190,15 +183,17 @@ def test_scan_directory_skips_unchanged_files(tmp_path):
     scanner.scan_directory(str(tmp_path))
 
     # Assert
-    # 1. Check that query_files was called with the correct criteria dictionary, using normalized path
-    expected_normalized_path = os.path.normcase(str(unchanged_file.resolve()))
-    mock_metadata_store.query_files.assert_called_once_with(criteria={'path': expected_normalized_path})
+    # 1. Check that the index was loaded once for the scan root and no per-file query ran
+    expected_root_prefix = os.path.normcase(str(tmp_path.resolve()))
+    mock_metadata_store.get_scan_index.assert_called_once_with(expected_root_prefix)
+    mock_metadata_store.query_files.assert_not_called()
 
     # 2. Check that hash calculation was SKIPPED
     scanner._calculate_hash.assert_not_called()
 
     # 3. Check that upsert was SKIPPED
     mock_metadata_store.upsert_file_record.assert_not_called()
+    mock_metadata_store.upsert_file_records.assert_not_called()
 @pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
 def test_scan_directory_handles_permission_error(tmp_path, capsys):
     """
@@ -230,18 +225,18 @@ def test_scan_directory_handles_permission_error(tmp_path, capsys):
     processed_files = []
     errors_logged = []
 
-    def mock_process_file(item_path):
-        processed_files.append(item_path.name)
-        if item_path.name == "no_access.txt":
+    def mock_process_file(entry):
+        processed_files.append(entry.name)
+        if entry.name == "no_access.txt":
             # Simulate error during processing this specific file
-            print(f"Error processing file {item_path}: [Errno 13] Permission denied") # Simulate log
-            errors_logged.append(item_path.name)
+            print(f"Error processing file {entry.path}: [Errno 13] Permission denied") # Simulate log
+            errors_logged.append(entry.name)
             # Raise or just simulate the effect (not calling upsert)
             # For this test, simulating the log and checking calls is enough
         else:
             # Call original for accessible files (or simulate success)
             # To isolate, let's just simulate success by calling upsert directly
-             mock_metadata_store.upsert_file_record(file_path=item_path.resolve(), size=1, last_modified=datetime.now(timezone.utc), hash_value="dummy")
+             mock_metadata_store.upsert_file_record(file_path=pathlib.Path(entry.path), size=1, last_modified=datetime.now(timezone.utc), hash_value="dummy")
 
 
     scanner._process_file = Mock(side_effect=mock_process_file)
@@ -269,4 +264,559 @@ def test_scan_directory_handles_permission_error(tmp_path, capsys):
     # captured = capsys.readouterr() # This won't work as print is inside the mock side_effect
     # assert "Error processing file" in captured.out
     # assert "Permission denied" in captured.out
-    assert "no_access.txt" in errors_logged # Check our manual log in the mock
\ No newline at end of file
+    assert "no_access.txt" in errors_logged # Check our manual log in the mock
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_scan_directory_parallel_matches_serial(tmp_path):
+    """
+    Test that a scan with a hashing process pool ('scanner.workers' > 1)
+    stores the same records as the serial scan.
+    """
+    scan_root = tmp_path / "scan_root"
+    for i in range(12):
+        sub_dir = scan_root / f"dir{i % 3}"
+        sub_dir.mkdir(parents=True, exist_ok=True)
+        (sub_dir / f"file{i}.bin").write_bytes(os.urandom(1024 * (i + 1)))
+    (scan_root / "dup_a.txt").write_bytes(b"same content")
+    (scan_root / "dup_b.txt").write_bytes(b"same content")
+
+    def scan_with_workers(workers, db_name):
+        mock_config_manager = Mock(spec=ConfigManager)
+        mock_config_manager.get.side_effect = lambda key, default=None: {
+            'scanner.workers': workers,
+        }.get(key, default)
+        with MetadataStore(db_path=tmp_path / db_name) as store:
+            Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+            return {
+                r['path']: (r['filename'], r['size_bytes'], r['last_modified'], r['hash'])
+                for r in store.query_files(criteria={})
+            }
+
+    serial_records = scan_with_workers(1, "serial.db")
+    parallel_records = scan_with_workers(3, "parallel.db")
+
+    assert len(serial_records) == 14
+    assert parallel_records == serial_records
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_scan_directory_flushes_records_in_batches(tmp_path):
+    """
+    Test that scan_directory buffers records and flushes them through
+    upsert_file_records every 'scanner.batch_size' records.
+    """
+    for i in range(5):
+        (tmp_path / f"file{i}.txt").write_text(f"content {i}")
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.batch_size': 2,
+    }.get(key, default)
+    mock_metadata_store = Mock(spec=MetadataStore)
+    mock_metadata_store.get_scan_index.return_value = {}
+    mock_metadata_store.find_hashes_by_inode.return_value = {}
+
+    scanner = Scanner(mock_config_manager, mock_metadata_store)
+    scanner.scan_directory(str(tmp_path))
+
+    batch_sizes = [len(c.args[0]) for c in mock_metadata_store.upsert_file_records.call_args_list]
+    assert batch_sizes == [2, 2, 1]
+    assert scanner._pending_records == []
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_rescan_of_unchanged_tree_skips_hashing(tmp_path):
+    """
+    Test that re-scanning an unchanged tree against a real store skips hashing
+    every file, and that a modified file is re-hashed.
+    """
+    scan_root = tmp_path / "scan_root"
+    scan_root.mkdir()
+    for i in range(4):
+        (scan_root / f"file{i}.txt").write_text(f"content {i}")
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: default
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+
+        rescanner = Scanner(mock_config_manager, store)
+        rescanner._calculate_hash = Mock(return_value="rehashed")
+        rescanner.scan_directory(str(scan_root))
+        rescanner._calculate_hash.assert_not_called()
+
+        changed = scan_root / "file2.txt"
+        changed.write_text("changed and longer content")
+        rescanner.scan_directory(str(scan_root))
+        rescanner._calculate_hash.assert_called_once()
+        assert os.path.basename(rescanner._calculate_hash.call_args.args[0]) == "file2.txt"
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_rescan_detects_subsecond_and_mtime_restoring_rewrites(tmp_path):
+    """
+    Test that the incremental check compares size, mtime_ns and ctime_ns
+    exactly: a same-size rewrite half a second later, and one whose mtime was
+    restored afterwards, are both rehashed.
+    """
+    scan_root = tmp_path / "scan_root"
+    scan_root.mkdir()
+    target = scan_root / "report.txt"
+    target.write_text("version A")
+    original_mtime_ns = target.stat().st_mtime_ns
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: default
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+
+        target.write_text("version B")
+        os.utime(target, ns=(original_mtime_ns, original_mtime_ns + 500_000_000))
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        assert store.query_files({'filename': 'report.txt'})[0]['hash'] == hashlib.sha256(b"version B").hexdigest()
+
+        time.sleep(0.01) # Let the ctime advance
+        target.write_text("version C")
+        os.utime(target, ns=(original_mtime_ns, original_mtime_ns + 500_000_000))
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        assert store.query_files({'filename': 'report.txt'})[0]['hash'] == hashlib.sha256(b"version C").hexdigest()
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_walk_files_yields_resolved_entries_with_stat(tmp_path):
+    """
+    Test that the os.scandir walker yields one ScanEntry per regular file,
+    with resolved paths and the stat result already collected.
+    """
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "top.txt").write_text("top")
+    (tmp_path / "a" / "b" / "deep.bin").write_bytes(b"12345")
+
+    scanner = Scanner(Mock(spec=ConfigManager), Mock(spec=MetadataStore))
+    root = str(tmp_path.resolve())
+    entries = {entry.name: entry for entry in scanner._walk_files(root)}
+
+    assert set(entries) == {"top.txt", "deep.bin"}
+    deep = entries["deep.bin"]
+    assert deep.path == os.path.join(root, "a", "b", "deep.bin")
+    assert deep.stat.st_size == 5
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="Symlinks not supported")
+def test_walk_files_symlink_handling(tmp_path):
+    """
+    Test that symlinks are skipped by default and followed (without looping)
+    when 'scanner.follow_symlinks' is enabled.
+    """
+    target_dir = tmp_path / "outside"
+    target_dir.mkdir()
+    (target_dir / "linked.txt").write_text("via link")
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "real.txt").write_text("real")
+    try:
+        os.symlink(target_dir, root / "dir_link")
+        os.symlink(root, root / "loop_link") # Points back at the root
+    except OSError:
+        pytest.skip("Cannot create symlinks here")
+
+    scanner = Scanner(Mock(spec=ConfigManager), Mock(spec=MetadataStore))
+    root_str = str(root.resolve())
+
+    default_names = sorted(entry.name for entry in scanner._walk_files(root_str))
+    assert default_names == ["real.txt"]
+
+    scanner._follow_symlinks = True
+    followed_entries = list(scanner._walk_files(root_str))
+    followed = {entry.name: entry.path for entry in followed_entries}
+    assert sorted(entry.name for entry in followed_entries) == ["linked.txt", "real.txt"]
+    assert followed["linked.txt"] == str((target_dir / "linked.txt").resolve())
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_staged_dedup_hashes_only_colliding_files(tmp_path, mocker):
+    """
+    Test that 'scanner.dedup_mode: staged' leaves unique-size files and files
+    with differing partial hashes unhashed, and fully hashes true duplicates.
+    A later scan only partial-hashes the size groups of the files it wrote.
+    """
+    scan_root = tmp_path / "scan_root"
+    scan_root.mkdir()
+    payload = os.urandom(8192)
+    (scan_root / "dup_a.bin").write_bytes(payload)
+    (scan_root / "dup_b.bin").write_bytes(payload)
+    # Same size as the duplicates, but a different head
+    (scan_root / "same_size.bin").write_bytes(b"X" + payload[1:])
+    (scan_root / "unique.bin").write_bytes(os.urandom(100))
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.dedup_mode': 'staged',
+        'scanner.partial_hash_kib': 1,
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+
+        hashes = {os.path.basename(r['path']): r['hash'] for r in store.query_files(criteria={})}
+        expected_hash = hashlib.sha256(payload).hexdigest()
+        assert hashes == {
+            'dup_a.bin': expected_hash,
+            'dup_b.bin': expected_hash,
+            'same_size.bin': None,
+            'unique.bin': None,
+        }
+        assert list(store.get_duplicates()) == [expected_hash]
+
+        # A scan of another root only reads the size groups its own files join
+        other_root = tmp_path / "other_root"
+        other_root.mkdir()
+        (other_root / "dup_c.bin").write_bytes(b"Y" + payload[1:])
+        (other_root / "other.bin").write_bytes(os.urandom(200))
+        (scan_root / "old_pair.bin").write_bytes(os.urandom(4096))
+        (scan_root / "old_pair_b.bin").write_bytes(os.urandom(4096))
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        from storage_hygiene import scanner as scanner_module
+        partial_hash = mocker.spy(scanner_module, '_partial_hash')
+
+        Scanner(mock_config_manager, store).scan_directory(str(other_root))
+
+        assert sorted(os.path.basename(c.args[0]) for c in partial_hash.call_args_list) == \
+            ['dup_a.bin', 'dup_b.bin', 'dup_c.bin', 'same_size.bin']
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_changing_hash_algorithm_rehashes_and_never_mixes_duplicates(tmp_path):
+    """
+    Test that records store their hash algorithm, that switching algorithms
+    rehashes unchanged files, and that duplicates never pair digests from
+    different algorithms.
+    """
+    scan_root = tmp_path / "scan_root"
+    scan_root.mkdir()
+    (scan_root / "a.txt").write_bytes(b"same")
+    (scan_root / "b.txt").write_bytes(b"same")
+
+    def config_for(algorithm):
+        config = Mock(spec=ConfigManager)
+        config.get.side_effect = lambda key, default=None: {
+            'scanner.hash_algorithm': algorithm,
+        }.get(key, default)
+        return config
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(config_for('sha256'), store).scan_directory(str(scan_root))
+        # Simulate a partial migration: only one file is rehashed with blake2b
+        store.update_file_hashes(
+            [(os.path.normcase(str((scan_root / "a.txt").resolve())), hashlib.blake2b(b"same").hexdigest())],
+            'blake2b',
+        )
+        assert store.get_duplicates() == {}
+
+        Scanner(config_for('blake2b'), store).scan_directory(str(scan_root))
+
+        records = store.query_files(criteria={})
+        assert {r['hash_algorithm'] for r in records} == {'blake2b'}
+        assert list(store.get_duplicates()) == [hashlib.blake2b(b"same").hexdigest()]
+
+
+@pytest.mark.parametrize("size", [0, 1, 4096, 300 * 1024 + 7])
+@pytest.mark.parametrize("mmap_threshold", [0, 1])
+def test_hash_file_readinto_and_mmap_paths_match_hashlib(tmp_path, size, mmap_threshold):
+    """
+    Test that the readinto (reused buffer) and mmap hashing paths produce the
+    same digest as hashlib for empty, tiny, and multi-chunk files.
+    """
+    from storage_hygiene.scanner import _hash_file
+
+    content = os.urandom(size)
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(content)
+
+    digest = _hash_file(str(file_path), 64 * 1024, 'sha256', mmap_threshold=mmap_threshold, fadvise=True)
+
+    assert digest == hashlib.sha256(content).hexdigest()
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+def test_path_override_selects_thread_pool_with_bounded_in_flight(tmp_path, mocker):
+    """
+    Test that a 'scanner.path_overrides' entry switches its scan root to the
+    thread pool, and that no more than 'max_in_flight' files per device are
+    hashing at once.
+    """
+    import threading
+    from storage_hygiene import scanner as scanner_module
+
+    network_root = tmp_path / "mnt" / "nas"
+    network_root.mkdir(parents=True)
+    for i in range(10):
+        (network_root / f"file{i}.txt").write_text(f"remote {i}")
+
+    real_hash_file = scanner_module._hash_file
+    lock = threading.Lock()
+    active = {'now': 0, 'peak': 0, 'threads': set()}
+
+    def tracking_hash_file(*args):
+        with lock:
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+            active['threads'].add(threading.get_ident())
+        time.sleep(0.02) # Simulate network latency
+        try:
+            return real_hash_file(*args)
+        finally:
+            with lock:
+                active['now'] -= 1
+
+    mocker.patch.object(scanner_module, '_hash_file', side_effect=tracking_hash_file)
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': 1, # Local default stays serial
+        'scanner.path_overrides': {
+            str(tmp_path / "mnt"): {'pool': 'process', 'workers': 2},
+            str(network_root): {'pool': 'thread', 'workers': 6, 'max_in_flight': 3},
+        },
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(network_root))
+        records = store.query_files(criteria={})
+
+    assert len(records) == 10
+    assert all(r['hash'] for r in records)
+    assert 1 < active['peak'] <= 3
+    assert threading.get_ident() not in active['threads'] # Hashed on pool threads
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_chunking_finds_near_duplicate_files(tmp_path, workers):
+    """
+    Test that with 'scanner.chunking' the scanner stores content-defined chunks
+    while hashing, serially and in the pool, and that files sharing most of
+    their bytes are reported while exact copies of each other are not.
+    """
+    import random
+
+    scan_root = tmp_path / "scan_root"
+    scan_root.mkdir()
+    base = random.Random(7).randbytes(256 * 1024)
+    (scan_root / "image_v1.bin").write_bytes(base)
+    (scan_root / "image_v2.bin").write_bytes(base[:100000] + b"patched" + base[100000:])
+    (scan_root / "image_copy.bin").write_bytes(base)
+    (scan_root / "small.txt").write_bytes(b"a single chunk")
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': workers,
+        'scanner.pool': 'thread',
+        'scanner.chunking': True,
+        'scanner.chunk_avg_kib': 4,
+        'scanner.chunk_min_file_mb': 0,
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "chunks.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        chunk_counts = dict(store.conn.execute("SELECT path, COUNT(*) FROM chunks GROUP BY path;").fetchall())
+        pairs = list(store.iter_shared_chunk_pairs(min_shared_ratio=0.5))
+
+    assert {pathlib.Path(p).name: n > 10 for p, n in chunk_counts.items()} == {
+        'image_v1.bin': True, 'image_v2.bin': True, 'image_copy.bin': True, 'small.txt': False}
+    # v2 pairs with both v1 and its exact copy; the copy and v1 are whole-file duplicates
+    assert sorted(tuple(sorted((pathlib.Path(p.path).name, pathlib.Path(p.other_path).name))) for p in pairs) == \
+           [('image_copy.bin', 'image_v2.bin'), ('image_v1.bin', 'image_v2.bin')]
+    assert all(p.shared_ratio > 0.9 and p.shared_bytes > 200 * 1024 for p in pairs)
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_perceptual_hashes_find_resized_images(tmp_path, workers):
+    """
+    Test that with 'scanner.perceptual_hash' image files get perceptual hashes
+    during the scan, serially and in the pool, and that a resized copy is
+    found as a similar image while other files are ignored.
+    """
+    Image = pytest.importorskip("PIL.Image")
+
+    scan_root = tmp_path / "photos"
+    scan_root.mkdir()
+    photo = Image.new('L', (200, 200))
+    photo.putdata([255 if (x - 60) ** 2 + (y - 120) ** 2 < 1600 else (x + 2 * y) // 3
+                   for y in range(200) for x in range(200)])
+    photo.convert('RGB').save(scan_root / "photo.png")
+    photo.resize((100, 100)).convert('RGB').save(scan_root / "photo_small.jpg", quality=90)
+    photo.transpose(Image.Transpose.FLIP_LEFT_RIGHT).convert('RGB').save(scan_root / "mirrored.png")
+    (scan_root / "notes.txt").write_text("not an image")
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': workers,
+        'scanner.pool': 'thread',
+        'scanner.perceptual_hash': True,
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "images.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        hashed = {pathlib.Path(row[0]).name for row in store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall()}
+        pairs = list(store.iter_similar_images('dhash', max_distance=6))
+
+    assert hashed == {'photo.png', 'photo_small.jpg', 'mirrored.png'}
+    assert [(pathlib.Path(p.path).name, pathlib.Path(p.other_path).name) for p in pairs] == \
+           [('photo.png', 'photo_small.jpg')]
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_undecodable_images_do_not_abort_the_scan(tmp_path, mocker, workers):
+    """
+    Test that images Pillow fails to decode (truncated files, EOFError,
+    SyntaxError, decompression bombs) are logged and get no perceptual hash
+    but keep their record, and that a decode error escaping the perceptual
+    hash skips only that file, serially and in the pool.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    from storage_hygiene import perceptual_hash as perceptual_hash_module
+    from storage_hygiene import scanner as scanner_module
+
+    scan_root = tmp_path / "photos"
+    scan_root.mkdir()
+    Image.new('RGB', (64, 64), (10, 200, 30)).save(scan_root / "good.png")
+    for name in ("eof.gif", "syntax.png", "bomb.jpg", "escaped.png"):
+        (scan_root / name).write_bytes((scan_root / "good.png").read_bytes())
+    (scan_root / "truncated.png").write_bytes((scan_root / "good.png").read_bytes()[:60])
+
+    decode_errors = {'eof.gif': EOFError("no more images in GIF file"), 'syntax.png': SyntaxError("broken PNG file"),
+                     'bomb.jpg': Image.DecompressionBombError("image size exceeds limit")}
+    real_open = Image.open
+
+    def open_image(path, *args, **kwargs):
+        error = decode_errors.get(pathlib.Path(path).name)
+        if error:
+            raise error
+        return real_open(path, *args, **kwargs)
+
+    def hash_image(path, algorithm):
+        if pathlib.Path(path).name == 'escaped.png':
+            raise SyntaxError("broken PNG file")
+        return perceptual_hash_module.perceptual_hash(path, algorithm)
+
+    mocker.patch.object(perceptual_hash_module.Image, 'open', side_effect=open_image)
+    mocker.patch.object(scanner_module, 'perceptual_hash', side_effect=hash_image)
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': workers,
+        'scanner.pool': 'thread',
+        'scanner.perceptual_hash': True,
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "images.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        recorded = {pathlib.Path(record.path).name: record.hash for record in store.iter_files()}
+        hashed = {pathlib.Path(row[0]).name for row in store.conn.execute("SELECT path FROM perceptual_hashes;").fetchall()}
+
+    assert set(recorded) == {'good.png', 'eof.gif', 'syntax.png', 'bomb.jpg', 'truncated.png'}
+    assert all(recorded.values())
+    assert hashed == {'good.png'}
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_moved_files_reuse_stored_hashes(tmp_path, mocker, workers):
+    """
+    Test that files moved to a new path are matched to their old records by
+    (device, inode, size, mtime_ns) and keep their hash and chunks without
+    being read again, while a file modified after the move is rehashed.
+    """
+    from collections import defaultdict
+    from storage_hygiene import scanner as scanner_module
+
+    scan_root = tmp_path / "scan_root"
+    (scan_root / "old").mkdir(parents=True)
+    for i in range(3):
+        (scan_root / "old" / f"file{i}.bin").write_bytes(bytes([i]) * 20000)
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': workers,
+        'scanner.pool': 'thread',
+        'scanner.chunking': True,
+        'scanner.chunk_avg_kib': 1,
+        'scanner.chunk_min_file_mb': 0,
+    }.get(key, default)
+
+    def chunks_by_name(store, directory):
+        rows = store.conn.execute("SELECT path, chunk_offset, length, hash FROM chunks ORDER BY path, chunk_offset;")
+        found = defaultdict(list)
+        for path, *chunk in rows.fetchall():
+            if pathlib.Path(path).parent.name == directory:
+                found[pathlib.Path(path).name].append(tuple(chunk))
+        return dict(found)
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        old_hashes = {pathlib.Path(r.path).name: r.hash for r in store.iter_files()}
+        old_chunks = chunks_by_name(store, "old")
+
+        (scan_root / "old").rename(scan_root / "new")
+        (scan_root / "new" / "file2.bin").write_bytes(b"rewritten")
+
+        hashed = []
+        real_hash_file = scanner_module._hash_file_with_extras
+        mocker.patch.object(scanner_module, '_hash_file_with_extras',
+                            side_effect=lambda path, *args: hashed.append(path) or real_hash_file(path, *args))
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+
+        new_hashes = {pathlib.Path(r.path).name: r.hash for r in store.iter_files()
+                      if pathlib.Path(r.path).parent.name == "new"}
+        new_chunks = chunks_by_name(store, "new")
+
+    assert [pathlib.Path(path).name for path in hashed] == ["file2.bin"]
+    assert new_hashes == {'file0.bin': old_hashes['file0.bin'], 'file1.bin': old_hashes['file1.bin'],
+                          'file2.bin': hashlib.sha256(b"rewritten").hexdigest()}
+    assert new_chunks['file0.bin'] == old_chunks['file0.bin']
+    assert new_chunks['file1.bin'] == old_chunks['file1.bin']
+
+
+@pytest.mark.skipif(Scanner is None, reason="Scanner class not yet implemented")
+@pytest.mark.parametrize("workers", [1, 2])
+def test_renamed_files_are_not_duplicates_of_their_old_rows(tmp_path, workers):
+    """
+    Test that rescanning after a directory rename moves the old records to
+    the new paths instead of adding rows beside them, so analysis finds no
+    duplicates, while a hardlink whose old path still exists keeps both rows.
+    """
+    from storage_hygiene.analysis_engine import AnalysisEngine
+
+    scan_root = tmp_path / "scan_root"
+    (scan_root / "a").mkdir(parents=True)
+    for i in range(3):
+        (scan_root / "a" / f"f{i}").write_bytes(bytes([i]) * 5000)
+
+    mock_config_manager = Mock(spec=ConfigManager)
+    mock_config_manager.get.side_effect = lambda key, default=None: {
+        'scanner.workers': workers,
+        'scanner.pool': 'thread',
+        'analysis.rules': {'duplicate_files': {'enabled': True}},
+    }.get(key, default)
+
+    with MetadataStore(db_path=tmp_path / "meta.db") as store:
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        (scan_root / "a").rename(scan_root / "b")
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+
+        paths = sorted(os.path.relpath(r.path, scan_root) for r in store.iter_files())
+        actions = AnalysisEngine(mock_config_manager, store).analyze()
+
+        assert paths == [os.path.join("b", f"f{i}") for i in range(3)]
+        assert actions == {}
+
+        os.link(scan_root / "b" / "f0", scan_root / "f0_link")
+        Scanner(mock_config_manager, store).scan_directory(str(scan_root))
+        paths = sorted(os.path.relpath(r.path, scan_root) for r in store.iter_files())
+
+    assert paths == [os.path.join("b", f"f{i}") for i in range(3)] + ["f0_link"]